@@ -0,0 +1,115 @@
+"""
+Exact advice on which die to take, for /advise.
+
+For every turn state (the values of the available dice and how many dice have been taken) the
+table holds, for each value that could be taken, the expected total of the dice taken for the
+rest of the turn and the expected number of dice lost to the discard rule, both under optimal
+play afterwards. It comes from a dynamic program over the GameData rules: taking a die discards
+the available dice lower than it, the rest are re-rolled, and a turn takes at most three dice.
+
+Only die values matter to the rules, never colors, so one table serves every game in
+DICE_COLORS. The roll number is not a separate dimension either: re-rolling available dice
+gives the same distribution whichever roll it is, so the state is (available values, dice
+taken). The table is built once, written to disk and memory-mapped, and a lookup is a dict
+lookup plus one struct unpack.
+"""
+import itertools
+import math
+import mmap
+import os
+import struct
+
+PICKS_PER_TURN = 3
+MAGIC = b"CLVADV01"
+# For values 1-6: expected total of the dice taken from now on, then expected dice lost. NaN if the value is not available.
+ROW = struct.Struct("<6f6f")
+
+
+def _multisets(count):
+    return itertools.combinations_with_replacement(range(1, 7), count)
+
+
+def _probability(multiset):
+    """Probability of rolling exactly this multiset of values with len(multiset) dice."""
+    ways = math.factorial(len(multiset))
+    for value in set(multiset):
+        ways //= math.factorial(multiset.count(value))
+    return ways / 6 ** len(multiset)
+
+
+def _options(values, picks, future_value, future_lost):
+    """Returns {value: (expected total, expected lost)} for taking each available value."""
+    options = {}
+    for value in set(values):
+        lower = sum(1 for v in values if v < value)
+        remaining = len(values) - lower - 1
+        options[value] = (value + future_value[remaining][picks + 1], lower + future_lost[remaining][picks + 1])
+    return options
+
+
+def _best(options):
+    # Highest expected total, then fewest dice lost
+    return max(options.values(), key=lambda option: (option[0], -option[1]))
+
+
+def solve():
+    """Returns (future_value, future_lost)[dice to roll][dice taken] under optimal play."""
+    future_value = [[0.0] * (PICKS_PER_TURN + 1) for _ in range(7)]
+    future_lost = [[0.0] * (PICKS_PER_TURN + 1) for _ in range(7)]
+    for picks in reversed(range(PICKS_PER_TURN)):
+        for count in range(1, 7):
+            for roll in _multisets(count):
+                probability = _probability(roll)
+                value, lost = _best(_options(roll, picks, future_value, future_lost))
+                future_value[count][picks] += probability * value
+                future_lost[count][picks] += probability * lost
+    return future_value, future_lost
+
+
+def _states():
+    """Every (sorted available values, dice taken) state, in table order."""
+    for picks in range(PICKS_PER_TURN):
+        for count in range(1, 7):
+            for values in _multisets(count):
+                yield values, picks
+
+
+def build(path):
+    """Writes the advice table to path."""
+    future_value, future_lost = solve()
+    rows = []
+    for values, picks in _states():
+        options = _options(values, picks, future_value, future_lost)
+        nan = float("nan")
+        rows.append(ROW.pack(*(options[v][0] if v in options else nan for v in range(1, 7)),
+                             *(options[v][1] if v in options else nan for v in range(1, 7))))
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(b"".join(rows))
+    os.replace(tmp_path, path)
+
+
+class Advisor:
+    """Memory-mapped advice table, built on first use if the file does not exist."""
+
+    def __init__(self, path):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        if not os.path.exists(path):
+            build(path)
+        with open(path, "rb") as f:
+            self._table = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._table[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not an advice table")
+        self._offsets = {state: len(MAGIC) + i * ROW.size for i, state in enumerate(_states())}
+
+    def advise(self, values, picks):
+        """
+        Returns [(value, expected total, expected lost)] for every distinct available value,
+        best first. values are the available dice values, picks the number of dice already taken.
+        """
+        row = ROW.unpack_from(self._table, self._offsets[tuple(sorted(values)), picks])
+        options = [(value, row[value - 1], row[value + 5]) for value in range(1, 7) if not math.isnan(row[value - 1])]
+        options.sort(key=lambda option: (-option[1], option[2]))
+        return options
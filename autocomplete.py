@@ -0,0 +1,70 @@
+"""
+Autocomplete for the color arguments of /take and /return.
+
+Discord calls an autocomplete callback on every keystroke, so ColorIndex answers from lists built
+ahead of time. bot.py updates a channel's entry after every change to its game (save_game),
+pointing it at the choices for its available and for its discarded dice: a dict from every
+prefix of every color name, and every die value, to the dice matching it, in the order the
+dice tray shows them (by value, then color). The lists depend only on where the dice are, so
+they are built once per dice state and shared by every channel in that state, and an answer is
+two dictionary lookups. A channel's entry is dropped when its game is spilled (see registry.py).
+"""
+import functools
+
+import config
+import game
+
+
+def _tuple_choice(name, value):
+    return (name, value)
+
+
+@functools.lru_cache(maxsize=config.RENDER_CACHE_SIZE)
+def _choices(game_number, values, make_choice):
+    """Returns {prefix or die value: [choice, ...]} for the dice with values (0 for dice elsewhere) in DICE_COLORS order."""
+    dice = sorted((value, color) for color, value in zip(game.DICE_COLORS[game_number], values) if value)
+    index = {}
+    for value, color in dice:
+        choice = make_choice(f"{color.capitalize()} {value}", color)
+        for end in range(len(color) + 1):
+            index.setdefault(color[:end], []).append(choice)
+        index.setdefault(str(value), []).append(choice)
+    return index
+
+
+class ColorIndex:
+    """Per channel autocomplete choices for the dice that can be taken and returned."""
+
+    def __init__(self, make_choice=_tuple_choice):
+        # Called as make_choice(name, value), e.g. with discord.app_commands.Choice; tuples by default
+        self.make_choice = make_choice
+        # channel id: (choices for /take, choices for /return)
+        self._channels = {}
+
+    def update(self, channel_id, game_data):
+        """Points the channel at the choices for its game's dice state."""
+        game_number, _, available, discarded = game_data.state_key()
+        self._channels[channel_id] = (_choices(game_number, available, self.make_choice),
+                                      _choices(game_number, discarded, self.make_choice))
+
+    def forget(self, channel_id):
+        """Drops the channel's entry, e.g. when its game is spilled; it is made again on the next keystroke."""
+        self._channels.pop(channel_id, None)
+
+    def __contains__(self, channel_id):
+        return channel_id in self._channels
+
+    def take(self, channel_id, current):
+        """Returns the available dice matching what was typed so far, or every available die if none match."""
+        return self._match(self._channels.get(channel_id), 0, current)
+
+    def give_back(self, channel_id, current):
+        """Returns the discarded dice matching what was typed so far, or every discarded die if none match."""
+        return self._match(self._channels.get(channel_id), 1, current)
+
+    @staticmethod
+    def _match(entry, which, current):
+        if entry is None:
+            return []
+        index = entry[which]
+        return index.get(current.strip().lower()) or index.get("", [])
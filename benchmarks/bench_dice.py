@@ -0,0 +1,50 @@
+"""
+Measures /dice throughput for common expressions: parsing an expression (as on a cache miss),
+looking up its compiled plan (a cache hit), rolling the plan and building the message, and the
+whole command path. /qroll's old implementation (six random.randint calls and an f-string) is
+timed alongside for comparison.
+
+Usage: python benchmarks/bench_dice.py [N]
+"""
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dice_rng
+import diceexpr
+import renderer
+from dice_emoji import white_dice, red_dice, yellow_dice, green_dice, blue_dice
+
+EXPRESSIONS = [diceexpr.PRESETS["qroll"], "3d6", "4d6kh3", "3d6+2", "1d20+5", "2d6r 1d6w"]
+
+
+def old_qroll():
+    w1, w2, r, y, g, b = (random.randint(1, 6) for _ in range(6))
+    return f"{white_dice[w1]} {white_dice[w2]} {red_dice[r]} {yellow_dice[y]} {green_dice[g]} {blue_dice[b]}"
+
+
+def main(count):
+    stream = dice_rng.DiceStream(0)
+    parse = diceexpr.compile_expression.__wrapped__
+
+    def command(expression):
+        plan = diceexpr.compile_expression(expression)
+        return renderer.render_dice_roll(plan, *diceexpr.roll(plan, stream))
+
+    old = timeit.timeit(old_qroll, number=count) / count
+    print(f"{'expression':26} {'parse':>10} {'cached':>10} {'roll':>10} {'command':>10}  {'commands':>10}")
+    print(f"{'old /qroll':26} {'':>10} {'':>10} {'':>10} {old * 1e9:7.0f} ns  {1 / old:10,.0f}/s")
+    for expression in EXPRESSIONS:
+        plan = parse(expression)
+        timings = [timeit.timeit(lambda: parse(expression), number=count // 10) / (count // 10),
+                   timeit.timeit(lambda: diceexpr.compile_expression(expression), number=count) / count,
+                   timeit.timeit(lambda: diceexpr.roll(plan, stream), number=count) / count,
+                   timeit.timeit(lambda: command(expression), number=count) / count]
+        print(f"{expression:26} " + " ".join(f"{seconds * 1e9:7.0f} ns" for seconds in timings) + f"  {1 / timings[-1]:10,.0f}/s")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
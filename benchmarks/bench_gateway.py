@@ -0,0 +1,160 @@
+"""
+Compares the default gateway setup with CLEVER_LEAN_GATEWAY in a bot joined to many guilds: RSS,
+how long discord.py takes from READY to on_ready, and the time spent on message chatter.
+
+Each mode runs in its own process, which imports bot.py and feeds its discord.py connection the
+events Discord would send for its intents: READY listing every guild, then with the guilds intent
+a GUILD_CREATE per guild (channels, roles, emojis and the members in voice), then MESSAGE_CREATE
+and TYPING_START events spread over the guilds if those intents are on. No network is used.
+
+Usage: python benchmarks/bench_gateway.py [GUILDS] [MESSAGES]
+"""
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import memstats
+
+BOT_ID = 1 << 40
+CHANNELS = 20
+ROLES = 10
+EMOJIS = 20
+VOICE_MEMBERS = 2
+MODES = {"default": {}, "lean": {"CLEVER_LEAN_GATEWAY": "1"}, "lean+prefix": {"CLEVER_LEAN_GATEWAY": "1", "CLEVER_PREFIX_COMMANDS": "1"}}
+
+
+def _user(user_id):
+    return {"id": str(user_id), "username": f"user{user_id}", "discriminator": "0", "global_name": None, "avatar": None}
+
+
+def _member(guild_id, user_id):
+    return {"user": _user(user_id), "roles": [str(guild_id + 1)], "joined_at": "2024-01-01T00:00:00+00:00",
+            "deaf": False, "mute": False, "flags": 0}
+
+
+def guild_payload(index):
+    """Returns a GUILD_CREATE payload shaped like one a mid-sized guild sends without the members and presences intents."""
+    guild_id = (index + 1) << 20
+    channels = [{"id": str(guild_id + 100 + number), "type": 2 if number == 0 else 0, "name": f"channel-{number}",
+                 "position": number, "permission_overwrites": [], "topic": None, "nsfw": False, "parent_id": None,
+                 "bitrate": 64000, "user_limit": 0, "rtc_region": None}
+                for number in range(CHANNELS)]
+    roles = [{"id": str(guild_id + (role or 0)), "name": "@everyone" if role == 0 else f"role-{role}", "color": 0,
+              "hoist": False, "position": role, "permissions": "1071698660929", "managed": False, "mentionable": False}
+             for role in range(ROLES)]
+    emojis = [{"id": str(guild_id + 500 + number), "name": f"emoji{number}", "roles": [], "require_colons": True,
+               "managed": False, "animated": False, "available": True} for number in range(EMOJIS)]
+    voice = [guild_id + 900 + number for number in range(VOICE_MEMBERS)]
+    return {"id": str(guild_id), "name": f"guild {index}", "icon": None, "owner_id": str(voice[0]), "region": None,
+            "afk_channel_id": None, "afk_timeout": 300, "verification_level": 0, "default_message_notifications": 0,
+            "explicit_content_filter": 0, "mfa_level": 0, "features": [], "system_channel_id": None,
+            "rules_channel_id": None, "vanity_url_code": None, "description": None, "banner": None, "premium_tier": 0,
+            "preferred_locale": "en-US", "nsfw_level": 0, "premium_progress_bar_enabled": False,
+            "joined_at": "2024-01-01T00:00:00+00:00", "large": False, "unavailable": False, "member_count": 500,
+            "roles": roles, "emojis": emojis, "stickers": [], "channels": channels, "threads": [],
+            "members": [_member(guild_id, BOT_ID)] + [_member(guild_id, user_id) for user_id in voice],
+            "voice_states": [{"user_id": str(user_id), "channel_id": str(guild_id + 100), "session_id": "s", "deaf": False,
+                              "mute": False, "self_deaf": False, "self_mute": False, "self_video": False,
+                              "suppress": False, "request_to_speak_timestamp": None} for user_id in voice],
+            "presences": [], "stage_instances": [], "guild_scheduled_events": []}
+
+
+def message_payload(number, guilds):
+    guild_id = (number % guilds + 1) << 20
+    author = guild_id + 1000 + number % 50
+    return {"id": str((1 << 50) + number), "channel_id": str(guild_id + 101 + number % (CHANNELS - 1)),
+            "guild_id": str(guild_id), "author": _user(author), "member": {k: v for k, v in _member(guild_id, author).items() if k != "user"},
+            "content": "", "timestamp": "2024-01-01T00:00:00+00:00", "edited_timestamp": None, "tts": False,
+            "mention_everyone": False, "mentions": [], "mention_roles": [], "attachments": [], "embeds": [],
+            "pinned": False, "type": 0, "flags": 0, "components": []}
+
+
+def typing_payload(number, guilds):
+    guild_id = (number % guilds + 1) << 20
+    user_id = guild_id + 1000 + number % 50
+    return {"channel_id": str(guild_id + 101 + number % (CHANNELS - 1)), "guild_id": str(guild_id),
+            "user_id": str(user_id), "timestamp": 0, "member": _member(guild_id, user_id)}
+
+
+async def _feed(client, guilds, messages):
+    """
+    Sends the client's connection the events its intents subscribe to. Returns the seconds to
+    on_ready and spent on the messages, leaving out the time taken to build the payloads.
+    """
+    await client._async_setup_hook()
+    state = client._connection
+    intents = client.intents
+    building = 0.0
+
+    def build(payload, *args):
+        nonlocal building
+        start = time.perf_counter()
+        data = payload(*args)
+        building += time.perf_counter() - start
+        return data
+
+    start = time.perf_counter()
+    state.parsers["READY"]({"v": 10, "user": {**_user(BOT_ID), "bot": True}, "session_id": "s", "resume_gateway_url": "",
+                            "guilds": [{"id": str((index + 1) << 20), "unavailable": True} for index in range(guilds)],
+                            "application": {"id": str(BOT_ID), "flags": 0}})
+    if intents.guilds:
+        for index in range(guilds):
+            state.parsers["GUILD_CREATE"](build(guild_payload, index))
+            if index % 100 == 0:
+                # Discord streams guilds over the connection rather than all at once
+                await asyncio.sleep(0)
+    await client.wait_until_ready()
+    ready = time.perf_counter() - start - building
+
+    building = 0.0
+    start = time.perf_counter()
+    for number in range(messages):
+        if intents.guild_messages:
+            state.parsers["MESSAGE_CREATE"](build(message_payload, number, guilds))
+        if intents.guild_typing:
+            state.parsers["TYPING_START"](build(typing_payload, number, guilds))
+        if number % 1000 == 0:
+            await asyncio.sleep(0)
+    return ready, time.perf_counter() - start - building
+
+
+def child(guilds, messages):
+    """Runs one mode in this process and prints its numbers as JSON."""
+    start = time.perf_counter()
+    import bot
+    imported = time.perf_counter() - start
+    rss_imported = memstats.rss()
+    ready, chatter = asyncio.run(_feed(bot.bot, guilds, messages))
+    state = bot.bot._connection
+    print(json.dumps({"import": imported, "ready": ready, "chatter": chatter, "rss_imported": rss_imported,
+                      "rss": memstats.rss(), "guilds_cached": sum(not guild.unavailable for guild in state._guilds.values()),
+                      "messages_cached": len(state._messages or ()), "intents": bot.intents.value}))
+
+
+def main(guilds, messages):
+    print(f"{guilds} guilds, {messages} messages")
+    print(f"{'mode':>12} {'import s':>9} {'ready s':>8} {'chatter s':>10} {'RSS MB':>7} {'growth MB':>10} {'guilds':>7} {'messages':>9}")
+    with tempfile.TemporaryDirectory() as directory:
+        for mode, env in MODES.items():
+            env = dict(os.environ, CLEVER_STATE_DIR="", CLEVER_HISTORY_DIR="", CLEVER_SPILL_PATH=os.path.join(directory, f"{mode}.sqlite3"),
+                       CLEVER_LOG_LEVEL="WARNING", **env)
+            output = subprocess.run([sys.executable, __file__, "--child", str(guilds), str(messages)], env=env, cwd=directory,
+                                    capture_output=True, text=True, check=True).stdout
+            result = json.loads(output.splitlines()[-1])
+            print(f"{mode:>12} {result['import']:9.2f} {result['ready']:8.2f} {result['chatter']:10.2f} "
+                  f"{result['rss'] / 2**20:7.0f} {(result['rss'] - result['rss_imported']) / 2**20:10.0f} "
+                  f"{result['guilds_cached']:>7} {result['messages_cached']:>9}")
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ["--child"]:
+        child(int(sys.argv[2]), int(sys.argv[3]))
+    else:
+        main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000, int(sys.argv[2]) if len(sys.argv) > 2 else 100_000)
@@ -0,0 +1,42 @@
+"""
+Compares the memory used per channel by game.GameData and game.CompactGameData.
+
+Builds a dict like bot.games holding N games in the middle of a turn (rolled, one die
+taken) and reports the bytes allocated per game, as measured by tracemalloc.
+
+Usage: python benchmarks/bench_memory.py [N ...]
+"""
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dice_rng
+import game
+
+
+def bytes_per_game(count, compact):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    games = {}
+    for i in range(count):
+        game_data = game.new_game(i % 4 + 1, compact=compact, dice_stream=dice_rng.DiceStream(i))
+        game_data.roll_dice()
+        game_data.choose_die(game_data.dice_colors[i % 6])
+        games[1_000_000_000_000_000_000 + i] = game_data
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / count
+
+
+def main(counts):
+    print(f"{'games':>8} {'GameData':>10} {'Compact':>10} {'saved':>7}")
+    for count in counts:
+        full = bytes_per_game(count, compact=False)
+        compact = bytes_per_game(count, compact=True)
+        print(f"{count:>8} {full:>10.0f} {compact:>10.0f} {1 - compact / full:>7.0%}")
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [10_000, 100_000])
@@ -0,0 +1,185 @@
+"""
+Times the hot path of a turn: every GameData operation and the dice messages, for every
+variant in DICE_COLORS and both game classes (GameData and CompactGameData).
+
+Each benchmark prepares its games first and only times the operation itself, with the garbage
+collector off as in timeit. The result is the median nanoseconds per operation over the
+repeats. Shared and throttled machines change speed by tens of percent from second to second,
+so each repeat also times a fixed pure Python workload (calibrate) straight after the
+operation, and runs are compared by the median ratio of the two ("relative"), which cancels out
+how fast the machine happened to be. Its noise is the interquartile range of the ratios over
+their median.
+
+Results can be saved as a baseline and later runs compared against it; --compare exits with
+status 1 if any operation's relative cost grew by more than --threshold, or by more than
+NOISE_FACTOR times its noise in either run if that is more. Operations that look slower are
+timed again, and only count if they are still slower, so one disturbed run doesn't fail it.
+Timings depend on the machine, so baselines aren't committed: a CI job runs --save on the base
+commit and --compare on the change in the same job (see the README).
+
+Usage:
+    python benchmarks/bench_ops.py [--filter roll] [--save benchmarks/baseline.json]
+    python benchmarks/bench_ops.py --compare benchmarks/baseline.json [--threshold 0.2]
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dice_rng
+import game
+import renderer
+
+LOOPS = 2_000
+REPEATS = 15
+# An operation's allowed slowdown is at least this many times its noise
+NOISE_FACTOR = 3
+
+
+def _game(game_number, compact, values=None, choose=None):
+    """A game with the given available values (one per color, in DICE_COLORS order) and optionally one die taken."""
+    game_data = game.new_game(game_number, compact=compact, dice_stream=dice_rng.DiceStream(0))
+    if values is not None:
+        game_data.available_dice = dict(zip(game_data.dice_colors, values))
+    if choose is not None:
+        game_data.choose_die(game_data.dice_colors[choose])
+    return game_data
+
+
+# name: (prepare(game_number, compact) -> game, operation(game))
+# The available values 1-6 in color order put the lowest die first and the highest last.
+OPERATIONS = {
+    "new_game": (lambda number, compact: number,
+                 lambda number, compact: game.new_game(number, compact=compact)),
+    "roll_dice": (_game,
+                  lambda game_data, _: game_data.roll_dice()),
+    "reroll_available_dice": (lambda number, compact: _game(number, compact, range(1, 7), choose=0),
+                              lambda game_data, _: game_data.reroll_available_dice()),
+    "choose_die": (lambda number, compact: _game(number, compact, range(1, 7)),
+                   lambda game_data, _: game_data.choose_die(game_data.dice_colors[0])),
+    "choose_die_discarding": (lambda number, compact: _game(number, compact, range(1, 7)),
+                              lambda game_data, _: game_data.choose_die(game_data.dice_colors[-1])),
+    "return_die": (lambda number, compact: _game(number, compact, range(1, 7), choose=-1),
+                   lambda game_data, _: game_data.return_die(game_data.dice_colors[0])),
+    "reset": (lambda number, compact: _game(number, compact, range(1, 7), choose=2),
+              lambda game_data, _: game_data.reset()),
+    # The message builders themselves, bypassing the renderer's cache
+    "render_dice_state": (lambda number, compact: _game(number, compact, range(1, 7), choose=2).state_key(),
+                          lambda state_key, _: renderer._render_dice_state.__wrapped__(state_key, "")),
+    "render_turn_summary": (lambda number, compact: _game(number, compact, range(1, 7), choose=2).state_key(),
+                            lambda state_key, _: renderer._render_turn_summary.__wrapped__(state_key)),
+    # What a command costs when the state has been shown before
+    "render_dice_state_cached": (lambda number, compact: _game(number, compact, range(1, 7), choose=2),
+                                 lambda game_data, _: renderer.render_dice_state(game_data)),
+}
+
+
+def calibrate(loops=LOOPS):
+    """A fixed workload of dict, attribute and call overhead, like the operations, to time the machine by."""
+    table = {}
+    for number in range(loops * 8):
+        table[number & 63] = str(number).isdigit()
+    return table
+
+
+def time_operation(prepare, operation, game_number, compact, loops=LOOPS, repeats=REPEATS):
+    """
+    Returns (median ns per call, median relative cost, noise) of operation over `repeats` runs
+    of `loops` calls, where the relative cost is its time over that of calibrate() in each run.
+    """
+    times, relative = [], []
+    gc.collect()
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeats):
+            subjects = [prepare(game_number, compact) for _ in range(loops)]
+            start = time.perf_counter_ns()
+            for subject in subjects:
+                operation(subject, compact)
+            elapsed = time.perf_counter_ns() - start
+            start = time.perf_counter_ns()
+            calibrate(loops)
+            times.append(elapsed / loops)
+            relative.append(elapsed / (time.perf_counter_ns() - start))
+    finally:
+        if gc_enabled:
+            gc.enable()
+    median = statistics.median(relative)
+    quartiles = statistics.quantiles(relative, n=4)
+    return statistics.median(times), median, (quartiles[2] - quartiles[0]) / median
+
+
+def benchmarks(name_filter=""):
+    """Returns {"<operation>/game<n>/<class>": (prepare, operation, game number, compact)} for every matching benchmark."""
+    return {f"{name}/game{game_number}/{'compact' if compact else 'full'}": (prepare, operation, game_number, compact)
+            for name, (prepare, operation) in OPERATIONS.items() if name_filter in name
+            for game_number in game.DICE_COLORS for compact in (False, True)}
+
+
+def run(selected, loops=LOOPS, repeats=REPEATS):
+    """
+    Returns {name: median ns per operation}, {name: relative cost} and {name: noise} for the
+    benchmarks in `selected` (see benchmarks()).
+    """
+    results, relative, noise = {}, {}, {}
+    for key, (prepare, operation, game_number, compact) in selected.items():
+        results[key], relative[key], noise[key] = time_operation(prepare, operation, game_number, compact, loops, repeats)
+        print(f"{key:48} {results[key]:10.0f} ns {relative[key]:8.3f} ±{noise[key]:.0%}")
+    return results, relative, noise
+
+
+def regressions(baseline, results, threshold, baseline_noise=None, noise=None):
+    """
+    Returns [(name, baseline, result)] for every result (relative cost) above its baseline by more
+    than threshold, or by more than NOISE_FACTOR times the noise of either run if that is more.
+    """
+    baseline_noise, noise = baseline_noise or {}, noise or {}
+    return [(name, baseline[name], ns) for name, ns in results.items()
+            if name in baseline and ns > baseline[name] * (1 + max(threshold, NOISE_FACTOR * baseline_noise.get(name, 0),
+                                                                    NOISE_FACTOR * noise.get(name, 0)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time GameData operations and message rendering.")
+    parser.add_argument("--filter", default="", help="Only run operations whose name contains this.")
+    parser.add_argument("--loops", type=int, default=LOOPS)
+    parser.add_argument("--repeats", type=int, default=REPEATS)
+    parser.add_argument("--save", metavar="PATH", help="Write the results as a baseline.")
+    parser.add_argument("--compare", metavar="PATH", help="Fail if slower than this baseline.")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Least allowed slowdown as a fraction (default 0.2); noisy operations are allowed more.")
+    args = parser.parse_args()
+
+    selected = benchmarks(args.filter)
+    results, relative, noise = run(selected, args.loops, args.repeats)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"python": platform.python_version(), "results": results, "relative": relative, "noise": noise}, f, indent=1)
+        print(f"Baseline written to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            saved = json.load(f)
+        baseline, baseline_noise = saved["relative"], saved["noise"]
+        slower = regressions(baseline, relative, args.threshold, baseline_noise, noise)
+        if slower:
+            print("Timing the slower operations again")
+            _, relative, noise = run({name: selected[name] for name, _, _ in slower}, args.loops, args.repeats)
+            slower = regressions(baseline, relative, args.threshold, baseline_noise, noise)
+        for name, before, after in slower:
+            print(f"REGRESSION {name}: {before:.3f} -> {after:.3f} of the calibration time ({after / before - 1:+.0%})")
+        if slower:
+            sys.exit(1)
+        print(f"No operation slower than the baseline by more than {args.threshold:.0%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+"""
+Compares the cost of rolling dice with random.randint(1, 6) per die, as game.py used to, and
+with a dice_rng.DiceStream, per die, per roll of all six dice and building GameData's dict.
+
+Usage: python benchmarks/bench_rng.py [N]
+"""
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dice_rng
+import game
+
+
+def main(count):
+    stream = dice_rng.DiceStream(0)
+    colors = game.DICE_COLORS[1]
+    timings = {
+        "randint, 6 dice": timeit.timeit(lambda: [random.randint(1, 6) for _ in range(6)], number=count),
+        "DiceStream.roll(6)": timeit.timeit(lambda: stream.roll(6), number=count),
+        "DiceStream.roll(1) x 6": timeit.timeit(lambda: [stream.roll(1) for _ in range(6)], number=count),
+        # GameData.roll_dice's dict, before and after
+        "randint dict": timeit.timeit(lambda: {color: random.randint(1, 6) for color in colors}, number=count),
+        "DiceStream dict": timeit.timeit(lambda: dict(zip(colors, stream.roll(6))), number=count),
+    }
+
+    baseline = timings["randint, 6 dice"]
+    for name, seconds in timings.items():
+        print(f"{name:28} {seconds / count * 1e9:8.0f} ns per roll ({seconds / count / 6 * 1e9:5.0f} ns per die), "
+              f"{baseline / seconds:.1f}x randint")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
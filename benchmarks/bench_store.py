@@ -0,0 +1,52 @@
+"""
+Measures how long a restart takes to rebuild every channel's game from store.py files.
+
+Writes a snapshot and a log for N channels mid-turn into a temporary directory, then times
+GameStore.load(), which is all bot.setup_hook does before connecting, and building every game
+object, which the bot does lazily per channel in get_game_data.
+
+Usage: python benchmarks/bench_store.py [N]
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dice_rng
+import game
+import store
+
+
+def main(count):
+    with tempfile.TemporaryDirectory() as directory:
+        game_store = store.GameStore(directory)
+        for i in range(count):
+            # Text seeds, like random ones, aren't saved: this is a store without CLEVER_DICE_SEED
+            game_data = game.GameData(i % 4 + 1, dice_rng.DiceStream(f"{i}"))
+            game_data.roll_dice()
+            game_store.record(i, game_data, "roll")
+        game_store.close()
+        game_store.compact()
+        # A log of recent moves on top of the snapshot, as after a crash
+        for i in range(0, count, 10):
+            game_data = game.GameData(i % 4 + 1, dice_rng.DiceStream(f"{i}"))
+            game_data.roll_dice()
+            game_data.choose_die(game_data.dice_colors[0])
+            game_store.record(i, game_data, "choose")
+        game_store.close()
+
+        for compact in (False, True):
+            start = time.perf_counter()
+            states = store.GameStore(directory).load()
+            loaded = time.perf_counter()
+            games = {channel_id: store.build_game(saved, compact=compact) for channel_id, saved in states.items()}
+            built = time.perf_counter()
+            name = "CompactGameData" if compact else "GameData"
+            print(f"{len(games)} games as {name}: load {loaded - start:.3f}s, "
+                  f"rebuild {built - loaded:.3f}s, total {built - start:.3f}s")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,76 @@
+"""
+Compares the dice state messages of full and delta updates (CLEVER_STATE_UPDATES): average
+payload bytes per message and per turn, and messages per turn, over simulated turns of every game.
+
+A turn is /roll, /take of a random available die, and again until three dice are taken or none
+are left, with the occasional /return, then /done. Each command posts one message in both modes;
+delta only changes what the /roll, /take and /return messages say.
+
+Usage: python benchmarks/bench_updates.py [TURNS]
+"""
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dice_rng
+import game
+import renderer
+
+RETURN_CHANCE = 0.1
+
+
+def play(game_number, turns, deltas, seed=0):
+    """Returns the messages posted in `turns` turns, as a list per turn, rendered with deltas (a StateDeltas) or in full."""
+    rng = random.Random(seed)
+    game_data = game.new_game(game_number, dice_stream=dice_rng.DiceStream(seed))
+    channel_id = game_number
+
+    def state(message, rolled=False):
+        if deltas is None:
+            return renderer.render_dice_state(game_data, message)
+        return deltas.render(channel_id, game_data, message, rolled)
+
+    messages = []
+    for _ in range(turns):
+        turn = []
+        taken = 0
+        while taken < 3:
+            if game_data.available_dice:
+                game_data.reroll_available_dice()
+                turn.append(state("Re-rolling available dice...", rolled=True))
+            else:
+                game_data.roll_dice()
+                turn.append(state("Rolling all new dice...", rolled=True))
+            _, message = game_data.choose_die(rng.choice(list(game_data.available_dice)))
+            turn.append(state(message))
+            taken += 1
+            if game_data.discarded_dice_this_round and rng.random() < RETURN_CHANCE:
+                _, message = game_data.return_die(rng.choice(list(game_data.discarded_dice_this_round)))
+                turn.append(state(message))
+            if not game_data.available_dice:
+                break
+        turn.append(renderer.render_turn_summary(game_data))
+        game_data.reset()
+        if deltas is not None:
+            deltas.forget(channel_id)
+        messages.append(turn)
+    return messages
+
+
+def main(turns):
+    print(f"{'game':>4} {'mode':>6} {'messages/turn':>14} {'bytes/message':>14} {'bytes/turn':>11}")
+    for game_number in sorted(game.DICE_COLORS):
+        results = {}
+        for mode, deltas in (("full", None), ("delta", renderer.StateDeltas())):
+            messages = play(game_number, turns, deltas)
+            count = sum(len(turn) for turn in messages)
+            size = sum(len(message.encode()) for turn in messages for message in turn)
+            results[mode] = size
+            print(f"{game_number:>4} {mode:>6} {count / turns:14.2f} {size / count:14.0f} {size / turns:11.0f}")
+        print(f"{'':>4} {'':>6} delta sends {results['delta'] / results['full']:.0%} of the bytes")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
@@ -1,216 +1,287 @@
 """
 Note to self: to update new commands, restart discord client
 """
+import time
+# Process start, for the startup timings; taken before importing discord.py, which is most of the import time
+STARTED = time.perf_counter()
 
 import discord
 # Keep 'commands' for BOT_TOKEN and other potential utilities, but primary interaction will be slash.
 from discord.ext import commands
 from discord import app_commands # Import app_commands
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import signal
 import game
-import random # Make sure random is imported in bot.py for the selective reroll
-
-
-with open("clever.key", "r") as f:
-    BOT_TOKEN = f.read().strip()
-
-# Intents are still needed
-intents = discord.Intents.default()
+import advisor
+import autocomplete
+import config
+import deadline
+import dice_rng
+import diceexpr
+import dispatcher
+import history
+import logs
+import memstats
+import metrics
+import outbound
+import registry
+import renderer
+import scoresheet
+import store
+import tray
+
+logger = logging.getLogger("clever")
+
+if config.LEAN_GATEWAY:
+    # Slash commands and buttons arrive as interactions, which Discord sends whatever the intents,
+    # so no gateway events are needed and no guilds, channels, members or messages are cached
+    intents = discord.Intents.none()
+    client_options = {"max_messages": config.MESSAGE_CACHE_SIZE or None, "chunk_guilds_at_startup": False,
+                      "member_cache_flags": discord.MemberCacheFlags.none()}
+else:
+    # Intents are still needed
+    intents = discord.Intents.default()
+    client_options = {}
 # Message content might not be strictly necessary for slash commands unless you have other plans
 # intents.message_content = True
+if config.PREFIX_COMMANDS:
+    # !syncguild needs guild channel messages, and its guild
+    intents.guilds = intents.guild_messages = True
+if not intents.guilds:
+    # No GUILD_CREATE events will come, so on_ready need not wait for them
+    client_options["guild_ready_timeout"] = 0
 
 # We still use commands.Bot as the base, but we'll attach a CommandTree to it
-bot = commands.Bot(command_prefix="!", intents=intents) # Prefix can be kept for other bot owner commands or removed
-
-# Dice emoji
-white_dice = [None,
-			  "<:die1:790027072998342666>",
-			  "<:die2:790028311756668960>",
-			  "<:die3:790028312167841803>",
-			  "<:die4:790028312348065842>",
-			  "<:die5:790028312386076713>",
-			  "<:die6:790028312495128616>"]
-
-yellow_dice = [None,
-			  "<:yellow1:1420961067227418684>",
-			  "<:yellow2:1420961070041792613>",
-			  "<:yellow3:1420961240045584475>",
-			  "<:yellow4:1420961073804345537>",
-			  "<:yellow5:1420961238728445981>",
-			  "<:yellow6:1420961041483042856>"]
-			  
-purple_dice = [None,
-			  "<:purple1:1420961042732814397>",
-			  "<:purple2:1420961043877986334>",
-			  "<:purple3:1420961045169831936>",
-			  "<:purple4:1420961046868525147>",
-			  "<:purple5:1420961048399188079>",
-			  "<:purple6:1420961050311790782>"]
-			  
-red_dice = [None,
-			  "<:red1:1420961052216266812>",
-			  "<:red2:1420961054376333385>",
-			  "<:red3:1420961056628408470>",
-			  "<:red4:1420961196080889919>",
-			  "<:red5:1420961059958816798>",
-			  "<:red6:1420961194667282593>"]
-			  
-blue_dice = [None,
-			  "<:blue1:1421167198897963099>",
-			  "<:blue2:1421167200491798528>",
-			  "<:blue3:1421167202165329950>",
-			  "<:blue4:1421167204472197140>",
-			  "<:blue5:1421167206078877840>",
-			  "<:blue6:1421167207643091004>"]
-			  
-orange_dice = [None,
-			  "<:orange1:1421167311280406588>",
-			  "<:orange2:1421167301973250169>",
-			  "<:orange3:1421167303533269002>",
-			  "<:orange4:1421167304921579650>",
-			  "<:orange5:1421167307320856709>",
-			  "<:orange6:1421167309526925332>"]
-
-green_dice = [None,
-			  "<:green1:1421167253411463260>",
-			  "<:green2:1421167254841856121>",
-			  "<:green3:1421167256578166784>",
-			  "<:green4:1421167258247626914>",
-			  "<:green5:1421167259883147315>",
-			  "<:green6:1421167261409873961>"]			  
-
-gray_dice = [None,
-			  "<:gray1:1421167236454027417>",
-			  "<:gray2:1421167238106583232>",
-			  "<:gray3:1421167239599755347>",
-			  "<:gray4:1421167242007150653>",
-			  "<:gray5:1421167243756175472>",
-			  "<:gray6:1421167234776043561>"]
-			  
-pink_dice = [None,
-			  "<:pink1:1421167321929744435>",
-			  "<:pink2:1421167323825311754>",
-			  "<:pink3:1421167325389787246>",
-			  "<:pink4:1421167326753193984>",
-			  "<:pink5:1421167328858734744>",
-			  "<:pink6:1421167320797155378>"]
-
-teal_dice = [None,
-			  "<:teal1:1500899902530781194>",
-			  "<:teal2:1500899904459903198>",
-			  "<:teal3:1500899906724827328>",
-			  "<:teal4:1500899908667048178>",
-			  "<:teal5:1500899910176739488>",
-			  "<:teal6:1500899900093763795>"] 
-
-brown_dice = [None,
-			  "<:brown1:1500899872738377851>",
-			  "<:brown2:1500899874114375761>",
-			  "<:brown3:1500899876484157491>",
-			  "<:brown4:1500899879910768804>",
-			  "<:brown5:1500899881710129392>",
-			  "<:brown6:1500899871194877952>"]
-			  
-dice_emoji = {"white": white_dice,
-			  "yellow": yellow_dice,
-			  "purple": purple_dice,
-			  "red": red_dice,
-			  "brown": brown_dice,
-			  "blue": blue_dice,
-			  "navy": blue_dice,
-			  "orange": orange_dice,
-			  "green": green_dice,
-			  "teal": teal_dice,
-			  "gray": gray_dice,
-			  "silver": gray_dice,
-			  "pink": pink_dice}
+if config.SHARD_COUNT:
+    # One of several processes started by launcher.py, each running a group of shards
+    bot = commands.AutoShardedBot(command_prefix="!", intents=intents, shard_count=config.SHARD_COUNT,
+                                  shard_ids=config.SHARD_IDS or None, **client_options)
+else:
+    bot = commands.Bot(command_prefix="!", intents=intents, **client_options) # Prefix can be kept for other bot owner commands or removed
+# Game states per channel; idle games are moved to disk and loaded back on use (see registry.py)
+bot.games = registry.GameRegistry(config.SPILL_PATH, ttl=config.GAME_TTL, max_resident=config.MAX_RESIDENT_GAMES,
+                                  compact=config.COMPACT_STATE, sweep_interval=config.SWEEP_INTERVAL,
+                                  sweep_batch=config.SWEEP_BATCH)
+
+# Runs the game commands of each channel one at a time (see dispatcher.py)
+channel_dispatcher = dispatcher.ChannelDispatcher(max_depth=config.CHANNEL_QUEUE_DEPTH)
+
+# Defers commands about to miss Discord's 3 second deadline, so they can still answer (see deadline.py)
+auto_defer = deadline.AutoDeferrer(margin=config.DEFER_MARGIN)
+
+# Sends every message (see outbound.py)
+sender = outbound.OutboundSender()
+
+# The dice state last shown in each channel, for CLEVER_STATE_UPDATES=delta (see renderer.py)
+state_deltas = renderer.StateDeltas(config.STATE_REFRESH_EVERY) if config.STATE_UPDATES == "delta" and not config.TRAY_MODE else None
+
+# Autocomplete choices for /take and /return, updated as each channel's dice move (see autocomplete.py)
+color_index = autocomplete.ColorIndex(lambda name, value: app_commands.Choice(name=name, value=value))
+
+# Saves every game change so games survive restarts (see store.py)
+game_store = store.GameStore(config.STATE_DIR, flush_interval=config.STORE_FLUSH_INTERVAL,
+                             snapshot_interval=config.STORE_SNAPSHOT_INTERVAL, fsync=config.STORE_FSYNC) if config.STATE_DIR else None
+
+# Every move, for /history and /luck (see history.py)
+history_log = history.HistoryLog(config.HISTORY_DIR, flush_interval=config.HISTORY_FLUSH_INTERVAL,
+                                 retention_days=config.HISTORY_RETENTION_DAYS) if config.HISTORY_DIR else None
+
+def _forget_channel(channel_id):
+    """Drops what is kept per channel for a game spilled to disk."""
+    color_index.forget(channel_id)
+    if history_log:
+        history_log.forget(channel_id)
+
+bot.games.on_spill = _forget_channel
+if history_log:
+    bot.games.on_load = history_log.resume
+
+# Command latency and throughput, served at /metrics if CLEVER_METRICS_PORT is set (see metrics.py)
+bot_metrics = metrics.Metrics()
+logs.command_hooks.append(bot_metrics.record_command)
+
+def _mark_startup(milestone):
+    """Records the first time the bot reaches a startup milestone: imported, setup, ready or first_command."""
+    if milestone not in bot_metrics.startup:
+        bot_metrics.startup[milestone] = time.perf_counter() - STARTED
+        logger.info("Startup: %s after %.3fs", milestone, bot_metrics.startup[milestone])
+
+logs.command_hooks.append(lambda name, interaction, outcome, duration: _mark_startup("first_command"))
+
+def _collect_metrics():
+    """The state of the bot's other parts, read when /metrics is scraped."""
+    games = bot.games.stats()
+    dispatcher_stats = channel_dispatcher.stats()
+    log_stats = logs.stats()
+    deferral_stats = auto_defer.stats()
+    return [
+        ("clever_games", "gauge", "Games by where they are kept.",
+         [({"where": "memory"}, games["resident"]), ({"where": "spilled"}, games["spilled"])]),
+        ("clever_games_rehydrated_total", "counter", "Spilled games loaded back on use.", [({}, games["rehydrated"])]),
+        ("clever_games_evicted_total", "counter", "Games spilled out of memory.", [({}, games["evicted"])]),
+        ("clever_commands_queued", "gauge", "Commands running or waiting for their channel.", [({}, dispatcher_stats["commands_queued"])]),
+        ("clever_commands_rejected_total", "counter", "Commands answered busy because their channel's queue was full.", [({}, dispatcher_stats["rejected"])]),
+        ("clever_discord_calls_total", "counter", "Messages sent to Discord, by kind.",
+         [({"kind": kind}, count) for kind, count in sender.calls.items()]),
+        ("clever_interactions_answered_total", "counter", "Interactions answered, directly or after an automatic deferral.",
+         [({"how": "direct"}, deferral_stats["direct"]), ({"how": "deferred"}, deferral_stats["deferred"])]),
+        ("clever_expirations_prevented_total", "counter", "Deferred interactions answered after Discord's 3 second deadline.", [({}, deferral_stats["prevented"])]),
+        ("clever_deferrals_failed_total", "counter", "Automatic deferrals Discord refused, usually as already expired.", [({}, deferral_stats["failed"])]),
+        ("clever_render_cache_hits_total", "counter", "Rendered messages served from the cache.",
+         [({"cache": name}, info.hits) for name, info in renderer.cache_stats().items()]),
+        ("clever_render_cache_misses_total", "counter", "Rendered messages built.",
+         [({"cache": name}, info.misses) for name, info in renderer.cache_stats().items()]),
+        ("clever_log_records_dropped_total", "counter", "Log records dropped because the log buffer was full.", [({}, log_stats["dropped"])]),
+    ]
+
+bot_metrics.add_collector(_collect_metrics)
+
+# tracemalloc snapshots for /memory (see memstats.py); tracing starts with the first snapshot
+memory_tracer = memstats.Tracer()
+
+def _memory_numbers():
+    """Game sizes and the counts of what discord.py keeps, for /memory and the memory sampler."""
+    return {"games": memstats.game_sizes(bot.games),
+            "spilled": bot.games.stats()["spilled"],
+            "guilds": len(bot.guilds),
+            "users": len(bot.users),
+            "cached_messages": len(bot.cached_messages)}
+
+@bot.event
+async def setup_hook():
+    """
+    Restores saved games and starts the tasks writing game changes and history to disk, spilling
+    idle games, serving metrics, sampling memory and syncing the slash commands. Runs once, before connecting.
+    """
+    if game_store:
+        start = time.perf_counter()
+        states = game_store.load()
+        bot.games.restore(states)
+        logger.info("Restored %d games in %.3fs", len(bot.games), time.perf_counter() - start)
+        bot.store_task = asyncio.create_task(game_store.run())
+    if history_log:
+        bot.history_task = asyncio.create_task(history_log.run())
+    bot.sweeper_task = asyncio.create_task(bot.games.run_sweeper())
+    bot.loop_lag_task = asyncio.create_task(bot_metrics.watch_loop_lag(config.LOOP_LAG_INTERVAL))
+    if config.MEMORY_SAMPLE_INTERVAL:
+        bot.memory_task = asyncio.create_task(memstats.Sampler(config.MEMORY_SAMPLE_PATH, config.MEMORY_SAMPLE_INTERVAL, _memory_numbers).run())
+    if config.METRICS_PORT:
+        bot.metrics_server = await bot_metrics.serve(config.METRICS_HOST, config.METRICS_PORT)
+        logger.info("Serving metrics at http://%s:%d/metrics", config.METRICS_HOST, config.METRICS_PORT)
+    # Tray buttons on messages posted before a restart keep working
+    tray.action_handler = tray_action
+    bot.add_dynamic_items(tray.TrayButton)
+    # The global command tree is shared by every shard, so only the primary process syncs it.
+    # Synced here rather than in on_ready, which runs again after every reconnect, and in the
+    # background, so the gateway connection does not wait for it.
+    if config.PRIMARY:
+        bot.sync_task = asyncio.create_task(_sync_commands())
+    _mark_startup("setup")
 
 @bot.event
 async def on_ready():
-    print(f'Logged in as {bot.user.name}')
-    bot.games = {}  # Dictionary to store game states per channel
-    # Try to sync commands globally. This can take up to an hour to propagate.
-    # For faster testing, you might sync to a specific guild (see commented out sync_guild_commands)
+    # Runs again after every reconnect, so this must not touch game state
+    logger.info("Logged in as %s%s", bot.user.name, f' (shards {config.SHARD_IDS or "all"} of {config.SHARD_COUNT})' if config.SHARD_COUNT else '')
+    _mark_startup("ready")
+
+def _command_tree_hash():
+    """Hashes the slash commands exactly as tree.sync() would upload them, and the application they are for."""
+    payload = [command.to_dict(bot.tree) for command in bot.tree.get_commands()]
+    return hashlib.sha256(json.dumps([bot.application_id, payload], sort_keys=True).encode()).hexdigest()
+
+async def _sync_commands():
+    """
+    Uploads the slash commands to Discord, as CLEVER_SYNC_COMMANDS says. By default only when their
+    hash differs from the last successful sync's, since a sync is slow and rate limited.
+    """
+    if config.SYNC_COMMANDS == "never":
+        return
+    tree_hash = _command_tree_hash()
+    if config.SYNC_COMMANDS == "changed":
+        try:
+            with open(config.COMMAND_HASH_PATH, "r") as f:
+                if f.read().strip() == tree_hash:
+                    logger.info("Commands unchanged since the last sync, not syncing")
+                    return
+        except FileNotFoundError:
+            pass
+    # Global commands can take up to an hour to propagate.
+    # For faster testing, sync to a specific guild with !syncguild.
+    start = time.perf_counter()
     try:
         synced = await bot.tree.sync()
-        print(f"Synced {len(synced)} commands:", [com.name for com in synced])
-    except Exception as e:
-        print(e)
+    except Exception:
+        logger.exception("Syncing commands failed")
+        return
+    logger.info("Synced %d commands in %.2fs: %s", len(synced), time.perf_counter() - start, [com.name for com in synced])
+    if os.path.dirname(config.COMMAND_HASH_PATH):
+        os.makedirs(os.path.dirname(config.COMMAND_HASH_PATH), exist_ok=True)
+    tmp_path = config.COMMAND_HASH_PATH + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(tree_hash)
+    os.replace(tmp_path, config.COMMAND_HASH_PATH)
 
 # --- Helper Functions ---
 def get_game_data(interaction: discord.Interaction) -> game.GameData | None:
     """Retrieves the game data for the channel, returns None if not found."""
     return bot.games.get(interaction.channel_id)
 
-def log(action: str, interaction: discord.Interaction):
-    """Logs interaction"""
-    print(f"LOG: {action:8} | Channel: {interaction.channel_id} | User: {interaction.user}")
-
-async def _send_dice_state_update(interaction: discord.Interaction, game_data: game.GameData, action_message: str = "", is_follow_up: bool = False):
+def save_game(interaction: discord.Interaction, game_data: game.GameData, operation: str):
+    """Updates the channel's color autocomplete, and queues its game state and the move as history to be written to disk, if enabled."""
+    color_index.update(interaction.channel_id, game_data)
+    if game_store:
+        game_store.record(interaction.channel_id, game_data, operation)
+    if history_log:
+        history_log.record(interaction.channel_id, interaction.user.id, operation, game_data)
+
+async def _reject(interaction: discord.Interaction, message: str, outcome: str = "invalid"):
+    """Answers a command that could not be carried out with an ephemeral message, noting why for the command log."""
+    interaction.extras["outcome"] = outcome
+    await sender.respond(interaction, message, ephemeral=True)
+
+async def _send_dice_state_update(interaction: discord.Interaction, game_data: game.GameData, action_message: str = "",
+                                  rolled: bool = False):
     """
-    Constructs and sends a message displaying the current state of all dice categories for a given game.
-    Sorts dice within each category by value, then color.
+    Sends a message displaying the current state of all dice categories for a given game.
+    The message itself is built (and memoized) by renderer.render_dice_state, or in delta mode
+    by state_deltas, which shows only what changed (rolled says every available die was rolled).
     """
-    response_parts = []
-
-    if action_message:
-        response_parts.append(action_message)
-
-    response_parts.append("\n--- **Current Dice States** ---")
-
-    # Chosen Dice
-    if game_data.chosen_dice_this_round:
-        response_parts.append("\n**Chosen Dice:**")
-        for color, value in game_data.chosen_dice_this_round.items():
-            response_parts.append(f"- {color.capitalize()}: {dice_emoji[color][value]}")
+    with metrics.phase(interaction, "render"):
+        if state_deltas is not None:
+            full_response = state_deltas.render(interaction.channel_id, game_data, action_message, rolled)
+        else:
+            full_response = renderer.render_dice_state(game_data, action_message)
+
+    if config.TRAY_MODE:
+        await sender.respond(interaction, full_response, view=tray.build_view(interaction.channel_id, game_data))
     else:
-        response_parts.append("\n**Chosen Dice:** None")
+        await sender.respond(interaction, full_response)
 
-    # Available Dice
+def _roll_dice(interaction: discord.Interaction, game_data: game.GameData) -> str:
+    """Re-rolls the available dice, or rolls all dice if none are available. Returns a description of the roll."""
     if game_data.available_dice:
-        response_parts.append("\n**Available Dice (for choosing or re-rolling):**")
-        sorted_available = sorted(game_data.available_dice.items(), key=lambda x: (x[1], x[0]))
-        for color, value in sorted_available:
-            response_parts.append(f"- {color.capitalize()}: {dice_emoji[color][value]}")
-    else:
-        response_parts.append("\n**Available Dice:** None")
-
-    # Discarded Dice
-    if game_data.discarded_dice_this_round:
-        response_parts.append("\n**Discarded Dice (this round):**")
-        sorted_discarded = sorted(game_data.discarded_dice_this_round.items(), key=lambda x: (x[1], x[0]))
-        for color, value in sorted_discarded:
-            response_parts.append(f"- {color.capitalize()}: {dice_emoji[color][value]}")
-    else:
-        response_parts.append("\n**Discarded Dice (this round):** None")
-
-    response_parts.append("\n------------------------------")
-    # Contextual next step advice
-    if not game_data.available_dice and (game_data.chosen_dice_this_round or game_data.discarded_dice_this_round):
-        response_parts.append("All dice have been processed for this roll! Use `/roll` for a new set of dice if your turn continues, or `/done` if finished.")
-    elif game_data.available_dice:
-        response_parts.append("Use `/take color:<color>` to pick an available die, or `/roll` to re-roll available dice.")
-    else:
-        response_parts.append("Use `/roll` to start a new round with fresh dice.")
-
-    full_response = "\n".join(response_parts)
-
-    if len(full_response) > 2000:
-        full_response = full_response[:1990] + "... (truncated)"
-
-    if is_follow_up:
-        await interaction.followup.send(full_response, ephemeral=False)
-    else:
-        await interaction.response.send_message(full_response)
+        game_data.reroll_available_dice()
+        save_game(interaction, game_data, "reroll")
+        return "Re-rolling available dice..."
+    game_data.roll_dice()
+    save_game(interaction, game_data, "roll")
+    return "Rolling all new dice..."
 
 @bot.tree.error
 async def on_app_command_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
-    # Expired interaction (e.g. bot reconnected after brief disconnect); nothing we can do.
+    # Expired interaction (e.g. bot reconnected after brief disconnect, or a stall too long to defer); nothing we can do.
     if isinstance(error, app_commands.CommandInvokeError) and isinstance(error.original, discord.NotFound) and error.original.code == 10062:
-        print(f"Expired interaction ignored: {interaction.command.name if interaction.command else 'unknown'}")
+        bot_metrics.expired += 1
+        logger.info("Expired interaction ignored: %s", interaction.command.name if interaction.command else "unknown")
         return
-    print(f"Unhandled error in slash command: {error}")
+    logger.error("Unhandled error in slash command", exc_info=error)
     try:
-        await interaction.response.send_message(
+        await sender.respond(
+            interaction,
             "An unexpected error occurred while trying to run that command. I've logged the issue.",
             ephemeral=True
         )
@@ -221,170 +292,501 @@ async def on_app_command_error(interaction: discord.Interaction, error: app_comm
 
 @bot.tree.command(name="ping", description="A simple test command to check if slash commands are working.")
 async def ping_slash(interaction: discord.Interaction):
-    await interaction.response.send_message("Pong!", ephemeral=True)
+    await sender.respond(interaction, "Pong!", ephemeral=True)
 
 
 @bot.tree.command(name="clever_help", description="Prints help.")
+@logs.logged("clever_help")
+@auto_defer.guarded
 async def clever_help_slash(interaction: discord.Interaction):
     """Prints help info."""
-    log("clever_help", interaction)
 
     help_desc = """Instructions for using the Clever bot:
 - `/new_game` - start a new game in this channel.
 - `/roll` - roll the dice. Use this to start your turn, and to reroll any remaining available dice.
 - `/take <color>` - take the available die of the color you give. After you do this, you should /roll again unless you have taken your 3 dice
 - `/return <color>` - return a die from the discarded dice to be available.
-- `/done` - use this after you've taken your 3 dice to display the dice available to others"""
+- `/done` - use this after you've taken your 3 dice to display the dice available to others
+- `/tray` - show every die in this channel's tray
+- `/dice <expression>` - roll any dice, e.g. `2d6w 1d6r`, `4d6kh3` or `3d6+2`
+- `/odds` - show simulated statistics for a turn of this game
+- `/advise` - privately suggest which available die to take
+- `/history` - privately show the last turns played in this channel
+- `/luck` - privately show how well you (or another player) have rolled in this channel
+- `/mark <color> [area] [box]` - mark a die you took on your scoresheet, or one die from the silver platter on another player's turn (That's Pretty Clever)
+- `/bonus <area> <box>` - place a bonus cross you earned in yellow or blue
+- `/sheet` - privately show your scoresheet"""
 
-    await interaction.response.send_message(help_desc)
+    await sender.respond(interaction, help_desc)
 
 
 @bot.tree.command(name="new_game", description="Starts a new game of That's Pretty Clever in this channel.")
 @app_commands.describe(game_number="A number 1-4 for which game you are playing (1 for That's Pretty Clever, 2 for Twice as Clever, etc.).")
+@logs.logged("new_game")
+@auto_defer.guarded
+@channel_dispatcher.serialized
 async def new_game_slash(interaction: discord.Interaction, game_number: int):
     """Creates a new game instance for the current channel."""
-    log("new_game", interaction)
 
     # Create a new GameData object and assign it to the channel
-    bot.games[interaction.channel_id] = game.GameData(game_number)
-
-    names = {1: "That's Pretty Clever",
-             2: "Twice as Clever",
-             3: "Clever Cubed",
-             4: "Clever 4Ever"}
+    game_data = game.new_game(game_number, compact=config.COMPACT_STATE,
+                              dice_stream=dice_rng.stream_for(config.DICE_SEED, f"{interaction.channel_id}:{interaction.id}"))
+    bot.games[interaction.channel_id] = game_data
+    save_game(interaction, game_data, "new_game")
+    if state_deltas is not None:
+        state_deltas.forget(interaction.channel_id)
 
-    await interaction.response.send_message(f"A new game of {names[game_number]} has been started! Use `/roll` to begin.")
+    await sender.respond(interaction, f"A new game of {game.GAME_NAMES[game_number]} has been started! Use `/roll` to begin.")
 
 
 @bot.tree.command(name="roll", description="Rolls dice. Re-rolls available dice or does a full roll if none are available.")
+@logs.logged("roll")
+@auto_defer.guarded
+@channel_dispatcher.serialized
 async def roll_slash(interaction: discord.Interaction):
     """Rolls dice. If dice are already available, re-rolls only those. Otherwise, rolls all 6 dice."""
-    log("roll", interaction)
-
     game_data = get_game_data(interaction)
     if not game_data:
-        await interaction.response.send_message("No game is currently running in this channel. Use `/new_game` to start.", ephemeral=True)
+        await _reject(interaction, "No game is currently running in this channel. Use `/new_game` to start.", "no_game")
         return
 
-    roll_action_description = ""
-    if game_data.available_dice:
-        roll_action_description = "Re-rolling available dice..."
-        game_data.reroll_available_dice()
-    else:
-        roll_action_description = "Rolling all new dice..."
-        game_data.roll_dice()
+    roll_action_description = _roll_dice(interaction, game_data)
 
-    await _send_dice_state_update(interaction, game_data, action_message=roll_action_description)
+    await _send_dice_state_update(interaction, game_data, action_message=roll_action_description, rolled=True)
 
 @bot.tree.command(name="take", description="Takes a die from the available dice.")
 @app_commands.describe(color="The color of the die to take.")
+@logs.logged("take")
+@auto_defer.guarded
+@channel_dispatcher.serialized
 async def take_slash(interaction: discord.Interaction, color: str):
     """Takes a die from the available dice and updates game state."""
-    log("take", interaction)
-
     game_data = get_game_data(interaction)
     if not game_data:
-        await interaction.response.send_message("No game is currently running in this channel. Use `/new_game` to start.", ephemeral=True)
+        await _reject(interaction, "No game is currently running in this channel. Use `/new_game` to start.", "no_game")
         return
 
     # The new game.choose_die method handles all logic, including checks for availability.
     chosen_value, message = game_data.choose_die(color)
 
     if chosen_value is not None:
-        # On a successful choice, send the result message and then the updated state
-        await interaction.response.send_message(message)
-        await _send_dice_state_update(interaction, game_data, is_follow_up=True)
+        # The other players mark dice from the platter this turn (see scoresheet.mark_die)
+        game_data.active_player = interaction.user.id
+        save_game(interaction, game_data, "choose")
+        # On a successful choice, send the result message and the updated state as one message
+        await _send_dice_state_update(interaction, game_data, action_message=message)
     else:
         # On failure (e.g., die not available), send the error message ephemerally.
-        await interaction.response.send_message(message, ephemeral=True)
+        await _reject(interaction, message)
 
 @bot.tree.command(name="return", description="Return a die from the unavailable dice (silver tray) to become available again.")
 @app_commands.describe(color="The color of the die to return.")
+@logs.logged("return")
+@auto_defer.guarded
+@channel_dispatcher.serialized
 async def return_slash(interaction: discord.Interaction, color: str):
     """Return a die from silver tray and updates game state."""
-    log("return", interaction)
-
     game_data = get_game_data(interaction)
     if not game_data:
-        await interaction.response.send_message("No game is currently running in this channel. Use `/new_game` to start.", ephemeral=True)
+        await _reject(interaction, "No game is currently running in this channel. Use `/new_game` to start.", "no_game")
         return
 
     # The game.return_die method handles all logic, including checks for availability.
     chosen_value, message = game_data.return_die(color)
 
     if chosen_value is not None:
-        # On a successful choice, send the result message and then the updated state
-        await interaction.response.send_message(message)
-        await _send_dice_state_update(interaction, game_data, is_follow_up=True)
+        save_game(interaction, game_data, "return")
+        # On a successful choice, send the result message and the updated state as one message
+        await _send_dice_state_update(interaction, game_data, action_message=message)
     else:
         # On failure (e.g., die not available), send the error message ephemerally.
-        await interaction.response.send_message(message, ephemeral=True)
+        await _reject(interaction, message)
+
+def _index_channel(interaction: discord.Interaction) -> bool:
+    """Makes sure the color index knows the channel's game, e.g. one restored at startup; returns whether there is one."""
+    if interaction.channel_id in color_index:
+        return True
+    game_data = get_game_data(interaction)
+    if game_data:
+        color_index.update(interaction.channel_id, game_data)
+    return game_data is not None
+
+@take_slash.autocomplete("color")
+async def take_color_autocomplete(interaction: discord.Interaction, current: str) -> list[app_commands.Choice[str]]:
+    """Offers the channel's available dice, matching what has been typed so far."""
+    if not _index_channel(interaction):
+        return []
+    return color_index.take(interaction.channel_id, current)
+
+@return_slash.autocomplete("color")
+async def return_color_autocomplete(interaction: discord.Interaction, current: str) -> list[app_commands.Choice[str]]:
+    """Offers the channel's dice in the silver tray, matching what has been typed so far."""
+    if not _index_channel(interaction):
+        return []
+    return color_index.give_back(interaction.channel_id, current)
+
+
+@bot.tree.command(name="tray", description="Shows every die in this channel's tray.")
+# Logged as tray_view, since the tray buttons are logged as tray
+@logs.logged("tray_view")
+@auto_defer.guarded
+@channel_dispatcher.serialized
+async def tray_slash(interaction: discord.Interaction):
+    """Shows every die in the channel's game, which delta updates (CLEVER_STATE_UPDATES=delta) leave out."""
+    game_data = get_game_data(interaction)
+    if not game_data:
+        await _reject(interaction, "No game is currently running in this channel. Use `/new_game` to start.", "no_game")
+        return
+    with metrics.phase(interaction, "render"):
+        message = renderer.render_dice_state(game_data)
+    if state_deltas is not None:
+        state_deltas.shown(interaction.channel_id, game_data)
+
+    if config.TRAY_MODE:
+        await sender.respond(interaction, message, view=tray.build_view(interaction.channel_id, game_data))
+    else:
+        await sender.respond(interaction, message)
+
+
+# Dice for /dice and /qroll without CLEVER_DICE_SEED, which are not tied to a channel's game
+expression_stream = dice_rng.DiceStream()
+
+def _expression_stream(interaction: discord.Interaction) -> dice_rng.DiceStream:
+    """Returns the dice for a /dice or /qroll: with CLEVER_DICE_SEED, its own stream, replayable from the interaction."""
+    if config.DICE_SEED:
+        return dice_rng.stream_for(config.DICE_SEED, f"{interaction.channel_id}:{interaction.id}")
+    return expression_stream
 
+async def _roll_expression(interaction: discord.Interaction, expression: str):
+    """Rolls a dice expression (see diceexpr.py) and sends the result."""
+    try:
+        plan = diceexpr.compile_expression(expression)
+    except ValueError as error:
+        await _reject(interaction, str(error))
+        return
+    values, dropped, total = diceexpr.roll(plan, _expression_stream(interaction))
+    with metrics.phase(interaction, "render"):
+        message = renderer.render_dice_roll(plan, values, dropped, total)
+    await sender.respond(interaction, message)
+
+@bot.tree.command(name="dice", description="Rolls any dice, e.g. 2d6w 1d6r, 4d6kh3 or 3d6+2.")
+@app_commands.describe(expression="Dice like 3d6, colored d6 like 2d6w or 1d6red, keep highest/lowest like 4d6kh3, plus or minus numbers.")
+@logs.logged("dice")
+@auto_defer.guarded
+async def dice_slash(interaction: discord.Interaction, expression: str):
+    await _roll_expression(interaction, expression)
 
 @bot.tree.command(name="qroll", description="Rolls the Qwixx dice: two white, red, yellow, green, and blue.")
+@logs.logged("qroll")
+@auto_defer.guarded
 async def qroll_slash(interaction: discord.Interaction):
-    log("qroll", interaction)
-    w1, w2 = random.randint(1, 6), random.randint(1, 6)
-    r, y, g, b = random.randint(1, 6), random.randint(1, 6), random.randint(1, 6), random.randint(1, 6)
-    response = f"{white_dice[w1]} {white_dice[w2]} {red_dice[r]} {yellow_dice[y]} {green_dice[g]} {blue_dice[b]}"
-    await interaction.response.send_message(response)
+    await _roll_expression(interaction, diceexpr.PRESETS["qroll"])
+
+
+_odds = None
+
+def _load_odds():
+    """Returns the statistics written by simulate.py, or None if there are none yet."""
+    global _odds
+    if _odds is None:
+        try:
+            with open(config.ODDS_PATH, "r") as f:
+                _odds = json.load(f)
+        except FileNotFoundError:
+            return None
+    return _odds
+
+
+@bot.tree.command(name="odds", description="Shows simulated statistics for a turn of this channel's game.")
+@app_commands.describe(policy="How the simulated player picks dice.")
+@app_commands.choices(policy=[app_commands.Choice(name="Take the highest die", value="highest"),
+                              app_commands.Choice(name="Take the lowest die", value="lowest"),
+                              app_commands.Choice(name="Take a random die", value="random"),
+                              app_commands.Choice(name="Take the highest die that discards at most one other", value="careful")])
+@logs.logged("odds")
+@auto_defer.guarded
+async def odds_slash(interaction: discord.Interaction, policy: str = "highest"):
+    """Answers from the statistics cached by simulate.py."""
+
+    odds = _load_odds()
+    if odds is None:
+        await _reject(interaction, "No statistics have been computed yet. Run `python simulate.py` on the bot's machine.", "unavailable")
+        return
+    game_data = get_game_data(interaction)
+    game_number = game_data.game_number if game_data else 1
+    await sender.respond(interaction, renderer.render_odds(game.GAME_NAMES[game_number], policy, odds[str(game_number)][policy]))
 
+_advisor = None
+
+async def _get_advisor():
+    """Returns the advice table, opening it (and building it, the first time the bot runs) in a worker thread on first use."""
+    global _advisor
+    if _advisor is None:
+        _advisor = asyncio.ensure_future(asyncio.to_thread(advisor.Advisor, config.ADVICE_PATH))
+    future = _advisor
+    try:
+        return await future
+    except Exception:
+        # Open it again on the next /advise rather than failing every one from now on
+        if _advisor is future:
+            _advisor = None
+        raise
+
+
+@bot.tree.command(name="advise", description="Suggests which available die to take, with exact odds.")
+@logs.logged("advise")
+@auto_defer.guarded(ephemeral=True)
+async def advise_slash(interaction: discord.Interaction):
+    """Shows, privately, the expected result of taking each available die."""
+    game_data = get_game_data(interaction)
+    if not game_data:
+        await _reject(interaction, "No game is currently running in this channel. Use `/new_game` to start.", "no_game")
+        return
+
+    picks = len(game_data.chosen_dice_this_round)
+    if picks >= advisor.PICKS_PER_TURN:
+        await _reject(interaction, "You have already taken 3 dice this turn. Use `/done` to finish.")
+        return
+    if not game_data.available_dice:
+        await _reject(interaction, "There are no dice to take. Use `/roll` first.")
+        return
+
+    options = (await _get_advisor()).advise(game_data.available_dice.values(), picks)
+    await sender.respond(interaction, renderer.render_advice(game_data.available_dice, picks, options), ephemeral=True)
+
+
+@bot.tree.command(name="history", description="Shows the last turns played in this channel.")
+@app_commands.describe(turns="How many turns to show (1-10).")
+@logs.logged("history")
+@auto_defer.guarded(ephemeral=True)
+async def history_slash(interaction: discord.Interaction, turns: app_commands.Range[int, 1, 10] = 1):
+    """Shows, privately, every roll, take, discard and return of the channel's last turns."""
+    if not history_log:
+        await _reject(interaction, "History is not being recorded on this bot.", "unavailable")
+        return
+    recent = await history_log.recent_turns(interaction.channel_id, turns)
+    with metrics.phase(interaction, "render"):
+        message = renderer.render_history(recent)
+    await sender.respond(interaction, message, ephemeral=True)
+
+
+@bot.tree.command(name="luck", description="Shows how well a player has rolled in this channel.")
+@app_commands.describe(player="Whose rolls to show (you if not given).")
+@logs.logged("luck")
+@auto_defer.guarded(ephemeral=True)
+async def luck_slash(interaction: discord.Interaction, player: discord.User | None = None):
+    """Shows, privately, a player's rolled and taken dice compared to fair dice."""
+    if not history_log:
+        await _reject(interaction, "History is not being recorded on this bot.", "unavailable")
+        return
+    player = player or interaction.user
+    stats = await history_log.luck(interaction.channel_id, player.id)
+    with metrics.phase(interaction, "render"):
+        message = renderer.render_luck(player.mention, stats)
+    await sender.respond(interaction, message, ephemeral=True)
 
-@bot.tree.command(name="done", description="Ends your turn, shows unchosen dice, and resets the dice tray.")
-async def done_slash(interaction: discord.Interaction):
-    """Summarizes unchosen dice from the round and resets the game state."""
-    log("done", interaction)
 
+async def _sheet_game(interaction: discord.Interaction) -> game.GameData | None:
+    """Returns the channel's game if it has scoresheets, else answers why not and returns None."""
     game_data = get_game_data(interaction)
     if not game_data:
-        await interaction.response.send_message("No game is currently running in this channel. Use `/new_game` to start.", ephemeral=True)
+        await _reject(interaction, "No game is currently running in this channel. Use `/new_game` to start.", "no_game")
+        return None
+    if game_data.game_number not in scoresheet.SHEETS:
+        await _reject(interaction, "Scoresheets are only available for That's Pretty Clever so far.", "unavailable")
+        return None
+    return game_data
+
+
+@bot.tree.command(name="mark", description="Marks a die you took, or one from the silver platter, on your scoresheet.")
+@app_commands.describe(color="The color of the die you took, or of the die from the platter.",
+                       area="The area of your sheet to mark (the die's color if not given).",
+                       box="Which box, counted from 1, if the number fits more than one.")
+@logs.logged("mark")
+@auto_defer.guarded
+@channel_dispatcher.serialized
+async def mark_slash(interaction: discord.Interaction, color: str, area: str | None = None, box: int | None = None):
+    """Applies a chosen die to the player's scoresheet, with any bonuses it earns."""
+    game_data = await _sheet_game(interaction)
+    if not game_data:
+        return
+    bonuses, message = scoresheet.mark_die(game_data, interaction.user.id, color, area, box - 1 if box else None)
+    if bonuses is None:
+        await _reject(interaction, message)
+        return
+    save_game(interaction, game_data, "mark")
+    await sender.respond(interaction, message)
+
+
+@bot.tree.command(name="bonus", description="Places a bonus cross you earned in yellow or blue.")
+@app_commands.describe(area="The area of the bonus cross.", box="The box to cross, counted from 1 (see /sheet).")
+@logs.logged("bonus")
+@auto_defer.guarded
+@channel_dispatcher.serialized
+async def bonus_slash(interaction: discord.Interaction, area: str, box: int):
+    """Places a pending bonus cross on the player's scoresheet."""
+    game_data = await _sheet_game(interaction)
+    if not game_data:
         return
+    bonuses, message = scoresheet.sheet_for(game_data, interaction.user.id).place_bonus(area.lower(), box - 1)
+    if bonuses is None:
+        await _reject(interaction, message)
+        return
+    save_game(interaction, game_data, "mark")
+    await sender.respond(interaction, message)
 
-    response_parts = ["--- **End of Turn Summary** ---"]
 
-    # Chosen Dice
-    if game_data.chosen_dice_this_round:
-        response_parts.append("\n**Your Chosen Dice:**")
-        for color, value in game_data.chosen_dice_this_round.items():
-            response_parts.append(f"- {color.capitalize()}: {dice_emoji[color][value]}")
-    else:
-        response_parts.append("\n**Your Chosen Dice:** None")
-
-    # Dice for others
-    for_others = sorted(list(game_data.available_dice.items()) + list(game_data.discarded_dice_this_round.items()), key=lambda x: (x[1], x[0]))
-    if for_others:
-        response_parts.append("\n**Dice available to other players:**")
-        for color, value in for_others:
-            response_parts.append(f"- {color.capitalize()}: {dice_emoji[color][value]}")
-    else:
-        response_parts.append("\n**Dice available to other players:** None")
+@bot.tree.command(name="sheet", description="Shows a player's scoresheet for this channel's game.")
+@app_commands.describe(player="Whose sheet to show (yours if not given).")
+@logs.logged("sheet")
+@auto_defer.guarded(ephemeral=True)
+async def sheet_slash(interaction: discord.Interaction, player: discord.User | None = None):
+    """Shows, privately, a player's scoresheet."""
+    game_data = await _sheet_game(interaction)
+    if not game_data:
+        return
+    player = player or interaction.user
+    with metrics.phase(interaction, "render"):
+        message = renderer.render_sheet(scoresheet.sheet_for(game_data, player.id), player.mention)
+    await sender.respond(interaction, message, ephemeral=True)
+
 
-    response_parts.append("\n------------------------------")
-    response_parts.append("The dice tray has been reset. Use `/roll` to start a new turn.")
+@bot.tree.command(name="done", description="Ends your turn, shows unchosen dice, and resets the dice tray.")
+@logs.logged("done")
+@auto_defer.guarded
+@channel_dispatcher.serialized
+async def done_slash(interaction: discord.Interaction):
+    """Summarizes unchosen dice from the round and resets the game state."""
+    game_data = get_game_data(interaction)
+    if not game_data:
+        await _reject(interaction, "No game is currently running in this channel. Use `/new_game` to start.", "no_game")
+        return
 
-    summary_message = "\n".join(response_parts)
+    with metrics.phase(interaction, "render"):
+        summary_message = renderer.render_turn_summary(game_data)
 
     # Reset the game state for the channel
     game_data.reset()
+    save_game(interaction, game_data, "reset")
+    if state_deltas is not None:
+        state_deltas.forget(interaction.channel_id)
+
+    await sender.respond(interaction, summary_message)
+
+
+@bot.tree.command(name="stats", description="Shows the bot's command latency and load (bot owner only).")
+@logs.logged("stats")
+@auto_defer.guarded(ephemeral=True)
+async def stats_slash(interaction: discord.Interaction):
+    """Shows, privately, per command latency percentiles and the bot's load."""
+    if not await bot.is_owner(interaction.user):
+        await _reject(interaction, "Only the bot's owner can see its statistics.", "forbidden")
+        return
+    await sender.respond(interaction, renderer.render_stats(bot_metrics, bot.games.stats(), auto_defer.stats()), ephemeral=True)
+
+
 
-    await interaction.response.send_message(summary_message)
+# Classes counted by /memory, to spot leaked interactions and followup webhooks
+MEMORY_OBJECT_TYPES = ("Interaction", "InteractionResponse", "Webhook", "GameData", "CompactGameData", "DiceStream", "Scoresheet")
+
+@bot.tree.command(name="memory", description="Shows where the bot's memory goes (bot owner only).")
+@app_commands.describe(view="Game sizes and caches, a tracemalloc snapshot compared with the last, or stop tracing.")
+@app_commands.choices(view=[app_commands.Choice(name="Games and caches", value="overview"),
+                            app_commands.Choice(name="Allocation snapshot", value="snapshot"),
+                            app_commands.Choice(name="Stop tracing allocations", value="stop")])
+@logs.logged("memory")
+@auto_defer.guarded(ephemeral=True)
+async def memory_slash(interaction: discord.Interaction, view: str = "overview"):
+    """Shows, privately, the memory used by games and discord.py's caches, or where memory was allocated since the last snapshot."""
+    if not await bot.is_owner(interaction.user):
+        await _reject(interaction, "Only the bot's owner can see its memory use.", "forbidden")
+        return
+    if view == "snapshot":
+        summary = await asyncio.to_thread(memory_tracer.snapshot)
+        message = renderer.render_memory_snapshot(summary)
+    elif view == "stop":
+        if memory_tracer.tracing:
+            memory_tracer.stop()
+        message = "Allocation tracing is off."
+    else:
+        message = renderer.render_memory(memstats.rss(), _memory_numbers(), memstats.live_objects(MEMORY_OBJECT_TYPES), memory_tracer.tracing)
+    await sender.respond(interaction, message, ephemeral=True)
+
+# --- Tray buttons (CLEVER_TRAY_MODE) ---
+@logs.logged("tray")
+@auto_defer.guarded
+@channel_dispatcher.serialized
+async def tray_action(interaction: discord.Interaction, action: str, color: str):
+    """Runs a tray button's action and edits the tray message to show the new state."""
+    game_data = get_game_data(interaction)
+    if not game_data:
+        await _reject(interaction, "No game is currently running in this channel. Use `/new_game` to start.", "no_game")
+        return
+
+    if action == "roll":
+        message = _roll_dice(interaction, game_data)
+    elif action == "done":
+        with metrics.phase(interaction, "render"):
+            summary_message = renderer.render_turn_summary(game_data)
+        game_data.reset()
+        save_game(interaction, game_data, "reset")
+        await sender.edit(interaction, summary_message, view=None)
+        return
+    else:
+        if action == "take":
+            success, message = game_data.choose_die(color)
+            operation = "choose"
+        else:
+            success, message = game_data.return_die(color)
+            operation = "return"
+        if success is None:
+            # The button was stale (e.g. pressed on an older tray message)
+            await _reject(interaction, message)
+            return
+        if action == "take":
+            game_data.active_player = interaction.user.id
+        save_game(interaction, game_data, operation)
+
+    with metrics.phase(interaction, "render"):
+        tray_message = renderer.render_dice_state(game_data, message)
+    await sender.edit(interaction, tray_message, view=tray.build_view(interaction.channel_id, game_data))
 
 
 # --- Optional: Command to sync commands to a specific guild for faster testing ---
 # You would call this once using a prefix command e.g. !syncguild after starting the bot
 # Then discord should show slash commands in that guild much faster.
-@bot.command()
+# Only registered with CLEVER_PREFIX_COMMANDS, which lean gateway mode turns off by default.
+@commands.command()
 @commands.guild_only()
 @commands.is_owner()
 async def syncguild(ctx):
-    print("Running !syncguild")
+    logger.info("Running !syncguild")
     bot.tree.copy_global_to(guild=ctx.guild)
     synced = await bot.tree.sync(guild=ctx.guild)
     await ctx.send(f"Synced {len(synced)} commands to this guild.")
 
+if config.PREFIX_COMMANDS:
+    bot.add_command(syncguild)
+
+
+_mark_startup("imported")
+
 
 if __name__ == '__main__':
+    # Read here rather than at import so loadtest.py can import the bot without a token
+    with open("clever.key", "r") as f:
+        BOT_TOKEN = f.read().strip()
     if BOT_TOKEN == 'YOUR_BOT_TOKEN':
         print("Please replace 'YOUR_BOT_TOKEN' with your actual bot token in bot.py")
     else:
-        bot.run(BOT_TOKEN)
+        # Stop cleanly (saving games) when the launcher or a service manager terminates us
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        logs.setup(config.LOG_LEVEL, logs.parse_sample_rates(config.LOG_SAMPLE), config.LOG_BUFFER_SIZE)
+        # discord.py's own logs go through logs.py too, instead of its default handler
+        bot.run(BOT_TOKEN, log_handler=None)
+        if game_store:
+            game_store.close()
+        if history_log:
+            history_log.close()
+        bot.games.close()
+        logs.stop()
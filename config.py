@@ -0,0 +1,128 @@
+"""
+Runtime settings for the bot.
+
+Every setting can be overridden with an environment variable of the same name prefixed by CLEVER_,
+e.g. CLEVER_RENDER_CACHE_SIZE=4096.
+"""
+import os
+
+
+def _int(name, default):
+    return int(os.environ.get(f"CLEVER_{name}", default))
+
+
+def _float(name, default):
+    return float(os.environ.get(f"CLEVER_{name}", default))
+
+
+def _str(name, default):
+    return os.environ.get(f"CLEVER_{name}", default)
+
+
+def _flag(name, default=False):
+    value = os.environ.get(f"CLEVER_{name}")
+    if value is None:
+        return default
+    return value.lower() in ("1", "true", "yes", "on")
+
+
+# Maximum number of rendered messages kept by each renderer cache.
+RENDER_CACHE_SIZE = _int("RENDER_CACHE_SIZE", 16384)
+# Maximum number of parsed /dice expressions kept (see diceexpr.py).
+DICE_EXPRESSION_CACHE_SIZE = _int("DICE_EXPRESSION_CACHE_SIZE", 1024)
+
+# Store each channel's game as a game.CompactGameData instead of a game.GameData.
+COMPACT_STATE = _flag("COMPACT_STATE")
+
+# Directory holding the game state log and snapshots (see store.py). Empty disables saving games.
+STATE_DIR = _str("STATE_DIR", "state")
+# Seconds between writes of queued game state records.
+STORE_FLUSH_INTERVAL = _float("STORE_FLUSH_INTERVAL", 0.05)
+# Seconds between folding the game state log into a snapshot.
+STORE_SNAPSHOT_INTERVAL = _float("STORE_SNAPSHOT_INTERVAL", 300)
+# fsync the log after every write, so games survive a power loss and not only a crash.
+STORE_FSYNC = _flag("STORE_FSYNC")
+
+# Directory holding every channel's move history, for /history and /luck (see history.py). Empty disables it.
+HISTORY_DIR = _str("HISTORY_DIR", os.path.join("state", "history"))
+# Seconds between writes of queued history events.
+HISTORY_FLUSH_INTERVAL = _float("HISTORY_FLUSH_INTERVAL", 1.0)
+# Days of history kept, checked daily. 0 keeps everything.
+HISTORY_RETENTION_DAYS = _float("HISTORY_RETENTION_DAYS", 0)
+
+# Seconds a game may go unused before it is moved out of memory into the spill file (see registry.py).
+GAME_TTL = _float("GAME_TTL", 6 * 3600)
+# Most games kept in memory; the least recently used are spilled beyond this. 0 for no limit.
+MAX_RESIDENT_GAMES = _int("MAX_RESIDENT_GAMES", 0)
+# SQLite file holding spilled games.
+SPILL_PATH = _str("SPILL_PATH", os.path.join("state", "spill.sqlite3"))
+# Seconds between sweeps for idle games, and the most games spilled per write.
+SWEEP_INTERVAL = _float("SWEEP_INTERVAL", 30)
+SWEEP_BATCH = _int("SWEEP_BATCH", 256)
+
+# Total number of shards in the deployment, or 0 to run unsharded in a single process (see launcher.py).
+SHARD_COUNT = _int("SHARD_COUNT", 0)
+# Comma separated shard ids run by this process. Empty runs every shard in this process.
+SHARD_IDS = [int(shard_id) for shard_id in _str("SHARD_IDS", "").split(",") if shard_id.strip()]
+# Whether this process does the once-per-deployment work, i.e. syncing the global command tree.
+PRIMARY = _flag("PRIMARY", default=not SHARD_IDS or 0 in SHARD_IDS)
+
+# When the primary process uploads the slash commands to Discord: "changed" (only when they differ from
+# the last upload, remembered in COMMAND_HASH_PATH), "always" (every start) or "never".
+SYNC_COMMANDS = _str("SYNC_COMMANDS", "changed")
+COMMAND_HASH_PATH = _str("COMMAND_HASH_PATH", os.path.join("state", "command_tree.sha256"))
+
+# Connect with no gateway intents and with discord.py's message and member caches off: slash commands
+# and buttons arrive as interactions whatever the intents, so the bot need not receive or cache guilds,
+# channels, members or messages. Less memory and a quicker start in many guilds (see benchmarks/bench_gateway.py).
+LEAN_GATEWAY = _flag("LEAN_GATEWAY")
+# Messages discord.py keeps in lean mode, or 0 for none. Only messages received for PREFIX_COMMANDS are cached.
+MESSAGE_CACHE_SIZE = _int("MESSAGE_CACHE_SIZE", 0)
+# Register the !syncguild prefix command, which needs the guilds and guild_messages intents. Off by default in lean mode.
+PREFIX_COMMANDS = _flag("PREFIX_COMMANDS", default=not LEAN_GATEWAY)
+
+# Most commands that may be running or waiting in one channel before others get a "busy" reply.
+CHANNEL_QUEUE_DEPTH = _int("CHANNEL_QUEUE_DEPTH", 8)
+
+# Seconds before Discord's 3 second deadline at which a command that has not answered yet is deferred,
+# to answer with a followup instead (see deadline.py). 0 never defers.
+DEFER_MARGIN = _float("DEFER_MARGIN", 1.0)
+
+# How dice states are posted after /roll, /take and /return: "full" lists every die, "delta" only the dice
+# that moved, with the full state at the start of each turn and every STATE_REFRESH_EVERY messages (see renderer.py).
+# Ignored in TRAY_MODE, which edits one message in place.
+STATE_UPDATES = _str("STATE_UPDATES", "full")
+STATE_REFRESH_EVERY = _int("STATE_REFRESH_EVERY", 10)
+
+# Post dice states with Roll/Take/Return/Done buttons that edit the message in place (see tray.py).
+TRAY_MODE = _flag("TRAY_MODE")
+
+# Turn statistics written by simulate.py and shown by /odds.
+ODDS_PATH = _str("ODDS_PATH", "odds.json")
+
+# Advice table used by /advise, built on first start if missing (see advisor.py).
+ADVICE_PATH = _str("ADVICE_PATH", os.path.join("state", "advice.bin"))
+
+# Lowest level of log records written (see logs.py).
+LOG_LEVEL = _str("LOG_LEVEL", "INFO")
+# Successful commands logged one in N, as command=N pairs, e.g. "roll=10,take=10".
+LOG_SAMPLE = _str("LOG_SAMPLE", "roll=10")
+# Most log records waiting to be written; records beyond this are dropped and counted.
+LOG_BUFFER_SIZE = _int("LOG_BUFFER_SIZE", 10_000)
+
+# Port of the local HTTP server serving Prometheus metrics at /metrics, or 0 for none (see metrics.py).
+# launcher.py gives each process this port plus its first shard id.
+METRICS_PORT = _int("METRICS_PORT", 0)
+METRICS_HOST = _str("METRICS_HOST", "127.0.0.1")
+# Seconds between event loop lag measurements.
+LOOP_LAG_INTERVAL = _float("LOOP_LAG_INTERVAL", 0.5)
+
+# Seconds between memory samples (game sizes, RSS and tracemalloc changes per module) appended to
+# MEMORY_SAMPLE_PATH as JSON lines, or 0 for none (see memstats.py). Sampling turns on tracemalloc.
+MEMORY_SAMPLE_INTERVAL = _float("MEMORY_SAMPLE_INTERVAL", 0)
+MEMORY_SAMPLE_PATH = _str("MEMORY_SAMPLE_PATH", os.path.join("state", "memory.jsonl"))
+
+# Seed for all dice, for replaying games: each game's dice, and each /dice and /qroll, follow from it,
+# the channel id and the id of the interaction that started them. Empty seeds every game randomly
+# (see dice_rng.py).
+DICE_SEED = _str("DICE_SEED", "")
@@ -0,0 +1,94 @@
+"""
+Answers slow commands before Discord gives up on them.
+
+Discord forgets an interaction that has no initial response 3 seconds after it was created, and
+the late answer fails with error 10062 ("Unknown interaction"). Commands usually answer in well
+under a millisecond, but one can be held up behind other commands in its channel, by an event
+loop stall, a slow disk or a slow /advise. AutoDeferrer.guarded starts a timer from the
+interaction's creation time, and if the handler has not answered when only `margin` seconds are
+left, defers the interaction. The handler's answer then goes out as a followup, as outbound.py
+does for every interaction already answered.
+
+The two sides take turns through interaction.extras: outbound.py marks an interaction
+"answering" before its initial response, so no deferral starts after that, and waits for a
+deferral already under way ("deferral") before choosing between a response and a followup.
+
+A deferred slash command shows "thinking..." and the answer replaces it, so whether the answer
+is public is settled by the deferral. Commands that answer privately (/advise, /sheet, ...) are
+guarded with ephemeral=True and defer ephemerally. A public command's rejection, which is meant
+to be ephemeral, is public when it comes this late, since that isn't known when deferring.
+"""
+import asyncio
+import datetime
+import functools
+import logging
+
+logger = logging.getLogger("clever")
+
+# Seconds Discord waits for the initial response to an interaction
+TIMEOUT = 3.0
+
+
+def _age(interaction):
+    """Seconds since Discord created the interaction."""
+    return (datetime.datetime.now(datetime.timezone.utc) - interaction.created_at).total_seconds()
+
+
+class AutoDeferrer:
+    """Defers decorated command handlers that have not answered `margin` seconds before Discord's deadline."""
+
+    def __init__(self, margin=1.0, timeout=TIMEOUT):
+        self.margin = margin
+        self.timeout = timeout
+        # Interactions answered without a deferral, deferred, and deferred and answered after the deadline
+        self.direct = 0
+        self.deferred = 0
+        self.prevented = 0
+        # Deferrals Discord refused, usually because the interaction had already expired
+        self.failed = 0
+
+    def guarded(self, func=None, *, ephemeral=False):
+        """
+        Decorator for a command handler taking the interaction as its first argument, used as
+        @guarded, or as @guarded(ephemeral=True) for a handler that answers privately, so its
+        deferral is private too. A margin of 0 leaves it as is.
+        """
+        if func is None:
+            return functools.partial(self.guarded, ephemeral=ephemeral)
+        if self.margin <= 0:
+            return func
+
+        @functools.wraps(func)
+        async def wrapper(interaction, *args, **kwargs):
+            # Negative delays (interactions already late when they arrive) run on the next loop iteration
+            timer = asyncio.get_running_loop().call_later(self.timeout - self.margin - _age(interaction),
+                                                          self._start_deferral, interaction, ephemeral)
+            try:
+                return await func(interaction, *args, **kwargs)
+            finally:
+                timer.cancel()
+                if interaction.extras.get("deferred"):
+                    if _age(interaction) > self.timeout:
+                        self.prevented += 1
+                elif interaction.response.is_done():
+                    self.direct += 1
+        return wrapper
+
+    def _start_deferral(self, interaction, ephemeral):
+        if interaction.extras.get("answering") or interaction.response.is_done():
+            return
+        interaction.extras["deferral"] = asyncio.ensure_future(self._defer(interaction, ephemeral))
+
+    async def _defer(self, interaction, ephemeral):
+        try:
+            await interaction.response.defer(ephemeral=ephemeral)
+        except Exception:
+            self.failed += 1
+            logger.warning("Could not defer interaction %s after %.2fs", interaction.id, _age(interaction), exc_info=True)
+            return
+        interaction.extras["deferred"] = True
+        self.deferred += 1
+
+    def stats(self):
+        """Returns how many interactions were answered directly or deferred, and how many expirations deferring prevented."""
+        return {"direct": self.direct, "deferred": self.deferred, "prevented": self.prevented, "failed": self.failed}
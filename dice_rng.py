@@ -0,0 +1,126 @@
+"""
+Seeded, buffered dice for GameData, CompactGameData and /dice (see diceexpr.py).
+
+Each game gets its own DiceStream: blake2b keyed with the stream's seed, run in counter mode,
+gives 32 random bytes per block. One bytes.translate call turns a whole block into die values,
+mapping byte b to b % 6 + 1 and dropping bytes 252-255, so all six values stay exactly equally
+likely, as with random.randint(1, 6). Rolls are then slices of the buffered block, so a roll
+costs two blake2b calls about every five turns instead of a randint call per die.
+
+The same seed always gives the same dice, so a game can be replayed. With CLEVER_DICE_SEED set,
+bot.py seeds each game from it, the channel id and the id of the /new_game interaction (see
+stream_for), and each /dice and /qroll from it, the channel id and its own interaction id;
+otherwise every stream is seeded from os.urandom. The seed and position of a stream made by
+stream_for are saved with its game (see store.saved_game), so a game restored after a restart,
+or loaded back after being spilled, goes on rolling the dice it would have rolled. Randomly
+seeded streams aren't saved, since there is nothing to replay: such a game starts a new one.
+"""
+import hashlib
+import os
+
+BLOCK_SIZE = 32
+# Most sides roll_sides() supports, so that a die value fits in a byte
+MAX_SIDES = 255
+# Seeds from stream_for are below this, so they fit a signed 64-bit SQLite integer
+SEED_LIMIT = 1 << 63
+
+
+def _tables(sides):
+    """Returns the bytes.translate table mapping a random byte to a die value, and the bytes to drop so every value is equally likely."""
+    limit = 256 - 256 % sides
+    return bytes(byte % sides + 1 if byte < limit else 0 for byte in range(256)), bytes(range(limit, 256))
+
+
+# Bytes 252-255 are dropped so that 1-6 are equally likely
+_TO_DIE, _REJECTED = _tables(6)
+_OTHER_TABLES = {}
+
+
+class DiceStream:
+    """Die values 1-6 generated a block at a time from a seed."""
+    __slots__ = ("seed", "_counter", "_buffer", "_index")
+
+    def __init__(self, seed=None):
+        if seed is None:
+            # Bytes rather than an int, so that saved() leaves it out
+            seed = os.urandom(8)
+        self.seed = seed
+        self._counter = 0
+        self._buffer = b""
+        self._index = 0
+
+    @classmethod
+    def resume(cls, seed, position):
+        """Returns a stream with `seed` going on from `position` (see position())."""
+        stream = cls(seed)
+        counter, remaining = position >> 8, position & 0xFF
+        # The unused values are the last ones of the blocks before the counter
+        buffer = b""
+        while len(buffer) < remaining:
+            counter -= 1
+            stream._counter = counter
+            buffer = stream._block() + buffer
+        stream._buffer = buffer[len(buffer) - remaining:]
+        stream._counter = position >> 8
+        return stream
+
+    def position(self):
+        """
+        Returns how far the stream has got as an int, for resume(): the blocks made, and the values
+        of the last ones not rolled yet. Only d6 streams can be resumed: roll_sides() isn't counted.
+        """
+        return self._counter << 8 | len(self._buffer) - self._index
+
+    def saved(self):
+        """Returns (seed, position()) for saving with the game, or None if the seed isn't one that can be saved."""
+        if type(self.seed) is not int or not 0 <= self.seed < SEED_LIMIT:
+            return None
+        return (self.seed, self.position())
+
+    def _random_block(self):
+        # The key is derived again for every block rather than kept, since every resident game holds a stream
+        key = hashlib.blake2b(str(self.seed).encode(), digest_size=32).digest()
+        block = hashlib.blake2b(self._counter.to_bytes(8, "little"), key=key, digest_size=BLOCK_SIZE).digest()
+        self._counter += 1
+        return block
+
+    def _block(self):
+        return self._random_block().translate(_TO_DIE, _REJECTED)
+
+    def roll(self, count):
+        """Returns a list of `count` die values."""
+        index = self._index
+        end = index + count
+        if end > len(self._buffer):
+            # Keep the unused values and append new blocks
+            buffer = self._buffer[index:]
+            while len(buffer) < count:
+                buffer += self._block()
+            self._buffer = buffer
+            index, end = 0, count
+        self._index = end
+        return list(self._buffer[index:end])
+
+    def roll_sides(self, count, sides):
+        """Returns a list of `count` values of a die with `sides` sides (2 to MAX_SIDES)."""
+        if sides == 6:
+            return self.roll(count)
+        tables = _OTHER_TABLES.get(sides)
+        if tables is None:
+            tables = _OTHER_TABLES[sides] = _tables(sides)
+        # Not buffered like d6 rolls: values left over in the last block are dropped
+        values = b""
+        while len(values) < count:
+            values += self._random_block().translate(*tables)
+        return list(values[:count])
+
+
+def stream_for(seed, name):
+    """
+    Returns a new stream for `name` (e.g. a channel and interaction id) derived from a
+    deployment-wide seed, or a randomly seeded stream if seed is empty.
+    """
+    if not seed:
+        return DiceStream()
+    digest = hashlib.blake2b(f"{seed}:{name}".encode(), digest_size=8).digest()
+    return DiceStream(int.from_bytes(digest, "little") % SEED_LIMIT)
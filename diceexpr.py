@@ -0,0 +1,127 @@
+"""
+Dice expressions for /dice, e.g. "2d6w 1d6r 1d6y", "4d6kh3" or "3d6+2".
+
+An expression is a list of terms separated by spaces, + or -:
+
+- NdS rolls N dice with S sides (N defaults to 1): 3d6, d20
+- a color after a d6, as a name or letter from TAGS, shows the dice as that color's emoji: 2d6w, 1d6red
+- khK or klK after the dice keeps only the K highest or lowest: 4d6kh3, 2d20kl1
+- a number is added (or subtracted): 3d6+2, 1d20-1
+
+compile_expression() parses an expression into a Plan once and keeps it in an LRU cache, so a
+repeated expression costs a dictionary lookup. The plan records what roll() and the renderer
+would otherwise work out per roll: how many d6 there are, so they all come from a single
+DiceStream.roll call, whether the total is a plain sum, and for colored dice only (like /qroll)
+the emoji table of every die, so the message is one join.
+"""
+import collections
+import functools
+import re
+
+import config
+import dice_rng
+from dice_emoji import dice_emoji
+
+MAX_DICE = 100
+MAX_MODIFIER = 1000
+# Letters for the usual die colors; any color in dice_emoji can also be given by name
+TAGS = {"w": "white", "r": "red", "y": "yellow", "g": "green", "b": "blue", "o": "orange", "p": "purple",
+        **{color: color for color in dice_emoji}}
+# Expressions available as their own commands
+PRESETS = {"qroll": "2d6w 1d6r 1d6y 1d6g 1d6b"}
+
+_TERM = re.compile(r"([+-]?)\s*([^\s+-]+)")
+_DICE = re.compile(r"(\d*)d(\d+)([a-z]*?)(?:k([hl])(\d+))?")
+
+# sign is 1 or -1; keep is "h", "l" or None; color is None for dice shown as numbers
+Term = collections.namedtuple("Term", "sign count sides color keep keep_count")
+# d6_only: every die is a d6, so one stream roll gives every value in order
+# plain_sum: the total is the sum of the values plus the modifier (nothing kept or subtracted)
+# faces: for expressions of colored dice only (like /qroll), whose dice are read one by one and
+# not added up, the emoji table of each die in order; else None
+Plan = collections.namedtuple("Plan", "terms d6_count d6_only plain_sum modifier faces")
+
+
+@functools.lru_cache(maxsize=config.DICE_EXPRESSION_CACHE_SIZE)
+def compile_expression(expression):
+    """Parses an expression into a Plan. Raises ValueError, with a message for the user, if it is not valid."""
+    text = expression.lower()
+    terms = []
+    modifier = 0
+    total_dice = 0
+    position = 0
+    for match in _TERM.finditer(text):
+        if text[position:match.start()].strip():
+            break
+        position = match.end()
+        sign = -1 if match.group(1) == "-" else 1
+        body = match.group(2)
+        if body.isdigit():
+            modifier += sign * int(body)
+            continue
+        dice = _DICE.fullmatch(body)
+        if not dice:
+            raise ValueError(f"Could not read `{body}`. Dice look like `2d6`, `1d6r` or `4d6kh3`.")
+        count = int(dice.group(1) or 1)
+        sides = int(dice.group(2))
+        tag = dice.group(3)
+        keep_count = int(dice.group(5)) if dice.group(4) else None
+        if not 2 <= sides <= dice_rng.MAX_SIDES:
+            raise ValueError(f"`{body}`: dice need 2 to {dice_rng.MAX_SIDES} sides.")
+        if tag and tag not in TAGS:
+            raise ValueError(f"`{body}`: unknown color `{tag}`. Use one of {", ".join(sorted(TAGS))}.")
+        if tag and sides != 6:
+            raise ValueError(f"`{body}`: only d6 can have a color.")
+        if keep_count is not None and not 1 <= keep_count <= count:
+            raise ValueError(f"`{body}`: can only keep 1 to {count} dice.")
+        total_dice += count
+        terms.append(Term(sign, count, sides, TAGS[tag] if tag else None, dice.group(4), keep_count))
+    if text[position:].strip():
+        raise ValueError(f"Could not read `{text[position:].strip()}`.")
+    if not terms:
+        raise ValueError("Give some dice to roll, e.g. `2d6` or `4d6kh3`.")
+    if total_dice > MAX_DICE:
+        raise ValueError(f"At most {MAX_DICE} dice can be rolled at once.")
+    if abs(modifier) > MAX_MODIFIER:
+        raise ValueError(f"Numbers added can be at most {MAX_MODIFIER}.")
+    d6_count = sum(term.count for term in terms if term.sides == 6)
+    plain_sum = not any(term.keep or term.sign < 0 for term in terms)
+    faces = None
+    if plain_sum and not modifier and all(term.color for term in terms):
+        faces = tuple(dice_emoji[term.color] for term in terms for _ in range(term.count))
+    return Plan(tuple(terms), d6_count, d6_count == total_dice, plain_sum, modifier, faces)
+
+
+def roll(plan, stream):
+    """
+    Rolls a Plan with a dice_rng.DiceStream. Returns (values, dropped, total): the values of every
+    die in the order of the plan's terms, the indexes of dice not kept, and the total.
+    """
+    if plan.d6_only:
+        values = stream.roll(plan.d6_count)
+    else:
+        d6 = stream.roll(plan.d6_count) if plan.d6_count else ()
+        values = []
+        index = 0
+        for term in plan.terms:
+            if term.sides == 6:
+                values += d6[index:index + term.count]
+                index += term.count
+            else:
+                values += stream.roll_sides(term.count, term.sides)
+    if plan.plain_sum:
+        return values, (), sum(values) + plan.modifier
+
+    dropped = set()
+    total = plan.modifier
+    start = 0
+    for term in plan.terms:
+        term_values = values[start:start + term.count]
+        if term.keep:
+            order = sorted(range(term.count), key=term_values.__getitem__, reverse=term.keep == "h")
+            dropped.update(start + i for i in order[term.keep_count:])
+            total += term.sign * sum(term_values[i] for i in order[:term.keep_count])
+        else:
+            total += term.sign * sum(term_values)
+        start += term.count
+    return values, dropped, total
@@ -0,0 +1,83 @@
+"""
+Runs the game commands of one channel strictly one at a time, in the order they arrive.
+
+Handlers await Discord between reading and rendering the game, so two commands in the same
+channel could otherwise interleave and show a state that never existed. Commands in different
+channels still run concurrently. A channel with too many commands waiting gets an ephemeral
+"busy" reply instead of another place in the queue.
+"""
+import asyncio
+import bisect
+import functools
+import time
+
+BUSY_MESSAGE = "This channel's dice are busy with other commands. Please try again in a moment."
+
+# Upper bounds, in seconds, of the queue wait time histogram buckets (the last bucket is unbounded)
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 2.5)
+
+
+class _ChannelQueue:
+    __slots__ = ("lock", "depth")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.depth = 0
+
+
+class ChannelDispatcher:
+    """Serializes decorated command handlers per interaction.channel_id."""
+
+    def __init__(self, max_depth=8):
+        self.max_depth = max_depth
+        self._queues = {}
+        self.rejected = 0
+        self.waits = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.wait_buckets = [0] * (len(WAIT_BUCKETS) + 1)
+
+    def serialized(self, func):
+        """Decorator for a command handler taking the interaction as its first argument."""
+        @functools.wraps(func)
+        async def wrapper(interaction, *args, **kwargs):
+            channel_id = interaction.channel_id
+            queue = self._queues.get(channel_id)
+            if queue is None:
+                queue = self._queues[channel_id] = _ChannelQueue()
+            elif queue.depth >= self.max_depth:
+                self.rejected += 1
+                interaction.extras["outcome"] = "busy"
+                interaction.extras["answering"] = True
+                await interaction.response.send_message(BUSY_MESSAGE, ephemeral=True)
+                return
+
+            queue.depth += 1
+            queued_at = time.perf_counter()
+            try:
+                async with queue.lock:
+                    wait = interaction.extras["wait"] = time.perf_counter() - queued_at
+                    self._record_wait(wait)
+                    return await func(interaction, *args, **kwargs)
+            finally:
+                queue.depth -= 1
+                if not queue.depth:
+                    del self._queues[channel_id]
+        return wrapper
+
+    def _record_wait(self, seconds):
+        self.waits += 1
+        self.wait_total += seconds
+        if seconds > self.wait_max:
+            self.wait_max = seconds
+        self.wait_buckets[bisect.bisect_left(WAIT_BUCKETS, seconds)] += 1
+
+    def stats(self):
+        """Returns queue depth and wait time statistics."""
+        return {"channels_queued": len(self._queues),
+                "commands_queued": sum(queue.depth for queue in self._queues.values()),
+                "rejected": self.rejected,
+                "waits": self.waits,
+                "wait_mean": self.wait_total / self.waits if self.waits else 0.0,
+                "wait_max": self.wait_max,
+                "wait_buckets": dict(zip(WAIT_BUCKETS + (float("inf"),), self.wait_buckets))}
@@ -0,0 +1,107 @@
+"""
+In-process stand-ins for discord.Interaction and its response and followup, so the command
+callbacks in bot.py can be driven without a connection to Discord (see loadtest.py).
+
+Every HTTP call an interaction would make is recorded on a FakeTransport with the time it
+happened. The transport can delay each call to model a slow Discord, and it answers an initial
+response sent more than INTERACTION_TIMEOUT seconds after the interaction was created with
+discord.NotFound error 10062 ("Unknown interaction"), like Discord does.
+"""
+import asyncio
+import itertools
+import random
+import time
+
+import discord
+
+INTERACTION_TIMEOUT = 3.0
+
+_ids = itertools.count(1)
+
+
+class _HTTPResponse:
+    # The attributes discord.HTTPException reads from an aiohttp response
+    status = 404
+    reason = "Not Found"
+
+
+class FakeTransport:
+    """Records (time, interaction id, kind, content, ephemeral) for every call, after an optional delay."""
+
+    def __init__(self, delay=0.0, jitter=0.0, seed=None):
+        self.delay = delay
+        self.jitter = jitter
+        self.rng = random.Random(seed)
+        self.calls = []
+        self.expired = 0
+
+    async def call(self, interaction, kind, content=None, ephemeral=False, initial=False):
+        if self.delay or self.jitter:
+            await asyncio.sleep(self.delay + self.rng.random() * self.jitter)
+        now = time.monotonic()
+        if initial and now - interaction.created > INTERACTION_TIMEOUT:
+            self.expired += 1
+            raise discord.NotFound(_HTTPResponse(), {"code": 10062, "message": "Unknown interaction"})
+        self.calls.append((now, interaction.id, kind, content, ephemeral))
+
+
+class FakeResponse:
+    def __init__(self, interaction):
+        self._interaction = interaction
+        self._done = False
+
+    def is_done(self):
+        return self._done
+
+    async def _initial(self, kind, content=None, ephemeral=False):
+        if self._done:
+            raise discord.InteractionResponded(self._interaction)
+        await self._interaction.transport.call(self._interaction, kind, content, ephemeral, initial=True)
+        self._done = True
+
+    async def send_message(self, content=None, *, ephemeral=False, **kwargs):
+        await self._initial("response", content, ephemeral)
+
+    async def defer(self, *, ephemeral=False, thinking=False):
+        await self._initial("defer", ephemeral=ephemeral)
+
+    async def edit_message(self, *, content=None, **kwargs):
+        await self._initial("edit", content)
+
+
+class FakeFollowup:
+    def __init__(self, interaction):
+        self._interaction = interaction
+
+    async def send(self, content=None, *, ephemeral=False, **kwargs):
+        await self._interaction.transport.call(self._interaction, "followup", content, ephemeral)
+
+
+class FakeUser:
+    def __init__(self, user_id):
+        self.id = user_id
+        self.name = f"user{user_id}"
+        self.mention = f"<@{user_id}>"
+
+    def __str__(self):
+        return self.name
+
+
+class FakeInteraction:
+    """What the command callbacks use of a discord.Interaction, for one command in one channel."""
+
+    def __init__(self, transport, channel_id, user_id=1, command=None):
+        self.id = next(_ids)
+        self.transport = transport
+        self.channel_id = channel_id
+        self.guild_id = None
+        self.user = FakeUser(user_id)
+        self.command = command
+        self.extras = {}
+        self.created_at = discord.utils.utcnow()
+        self.created = time.monotonic()
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+
+    async def edit_original_response(self, *, content=None, **kwargs):
+        await self.transport.call(self, "edit_original", content)
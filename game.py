@@ -1,4 +1,4 @@
-import random
+import dice_rng
 
 # Indexed on game number:
 # 1 = That's Pretty Clever
@@ -10,25 +10,46 @@ DICE_COLORS = {1:["blue", "green", "orange", "purple", "yellow", "white"],
                4:["blue", "green", "gray", "pink", "yellow", "white"]
                }
 
+GAME_NAMES = {1: "That's Pretty Clever",
+              2: "Twice as Clever",
+              3: "Clever Cubed",
+              4: "Clever 4Ever"}
+
 class GameData:
     """Holds all data for a single game of That's Pretty Clever."""
-    def __init__(self, game_number):
+    def __init__(self, game_number, dice_stream=None):
         self.available_dice = {}
         self.chosen_dice_this_round = {}
         self.discarded_dice_this_round = {}
         self.dice_colors = DICE_COLORS[game_number]
+        self.game_number = game_number
+        # The game's own dice_rng.DiceStream, created on the first roll if not given
+        self.dice_stream = dice_stream
+        # {user id: scoresheet.Scoresheet}, created on the first mark (see scoresheet.sheet_for)
+        self.sheets = None
+        # {(user id, color)} of the dice marked on a sheet this turn, created on the first mark (see scoresheet.mark_die)
+        self.marked = None
+        # The user id of the player who took dice this turn, who marks the chosen dice rather than the platter
+        self.active_player = None
+
+    def _roll(self, count):
+        if self.dice_stream is None:
+            self.dice_stream = dice_rng.DiceStream()
+        return self.dice_stream.roll(count)
 
     def roll_dice(self):
         """Rolls all six dice for That's Pretty Clever."""
-        self.available_dice = {color: random.randint(1, 6) for color in self.dice_colors}
+        self.available_dice = dict(zip(self.dice_colors, self._roll(len(self.dice_colors))))
         self.chosen_dice_this_round = {}
         self.discarded_dice_this_round = {}
+        self.marked = None
+        self.active_player = None
         return self.available_dice
 
     def reroll_available_dice(self):
         """Rerolls only the dice currently in available_dice."""
-        for color in self.available_dice:
-            self.available_dice[color] = random.randint(1, 6)
+        for color, value in zip(list(self.available_dice), self._roll(len(self.available_dice))):
+            self.available_dice[color] = value
         return self.available_dice
 
     def choose_die(self, color_to_choose):
@@ -99,8 +120,278 @@ class GameData:
         self.available_dice = {}
         self.chosen_dice_this_round = {}
         self.discarded_dice_this_round = {}
+        self.marked = None
+        self.active_player = None
         return "Dice state reset. Ready for a new roll or setup."
 
+    def state_key(self):
+        """
+        Returns a hashable key describing everything shown about the dice state:
+        the game number, the chosen dice in the order they were chosen, and the
+        available and discarded values per color (0 when the die is elsewhere).
+        """
+        return (self.game_number,
+                tuple(self.chosen_dice_this_round.items()),
+                tuple([self.available_dice.get(color, 0) for color in self.dice_colors]),
+                tuple([self.discarded_dice_this_round.get(color, 0) for color in self.dice_colors]))
+
+    def pack(self):
+        """Returns the dice state packed into one int, in the same format CompactGameData stores."""
+        return pack_dice(self.game_number, self.available_dice, self.chosen_dice_this_round, self.discarded_dice_this_round)
+
+    @classmethod
+    def from_packed(cls, game_number, packed):
+        """Creates a game whose dice state is the packed int returned by pack()."""
+        game_data = cls.__new__(cls)
+        game_data.available_dice, game_data.chosen_dice_this_round, game_data.discarded_dice_this_round = unpack_dice(game_number, packed)
+        game_data.dice_colors = DICE_COLORS[game_number]
+        game_data.game_number = game_number
+        game_data.dice_stream = None
+        game_data.sheets = None
+        game_data.marked = None
+        game_data.active_player = None
+        return game_data
+
+# Locations of a die in CompactGameData. NOT_ROLLED dice are in none of the three dicts.
+NOT_ROLLED, AVAILABLE, CHOSEN, DISCARDED = range(4)
+
+# Each die is packed into one byte of CompactGameData._dice, at bit offset 8 * (index in DICE_COLORS):
+# bits 0-2 hold the value (1-6), bits 3-4 the location and bits 5-7 the die's position within its
+# location, so the dict views keep the same order GameData's dicts would have.
+_VALUE_MASK = 0b111
+_LOCATION_SHIFT = 3
+_RANK_SHIFT = 5
+
+_COLOR_INDEX = {game_number: {color: i for i, color in enumerate(colors)}
+                for game_number, colors in DICE_COLORS.items()}
+
+
+def pack_dice(game_number, available, chosen, discarded):
+    """Packs the three dice dicts of a game into one int."""
+    indexes = _COLOR_INDEX[game_number]
+    packed = 0
+    for location, dice in ((AVAILABLE, available), (CHOSEN, chosen), (DISCARDED, discarded)):
+        for rank, (color, value) in enumerate(dice.items()):
+            packed |= (value | (location << _LOCATION_SHIFT) | (rank << _RANK_SHIFT)) << (8 * indexes[color])
+    return packed
+
+
+def unpack_dice(game_number, packed):
+    """Returns the (available, chosen, discarded) dicts for a packed dice state."""
+    colors = DICE_COLORS[game_number]
+    located = ({}, {}, {}, {})
+    # Sorting the dice bytes sorts by rank, since the rank is in the top bits
+    for key in sorted([die << 3 | i for i, die in enumerate(packed.to_bytes(len(colors), "little"))]):
+        die = key >> 3
+        located[(die >> _LOCATION_SHIFT) & 0b11][colors[key & 0b111]] = die & _VALUE_MASK
+    return located[1:]
+
+
+class CompactGameData:
+    """
+    Same game as GameData, stored as one packed int instead of three dicts.
+
+    available_dice, chosen_dice_this_round and discarded_dice_this_round are
+    properties that build a new dict on every access; assigning a dict to
+    them replaces the dice in that location.
+    """
+    __slots__ = ("game_number", "_dice", "dice_stream", "sheets", "marked", "active_player")
+
+    def __init__(self, game_number, dice_stream=None):
+        if game_number not in DICE_COLORS:
+            raise KeyError(game_number)
+        self.game_number = game_number
+        self._dice = 0
+        self.dice_stream = dice_stream
+        self.sheets = None
+        self.marked = None
+        self.active_player = None
+
+    def _roll(self, count):
+        if self.dice_stream is None:
+            self.dice_stream = dice_rng.DiceStream()
+        return self.dice_stream.roll(count)
+
+    @property
+    def dice_colors(self):
+        return DICE_COLORS[self.game_number]
+
+    def _dice_in(self, location):
+        """Returns (rank, color, value) for every die in location, in order."""
+        found = []
+        packed = self._dice
+        for color in DICE_COLORS[self.game_number]:
+            die = packed & 0xFF
+            packed >>= 8
+            if (die >> _LOCATION_SHIFT) & 0b11 == location:
+                found.append((die >> _RANK_SHIFT, color, die & _VALUE_MASK))
+        found.sort()
+        return found
+
+    def _set_location(self, location, dice):
+        """Replaces the dice in location with dice, a list of (color, value) pairs in order."""
+        indexes = _COLOR_INDEX[self.game_number]
+        packed = self._dice
+        for i in range(len(DICE_COLORS[self.game_number])):
+            if (packed >> (8 * i + _LOCATION_SHIFT)) & 0b11 == location:
+                packed &= ~(0xFF << (8 * i))
+        for rank, (color, value) in enumerate(dice):
+            i = indexes[color]
+            die = value | (location << _LOCATION_SHIFT) | (rank << _RANK_SHIFT)
+            packed = (packed & ~(0xFF << (8 * i))) | (die << (8 * i))
+        self._dice = packed
+
+    def _move(self, color, location):
+        """Moves the die of color to the end of location, keeping its value. Returns the value."""
+        value = (self._dice >> (8 * _COLOR_INDEX[self.game_number][color])) & _VALUE_MASK
+        dice = [(c, v) for _, c, v in self._dice_in(location) if c != color]
+        dice.append((color, value))
+        self._set_location(location, dice)
+        return value
+
+    def _location_of(self, color):
+        return (self._dice >> (8 * _COLOR_INDEX[self.game_number][color] + _LOCATION_SHIFT)) & 0b11
+
+    @property
+    def available_dice(self):
+        return {color: value for _, color, value in self._dice_in(AVAILABLE)}
+
+    @available_dice.setter
+    def available_dice(self, dice):
+        self._set_location(AVAILABLE, list(dice.items()))
+
+    @property
+    def chosen_dice_this_round(self):
+        return {color: value for _, color, value in self._dice_in(CHOSEN)}
+
+    @chosen_dice_this_round.setter
+    def chosen_dice_this_round(self, dice):
+        self._set_location(CHOSEN, list(dice.items()))
+
+    @property
+    def discarded_dice_this_round(self):
+        return {color: value for _, color, value in self._dice_in(DISCARDED)}
+
+    @discarded_dice_this_round.setter
+    def discarded_dice_this_round(self, dice):
+        self._set_location(DISCARDED, list(dice.items()))
+
+    def roll_dice(self):
+        """Rolls all six dice for That's Pretty Clever."""
+        packed = 0
+        for i, value in enumerate(self._roll(len(DICE_COLORS[self.game_number]))):
+            die = value | (AVAILABLE << _LOCATION_SHIFT) | (i << _RANK_SHIFT)
+            packed |= die << (8 * i)
+        self._dice = packed
+        self.marked = None
+        self.active_player = None
+        return self.available_dice
+
+    def reroll_available_dice(self):
+        """Rerolls only the dice currently in available_dice."""
+        available = self._dice_in(AVAILABLE)
+        self._set_location(AVAILABLE, [(color, value) for (_, color, _), value in zip(available, self._roll(len(available)))])
+        return self.available_dice
+
+    def choose_die(self, color_to_choose):
+        """
+        Allows a player to choose a die. Implements the "Clever" discard rule.
+        Same return values and messages as GameData.choose_die.
+        """
+        color_to_choose = color_to_choose.lower()
+        if color_to_choose not in self.dice_colors:
+            return None, f"Invalid dice color. Please choose from {", ".join(self.dice_colors)}."
+
+        location = self._location_of(color_to_choose)
+        if location != AVAILABLE:
+            if location == CHOSEN:
+                return None, f"{color_to_choose.capitalize()} die has already been chosen this round."
+            elif location == DISCARDED:
+                return None, f"{color_to_choose.capitalize()} die has already been discarded this round."
+            else:
+                return None, f"{color_to_choose.capitalize()} die is not available to choose."
+
+        chosen_value = self._move(color_to_choose, CHOSEN)
+
+        message = f"You chose the {color_to_choose.capitalize()} die with value {chosen_value}."
+
+        # "Clever" discard rule:
+        remaining = self._dice_in(AVAILABLE)
+        dice_to_discard_due_to_rule = [(color, value) for _, color, value in remaining if value < chosen_value]
+
+        if dice_to_discard_due_to_rule:
+            self._set_location(AVAILABLE, [(color, value) for _, color, value in remaining if value >= chosen_value])
+            discarded = [(color, value) for _, color, value in self._dice_in(DISCARDED)]
+            self._set_location(DISCARDED, discarded + dice_to_discard_due_to_rule)
+            discard_details = [f"{color_d.capitalize()}: {discarded_value}" for color_d, discarded_value in dice_to_discard_due_to_rule]
+            message += "\nDiscarded due to being lower than chosen: " + ", ".join(discard_details) + "."
+
+        return chosen_value, message
+
+    def return_die(self, color_to_choose):
+        """
+        Allows a player to return a die from the silver platter.
+        Same return values and messages as GameData.return_die.
+        """
+        color_to_choose = color_to_choose.lower()
+        if color_to_choose not in self.dice_colors:
+            return None, f"Invalid dice color. Please choose from {", ".join(self.dice_colors)}."
+
+        if self._location_of(color_to_choose) != DISCARDED:
+            return None, f"{color_to_choose.capitalize()} die has not been discarded this round."
+
+        self._move(color_to_choose, AVAILABLE)
+        message = f"You returned the {color_to_choose.capitalize()} die to the available dice pool."
+
+        return True, message
+
+    def reset(self):
+        """Resets the dice state for a new round."""
+        self._dice = 0
+        self.marked = None
+        self.active_player = None
+        return "Dice state reset. Ready for a new roll or setup."
+
+    def state_key(self):
+        """Returns the same key GameData.state_key would for this dice state."""
+        available = []
+        discarded = []
+        packed = self._dice
+        for _ in DICE_COLORS[self.game_number]:
+            die = packed & 0xFF
+            packed >>= 8
+            location = (die >> _LOCATION_SHIFT) & 0b11
+            available.append(die & _VALUE_MASK if location == AVAILABLE else 0)
+            discarded.append(die & _VALUE_MASK if location == DISCARDED else 0)
+        chosen = tuple((color, value) for _, color, value in self._dice_in(CHOSEN))
+        return (self.game_number, chosen, tuple(available), tuple(discarded))
+
+    def pack(self):
+        """Returns the dice state packed into one int."""
+        return self._dice
+
+    @classmethod
+    def from_packed(cls, game_number, packed):
+        """Creates a game whose dice state is the packed int returned by pack()."""
+        game_data = cls(game_number)
+        game_data._dice = packed
+        return game_data
+
+
+def new_game(game_number, compact=False, packed=0, dice_stream=None):
+    """
+    Creates the game state for a channel, as a CompactGameData if compact is set.
+    packed is a dice state returned by pack(), for restoring a saved game.
+    dice_stream is the dice_rng.DiceStream to roll with, by default a randomly seeded one.
+    """
+    cls = CompactGameData if compact else GameData
+    if packed:
+        game_data = cls.from_packed(game_number, packed)
+        game_data.dice_stream = dice_stream
+        return game_data
+    return cls(game_number, dice_stream)
+
+
 # Example usage (can be removed later):
 # This part is important for direct testing of game.py
 if __name__ == '__main__':
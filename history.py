@@ -0,0 +1,309 @@
+"""
+Every roll, take, discard and return, kept per channel after /done resets the dice, for
+/history and /luck.
+
+Each change to a game becomes one or more fixed-width EVENT records appended to
+<directory>/<channel id>.bin: a roll is one ROLL event per die rolled, a take is a TAKE event
+followed by a DISCARD event per die it discarded. record() only packs the events into the
+channel's pending buffer; run() appends every channel's pending events to its file from a
+worker thread every flush_interval seconds, so an event costs the same however long the file
+is and the event loop never waits for the disk.
+
+Readers memory-map a channel's file in a worker thread. recent_turns() unpacks only the end
+of it. luck() reads it as columns: one byte of every event is a single strided slice of the
+map, bytes.translate turns it into a 0/1 mask, and masks are combined with & as ints, so
+counting over millions of events is a few passes in C rather than a Python object per event.
+
+Old events can be dropped with compact(), from the bot (CLEVER_HISTORY_RETENTION_DAYS) or,
+while the bot is stopped, with:
+
+    python history.py compact state/history [--keep-days 365] [--keep-events 100000]
+"""
+import argparse
+import asyncio
+import mmap
+import os
+import struct
+import threading
+import time
+
+import game
+
+# kind << 3 | die value, color index in DICE_COLORS, game number, padding, time (epoch seconds),
+# user id, packed dice state after the event
+EVENT = struct.Struct("<BBBxIQQ")
+NEW_GAME, ROLL, TAKE, DISCARD, RETURN, DONE = range(1, 7)
+# Offsets of the fields read as columns
+_KIND_VALUE_OFFSET = 0
+_USER_OFFSET = 8
+# Most events read back per turn asked for by /history, so a channel without a finished turn is not read to the start
+MAX_TURN_EVENTS = 200
+
+
+class HistoryLog:
+    """Per-channel append-only event files."""
+
+    def __init__(self, directory, flush_interval=1.0, retention_days=0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.retention_days = retention_days
+        self._pending = {}
+        self._writing = {}
+        # Packed dice of resident channels in the middle of a turn, to tell which dice a move changed
+        self._last = {}
+        self._lock = threading.Lock()
+        self.events_written = 0
+
+    def path(self, channel_id):
+        return os.path.join(self.directory, f"{channel_id}.bin")
+
+    def resume(self, channel_id, game_data):
+        """Takes the dice of a game loaded into memory (restored or spilled before) as the starting point for its next move."""
+        packed = game_data.pack()
+        if packed:
+            self._last[channel_id] = packed
+
+    def forget(self, channel_id):
+        """Drops the dice kept for a channel whose game left memory; resume() takes them again when it is loaded."""
+        self._last.pop(channel_id, None)
+
+    def record(self, channel_id, user_id, operation, game_data):
+        """Queues the events of a move (a store.OPERATIONS name) just made on game_data. Never blocks."""
+        packed = game_data.pack()
+        previous = self._last.pop(channel_id, 0)
+        if packed:
+            self._last[channel_id] = packed
+        game_number = game_data.game_number
+        now = int(time.time())
+        if operation == "new_game":
+            self._queue(channel_id, EVENT.pack(NEW_GAME << 3, 0, game_number, now, user_id, packed))
+            return
+        if operation == "reset":
+            self._queue(channel_id, EVENT.pack(DONE << 3, 0, game_number, now, user_id, packed))
+            return
+        events = []
+        discards = []
+        for i in range(len(game.DICE_COLORS[game_number])):
+            die = (packed >> (8 * i)) & 0xFF
+            location = (die >> game._LOCATION_SHIFT) & 0b11
+            previous_location = (previous >> (8 * i + game._LOCATION_SHIFT)) & 0b11
+            value = die & game._VALUE_MASK
+            if operation in ("roll", "reroll"):
+                kind = ROLL if location == game.AVAILABLE else None
+            elif location == previous_location:
+                kind = None
+            elif location == game.CHOSEN:
+                kind = TAKE
+            elif location == game.DISCARDED:
+                kind = DISCARD
+            elif location == game.AVAILABLE and previous_location == game.DISCARDED:
+                kind = RETURN
+            else:
+                kind = None
+            if kind == DISCARD:
+                discards.append(EVENT.pack(kind << 3 | value, i, game_number, now, user_id, packed))
+            elif kind is not None:
+                events.append(EVENT.pack(kind << 3 | value, i, game_number, now, user_id, packed))
+        # Moves that change no dice (e.g. a mark) leave no events, and no empty file
+        if events or discards:
+            self._queue(channel_id, b"".join(events + discards))
+
+    def _queue(self, channel_id, events):
+        pending = self._pending.get(channel_id)
+        if pending is None:
+            self._pending[channel_id] = bytearray(events)
+        else:
+            pending += events
+
+    async def run(self):
+        """Writes pending events every flush_interval seconds, and drops expired ones daily if retention_days is set."""
+        loop = asyncio.get_running_loop()
+        next_compaction = loop.time() + 3600
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+            if self.retention_days and loop.time() >= next_compaction:
+                await asyncio.to_thread(self.compact, self.retention_days)
+                next_compaction = loop.time() + 24 * 3600
+
+    async def flush(self):
+        """Writes pending events in a worker thread."""
+        if self._pending:
+            self._writing, self._pending = self._pending, {}
+            await asyncio.to_thread(self._write, self._writing)
+            self._writing = {}
+
+    def close(self):
+        """Writes pending events. Call once the event loop has stopped."""
+        pending, self._pending = self._pending, {}
+        self._write(pending)
+
+    def _write(self, pending):
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            for channel_id, events in pending.items():
+                with open(self.path(channel_id), "ab") as f:
+                    f.write(events)
+                self.events_written += len(events) // EVENT.size
+
+    def compact(self, keep_days=0, keep_events=0):
+        """Drops events older than keep_days and all but the last keep_events of each channel. Returns events dropped."""
+        with self._lock:
+            return compact(self.directory, keep_days, keep_events)
+
+    def _unwritten(self, channel_id):
+        # Events of the channel not in its file yet, copied on the event loop thread
+        return bytes(self._writing.get(channel_id, b"")) + bytes(self._pending.get(channel_id, b""))
+
+    async def recent_turns(self, channel_id, turns):
+        """Returns the last `turns` turns of the channel, oldest first, each a list of EVENT tuples."""
+        unwritten = self._unwritten(channel_id)
+        return await asyncio.to_thread(self._recent_turns, channel_id, turns, unwritten)
+
+    def _recent_turns(self, channel_id, turns, unwritten):
+        with _map(self.path(channel_id)) as data:
+            end = _whole(data)
+            tail = data[max(0, end - EVENT.size * MAX_TURN_EVENTS * turns):end]
+        return _recent_turns(tail + unwritten, turns)
+
+    async def luck(self, channel_id, user_id):
+        """Returns the user's dice statistics in the channel (see _luck)."""
+        unwritten = self._unwritten(channel_id)
+        return await asyncio.to_thread(self._luck, channel_id, user_id, unwritten)
+
+    def _luck(self, channel_id, user_id, unwritten):
+        with _map(self.path(channel_id)) as data:
+            stats = _luck(data, user_id)
+        if unwritten:
+            for name, count in _luck(unwritten, user_id).items():
+                if isinstance(count, list):
+                    stats[name] = [a + b for a, b in zip(stats[name], count)]
+                else:
+                    stats[name] += count
+        return stats
+
+
+class _map:
+    """Context manager giving a read-only map of path, or b"" if it is empty or missing."""
+
+    def __init__(self, path):
+        self.path = path
+        self.map = None
+
+    def __enter__(self):
+        try:
+            with open(self.path, "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return b""
+                self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return b""
+        return self.map
+
+    def __exit__(self, *exc_info):
+        if self.map is not None:
+            self.map.close()
+
+
+def _whole(data):
+    """Returns the length of data without a partly written final event."""
+    return len(data) - len(data) % EVENT.size
+
+
+def _recent_turns(data, turns):
+    """Groups the events at the end of data into turns, each ending with its DONE event, back to the last NEW_GAME."""
+    groups = []
+    current = []
+    for offset in range(_whole(data) - EVENT.size, -1, -EVENT.size):
+        event = EVENT.unpack_from(data, offset)
+        kind = event[0] >> 3
+        if kind == DONE and current:
+            groups.append(current[::-1])
+            current = []
+            if len(groups) == turns:
+                break
+        current.append(event)
+        if kind == NEW_GAME:
+            break
+    if current and len(groups) < turns:
+        groups.append(current[::-1])
+    return groups[::-1]
+
+
+def _mask(column, byte):
+    """Returns an int with a 1 bit in the low bit of every byte of column equal to byte."""
+    table = bytearray(256)
+    table[byte] = 1
+    return int.from_bytes(column.translate(table), "little")
+
+
+def _luck(data, user_id):
+    """Returns counts of the user's rolled and taken values (index 0 unused), dice discarded and turns finished."""
+    size = _whole(data)
+    stats = {"rolled": [0] * 7, "taken": [0] * 7, "discarded": 0, "turns": 0}
+    if not size:
+        return stats
+    kinds = data[_KIND_VALUE_OFFSET:size:EVENT.size]
+    mine = int.from_bytes(b"\x01" * len(kinds), "little")
+    for k, byte in enumerate(user_id.to_bytes(8, "little")):
+        mine &= _mask(data[_USER_OFFSET + k:size:EVENT.size], byte)
+    for value in range(1, 7):
+        stats["rolled"][value] = (_mask(kinds, ROLL << 3 | value) & mine).bit_count()
+        stats["taken"][value] = (_mask(kinds, TAKE << 3 | value) & mine).bit_count()
+        stats["discarded"] += (_mask(kinds, DISCARD << 3 | value) & mine).bit_count()
+    stats["turns"] = (_mask(kinds, DONE << 3) & mine).bit_count()
+    return stats
+
+
+def compact(directory, keep_days=0, keep_events=0):
+    """Rewrites every channel file in directory without its expired events. Returns how many events were dropped."""
+    cutoff = time.time() - keep_days * 86400 if keep_days else None
+    dropped = 0
+    for name in os.listdir(directory):
+        if not name.endswith(".bin"):
+            continue
+        path = os.path.join(directory, name)
+        with _map(path) as data:
+            count = _whole(data) // EVENT.size
+            first = max(0, count - keep_events) if keep_events else 0
+            if cutoff is not None:
+                # Events are appended in time order, so the first one to keep can be found by bisection
+                low, high = first, count
+                while low < high:
+                    middle = (low + high) // 2
+                    if EVENT.unpack_from(data, middle * EVENT.size)[3] < cutoff:
+                        low = middle + 1
+                    else:
+                        high = middle
+                first = low
+            kept = data[first * EVENT.size:count * EVENT.size]
+            unchanged = first == 0 and len(kept) == os.path.getsize(path)
+        if unchanged:
+            continue
+        dropped += first
+        if not kept:
+            os.remove(path)
+            continue
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(kept)
+        os.replace(tmp_path, path)
+    return dropped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the game history files.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    compact_parser = commands.add_parser("compact", help="Drop old events. Run while the bot is stopped.")
+    compact_parser.add_argument("directory")
+    compact_parser.add_argument("--keep-days", type=float, default=0, help="Drop events older than this.")
+    compact_parser.add_argument("--keep-events", type=int, default=0, help="Keep at most this many events per channel.")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    dropped = compact(args.directory, args.keep_days, args.keep_events)
+    print(f"Dropped {dropped:,} events in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
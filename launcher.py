@@ -0,0 +1,164 @@
+"""
+Runs the bot as several processes, each connected with its own group of shards.
+
+Discord sends every guild's events to exactly one shard, so each process only ever sees
+commands from (and only keeps the games of) channels in its own guilds, and /roll and /take
+load spreads over all the processes. Each process saves its games in its own directory under
+--state-dir. Keep the same --shards and --processes between restarts so every process finds
+its games again.
+
+The process running shard 0 is the primary and is the only one that syncs the global command
+tree. The /advise table is built once, before any process starts, and shared by them all (it is
+only read, and memory-mapped). Processes that exit are restarted, waiting longer after each
+quick failure.
+
+Usage: python launcher.py --processes 4 [--shards 8|auto] [--state-dir state]
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+import advisor
+
+BOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bot.py")
+
+# A worker that stays up this long is considered healthy again
+STABLE_SECONDS = 60
+MAX_BACKOFF_SECONDS = 60
+# Discord allows one shard to identify every 5 seconds (per max_concurrency bucket)
+IDENTIFY_SECONDS = 5
+
+
+def recommended_shard_count(token):
+    """Asks Discord how many shards the bot should use."""
+    request = urllib.request.Request("https://discord.com/api/v10/gateway/bot",
+                                     headers={"Authorization": f"Bot {token}", "User-Agent": "clever-bot launcher"})
+    with urllib.request.urlopen(request, timeout=30) as response:
+        return json.load(response)["shards"]
+
+
+def shard_groups(shard_count, processes):
+    """Splits shard ids 0..shard_count-1 into `processes` contiguous, nearly equal groups."""
+    per_process, extra = divmod(shard_count, processes)
+    groups = []
+    start = 0
+    for index in range(processes):
+        size = per_process + (1 if index < extra else 0)
+        groups.append(list(range(start, start + size)))
+        start += size
+    return [group for group in groups if group]
+
+
+class Worker:
+    """One bot.py process running a group of shards."""
+
+    def __init__(self, shard_ids, shard_count, state_dir, advice_path):
+        self.shard_ids = shard_ids
+        group_dir = os.path.join(state_dir, f"shards-{shard_ids[0]}-{shard_ids[-1]}-of-{shard_count}")
+        self.env = dict(os.environ,
+                        CLEVER_SHARD_COUNT=str(shard_count),
+                        CLEVER_SHARD_IDS=",".join(map(str, shard_ids)),
+                        CLEVER_PRIMARY="1" if 0 in shard_ids else "0",
+                        CLEVER_STATE_DIR=group_dir,
+                        CLEVER_SPILL_PATH=os.path.join(group_dir, "spill.sqlite3"),
+                        CLEVER_HISTORY_DIR=os.path.join(group_dir, "history"),
+                        CLEVER_COMMAND_HASH_PATH=os.path.join(group_dir, "command_tree.sha256"),
+                        CLEVER_ADVICE_PATH=advice_path)
+        if os.environ.get("CLEVER_METRICS_PORT", "0") != "0":
+            # One metrics port per process
+            self.env["CLEVER_METRICS_PORT"] = str(int(os.environ["CLEVER_METRICS_PORT"]) + shard_ids[0])
+        self.process = None
+        self.started = 0.0
+        self.failures = 0
+        self.restart_at = None
+
+    def start(self):
+        print(f"launcher: starting shards {self.shard_ids}")
+        self.process = subprocess.Popen([sys.executable, BOT_PATH], env=self.env)
+        self.started = time.monotonic()
+        self.restart_at = None
+
+    def check(self, now):
+        """Schedules a restart if the process has exited, and does due restarts."""
+        if self.restart_at is not None:
+            if now >= self.restart_at:
+                self.start()
+            return
+        code = self.process.poll()
+        if code is None:
+            return
+        if now - self.started >= STABLE_SECONDS:
+            self.failures = 0
+        delay = min(2 ** self.failures, MAX_BACKOFF_SECONDS)
+        self.failures += 1
+        print(f"launcher: shards {self.shard_ids} exited with code {code}, restarting in {delay}s")
+        self.restart_at = now + delay
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+
+    def wait(self, timeout):
+        if self.process is None:
+            return
+        try:
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the bot as several sharded processes.")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="Number of bot processes (default: one per core).")
+    parser.add_argument("--shards", default=None, help="Total shard count, or 'auto' to ask Discord (default: one per process).")
+    parser.add_argument("--state-dir", default="state", help="Directory holding each process's saved games.")
+    args = parser.parse_args()
+
+    if args.shards == "auto":
+        with open("clever.key", "r") as f:
+            shard_count = recommended_shard_count(f.read().strip())
+    else:
+        shard_count = int(args.shards) if args.shards else args.processes
+    # Built here so the workers don't race to build it on their first /advise
+    advice_path = os.environ.get("CLEVER_ADVICE_PATH") or os.path.join(args.state_dir, "advice.bin")
+    if not os.path.exists(advice_path):
+        print(f"launcher: building the advice table in {advice_path}")
+        advisor.Advisor(advice_path)
+    workers = [Worker(group, shard_count, args.state_dir, advice_path) for group in shard_groups(shard_count, args.processes)]
+    print(f"launcher: {shard_count} shards in {len(workers)} processes")
+
+    stopping = False
+
+    def request_stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    # Stagger the starts so the workers don't all identify at once
+    start_at = time.monotonic()
+    for worker in workers:
+        worker.restart_at = start_at
+        start_at += IDENTIFY_SECONDS * len(worker.shard_ids)
+
+    while not stopping:
+        now = time.monotonic()
+        for worker in workers:
+            worker.check(now)
+        time.sleep(0.5)
+
+    print("launcher: stopping")
+    for worker in workers:
+        worker.stop()
+    for worker in workers:
+        worker.wait(timeout=30)
+
+
+if __name__ == '__main__':
+    main()
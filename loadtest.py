@@ -0,0 +1,193 @@
+"""
+Offline load test: drives the real slash command callbacks in bot.py across many simulated
+channels with fake_discord interactions, and reports command throughput and latency.
+
+Every channel starts a game with /new_game and then plays turns: /roll and /take three times,
+now and then a /return, then /done, with the occasional /qroll in between. Commands arrive at
+random (a Poisson process) at --rate per second in total, each in a random channel, whether or
+not that channel's previous command has finished, so queueing in the channel dispatcher shows
+up in the latency like it would with real players.
+
+Two latencies are reported per command: the handler (arrival to callback return) and the first
+response (arrival to the first message reaching the fake Discord). --delay-ms and --jitter-ms
+add to every Discord call to model a slow Discord, and --stall-ms blocks the event loop that
+long every second, so commands caught behind a stall show up as deferred (see deadline.py).
+Games, and every other file the bot writes, go to a temporary directory.
+
+    python loadtest.py [--channels 2000] [--rate 2000] [--duration 10] [--delay-ms 0] [--jitter-ms 0] [--stall-ms 0]
+"""
+import argparse
+import asyncio
+import collections
+import datetime
+import os
+import random
+import tempfile
+import time
+
+import config
+import fake_discord
+import logs
+
+TURN = ("roll", "take", "roll", "take", "roll", "take", "done")
+RETURN_CHANCE = 0.1
+QROLL_CHANCE = 0.05
+
+
+def percentile(values, fraction):
+    """Returns the value below which `fraction` of the sorted values fall (nearest rank)."""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class LoadTest:
+    def __init__(self, bot_module, transport, channels, seed=None):
+        self.bot = bot_module
+        self.transport = transport
+        self.channel_ids = [1_000_000_000_000_000_000 + i for i in range(channels)]
+        self.rng = random.Random(seed)
+        # Position in TURN for channels that have started a game
+        self.steps = {}
+        self.handler_latencies = []
+        self.arrivals = {}
+        self.commands = collections.Counter()
+        self.errors = collections.Counter()
+
+    def next_command(self, channel_id):
+        """Returns (command name, args) for the next command a player in the channel sends."""
+        step = self.steps.get(channel_id)
+        if step is None:
+            self.steps[channel_id] = 0
+            return "new_game", (self.rng.randint(1, 4),)
+        if self.rng.random() < QROLL_CHANCE:
+            return "qroll", ()
+        game_data = self.bot.bot.games.get(channel_id)
+        if game_data is None:
+            # The channel's /new_game has not run yet; the player carries on regardless
+            return "roll", ()
+        if game_data.discarded_dice_this_round and self.rng.random() < RETURN_CHANCE:
+            return "return", (self.rng.choice(list(game_data.discarded_dice_this_round)),)
+        self.steps[channel_id] = (step + 1) % len(TURN)
+        name = TURN[step]
+        if name == "take":
+            # A player picks one of the dice on the table; with none left the command fails like a real mistake
+            return name, (self.rng.choice(list(game_data.available_dice) or game_data.dice_colors),)
+        return name, ()
+
+    async def _run(self, name, args, channel_id, late=0.0):
+        interaction = fake_discord.FakeInteraction(self.transport, channel_id, user_id=channel_id % 1000)
+        # Discord created the interaction when it arrived, even if the event loop was too busy to see it then
+        interaction.created -= late
+        interaction.created_at -= datetime.timedelta(seconds=late)
+        command = self.bot.bot.tree.get_command(name)
+        interaction.command = command
+        self.arrivals[interaction.id] = interaction.created
+        start = time.perf_counter()
+        try:
+            await command.callback(interaction, *args)
+        except Exception as error:
+            self.errors[type(error).__name__] += 1
+        self.handler_latencies.append(time.perf_counter() - start)
+        self.commands[name] += 1
+
+    async def run(self, rate, duration, stall=0.0):
+        """Issues commands for `duration` seconds, then waits for them (and queued followups) to finish."""
+        loop = asyncio.get_running_loop()
+        tasks = set()
+        if stall:
+            tasks.add(asyncio.create_task(self._stall(stall, duration)))
+        start = loop.time()
+        next_arrival = start
+        while next_arrival < start + duration:
+            await asyncio.sleep(max(0.0, next_arrival - loop.time()))
+            while next_arrival <= loop.time():
+                channel_id = self.rng.choice(self.channel_ids)
+                name, args = self.next_command(channel_id)
+                task = asyncio.create_task(self._run(name, args, channel_id, loop.time() - next_arrival))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                next_arrival += self.rng.expovariate(rate)
+        issued = loop.time() - start
+        await asyncio.gather(*tasks)
+        return issued, loop.time() - start
+
+    async def _stall(self, seconds, duration):
+        # Blocks the whole event loop, like a long synchronous call in a handler would
+        for _ in range(int(duration)):
+            await asyncio.sleep(1.0)
+            time.sleep(seconds)
+
+    def response_latencies(self):
+        """Arrival to first Discord call, for every interaction that got one."""
+        first = {}
+        for at, interaction_id, _, _, _ in self.transport.calls:
+            first.setdefault(interaction_id, at)
+        return sorted(at - self.arrivals[interaction_id] for interaction_id, at in first.items())
+
+    def report(self, issued, elapsed):
+        handler = sorted(self.handler_latencies)
+        response = self.response_latencies()
+        total = sum(self.commands.values())
+        calls = collections.Counter(kind for _, _, kind, _, _ in self.transport.calls)
+        lines = [f"{total:,} commands in {issued:.1f}s over {len(self.steps):,} channels "
+                 f"({total / issued:,.0f} commands/s issued, all finished after {elapsed:.1f}s)",
+                 "  " + ", ".join(f"{name} {count:,}" for name, count in self.commands.most_common())]
+        for label, latencies in (("handler", handler), ("first response", response)):
+            lines.append(f"{label:>15} latency: p50 {percentile(latencies, 0.5) * 1000:.2f}ms, "
+                         f"p95 {percentile(latencies, 0.95) * 1000:.2f}ms, p99 {percentile(latencies, 0.99) * 1000:.2f}ms, "
+                         f"max {(latencies[-1] if latencies else 0) * 1000:.2f}ms")
+        payloads = [len(content.encode()) for _, _, _, content, _ in self.transport.calls if content]
+        lines.append(f"Discord calls: {dict(calls)}, mean payload {sum(payloads) / max(1, len(payloads)):.0f} bytes, "
+                     f"expired interactions: {self.transport.expired}")
+        lines.append(f"Busy rejections: {self.bot.channel_dispatcher.rejected}")
+        lines.append(f"Deferrals: {self.bot.auto_defer.stats()}")
+        if self.errors:
+            lines.append(f"Errors: {dict(self.errors)}")
+        return "\n".join(lines)
+
+
+async def main(args):
+    with tempfile.TemporaryDirectory() as directory:
+        # Point every file the bot writes at the temporary directory before bot.py builds its objects
+        config.STATE_DIR = directory
+        config.SPILL_PATH = os.path.join(directory, "spill.sqlite3")
+        config.ADVICE_PATH = os.path.join(directory, "advice.bin")
+        config.HISTORY_DIR = os.path.join(directory, "history")
+        config.COMMAND_HASH_PATH = os.path.join(directory, "command_tree.sha256")
+        config.MEMORY_SAMPLE_PATH = os.path.join(directory, "memory.jsonl")
+        import bot
+
+        # Log as the bot does, through logs.py, but into /dev/null to keep the report readable
+        devnull = open(os.devnull, "w")
+        logs.setup(config.LOG_LEVEL, logs.parse_sample_rates(config.LOG_SAMPLE), config.LOG_BUFFER_SIZE, stream=devnull)
+        await bot.setup_hook()
+        transport = fake_discord.FakeTransport(args.delay_ms / 1000, args.jitter_ms / 1000, seed=args.seed)
+        load_test = LoadTest(bot, transport, args.channels, seed=args.seed)
+        issued, elapsed = await load_test.run(args.rate, args.duration, args.stall_ms / 1000)
+        print(load_test.report(issued, elapsed))
+        print(f"Log records: {logs.stats()}")
+
+        # Stop every task setup_hook started before the event loop closes
+        for name in ("store_task", "sweeper_task", "history_task", "loop_lag_task", "memory_task", "sync_task"):
+            task = getattr(bot.bot, name, None)
+            if task is not None:
+                task.cancel()
+        bot.game_store.close()
+        bot.history_log.close()
+        print(f"History events: {bot.history_log.events_written:,}")
+        bot.bot.games.close()
+        logs.stop()
+        devnull.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Drive bot.py's commands with fake interactions and report latency.")
+    parser.add_argument("--channels", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=2000, help="Commands per second, over all channels.")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds to issue commands for.")
+    parser.add_argument("--delay-ms", type=float, default=0, help="Added to every Discord call.")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Random extra delay, up to this, per Discord call.")
+    parser.add_argument("--stall-ms", type=float, default=0, help="Blocks the event loop this long every second.")
+    parser.add_argument("--seed", type=int, default=None)
+    asyncio.run(main(parser.parse_args()))
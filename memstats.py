@@ -0,0 +1,206 @@
+"""
+Where the bot's memory goes, for the owner's /memory command and an optional background sampler.
+
+deep_size() adds up sys.getsizeof of everything an object reaches through containers,
+attributes and slots, counting each object once and leaving out what every game shares (color
+names, DICE_COLORS, small ints), so a game's size is what that game alone keeps alive.
+game_sizes() measures the games in memory of a GameRegistry, spread evenly over at most `limit`
+of them so it stays quick with many games.
+
+Tracer wraps tracemalloc. snapshot() starts tracing on first use, and returns how traced memory
+changed since the previous snapshot, per module and at the top allocation sites. A module is one
+of the bot's own files (game, bot, ...) or a library's top-level package (discord, aiohttp, ...).
+
+Sampler appends the same numbers to a file as JSON lines every `interval` seconds. None of this
+runs, and tracemalloc is never started, unless /memory is used or CLEVER_MEMORY_SAMPLE_INTERVAL is set.
+"""
+import asyncio
+import functools
+import gc
+import json
+import os
+import sys
+import sysconfig
+import time
+import tracemalloc
+import types
+
+import game
+
+_ROOT = os.path.dirname(os.path.abspath(__file__))
+_STDLIB = os.path.abspath(sysconfig.get_paths()["stdlib"])
+# Types whose objects are shared by design rather than owned by whatever refers to them
+_SKIPPED_TYPES = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType)
+
+
+@functools.cache
+def _shared_ids():
+    """Ids of the objects every game refers to but none owns."""
+    shared = {id(None), id(True), id(False)}
+    for colors in game.DICE_COLORS.values():
+        shared.add(id(colors))
+        shared.update(id(color) for color in colors)
+    return frozenset(shared)
+
+
+def deep_size(obj):
+    """Returns the bytes used by obj and everything it alone refers to."""
+    seen = set(_shared_ids())
+    size = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, _SKIPPED_TYPES) or (type(obj) is int and -5 <= obj <= 256):
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        if hasattr(obj, "__dict__"):
+            stack.append(obj.__dict__)
+        for cls in type(obj).__mro__:
+            slots = cls.__dict__.get("__slots__", ())
+            for slot in (slots,) if isinstance(slots, str) else slots:
+                if slot not in ("__dict__", "__weakref__") and hasattr(obj, slot):
+                    stack.append(getattr(obj, slot))
+    return size
+
+
+def game_sizes(registry, limit=1000):
+    """
+    Returns the number of games in memory, how many were measured, their mean and largest deep
+    size, their estimated total, and how many there are of each class.
+    """
+    games = registry.resident_games()
+    step = -(-len(games) // limit) if games else 1
+    sizes = [deep_size(game_data) for game_data in games[::step]]
+    classes = {}
+    for game_data in games:
+        name = type(game_data).__name__
+        classes[name] = classes.get(name, 0) + 1
+    mean = sum(sizes) / len(sizes) if sizes else 0
+    return {"games": len(games), "measured": len(sizes), "mean": mean, "max": max(sizes, default=0),
+            "total": round(mean * len(games)), "classes": classes}
+
+
+def live_objects(type_names):
+    """Counts the objects the garbage collector tracks whose class is named in type_names. Walks every object, so it is slow."""
+    counts = dict.fromkeys(type_names, 0)
+    for obj in gc.get_objects():
+        name = type(obj).__name__
+        if name in counts:
+            counts[name] += 1
+    return counts
+
+
+def rss():
+    """Returns the resident memory of the process in bytes, or None where /proc is not available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+@functools.lru_cache(maxsize=4096)
+def module_name(filename):
+    """Returns the bot module (e.g. "game") or top-level library package (e.g. "discord", "asyncio") a file belongs to."""
+    path = os.path.abspath(filename)
+    if os.path.dirname(path) == _ROOT:
+        return os.path.splitext(os.path.basename(path))[0]
+    parts = path.split(os.sep)
+    for packages in ("site-packages", "dist-packages"):
+        if packages in parts[:-1]:
+            return os.path.splitext(parts[parts.index(packages) + 1])[0]
+    if path.startswith(_STDLIB + os.sep):
+        return os.path.splitext(path[len(_STDLIB) + 1:].split(os.sep)[0])[0]
+    return filename
+
+
+class Tracer:
+    """tracemalloc snapshots, each compared with the one before."""
+
+    def __init__(self, frames=1):
+        self.frames = frames
+        self._previous = None
+
+    @property
+    def tracing(self):
+        return tracemalloc.is_tracing()
+
+    def snapshot(self, top=10):
+        """
+        Takes a snapshot, starting tracing first if needed. Returns {"traced", "modules", "sites",
+        "first"}: bytes traced, [(module, bytes, change)] and [(module, file:line, bytes, change)]
+        largest change first, and whether there was no earlier snapshot to compare with (the
+        changes are then the sizes).
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._previous = None
+        snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__),
+                                                              tracemalloc.Filter(False, "<frozen *>"),
+                                                              tracemalloc.Filter(False, "<unknown>")])
+        previous, self._previous = self._previous, snapshot
+        if previous is None:
+            files = [(stat.traceback[0].filename, stat.size, stat.size) for stat in snapshot.statistics("filename")]
+            lines = [(stat.traceback[0], stat.size, stat.size) for stat in snapshot.statistics("lineno")]
+        else:
+            files = [(stat.traceback[0].filename, stat.size, stat.size_diff) for stat in snapshot.compare_to(previous, "filename")]
+            lines = [(stat.traceback[0], stat.size, stat.size_diff) for stat in snapshot.compare_to(previous, "lineno")]
+
+        modules = {}
+        for filename, size, change in files:
+            total = modules.setdefault(module_name(filename), [0, 0])
+            total[0] += size
+            total[1] += change
+        lines.sort(key=lambda line: abs(line[2]), reverse=True)
+        return {"traced": sum(size for _, size, _ in files),
+                "modules": sorted(((module, size, change) for module, (size, change) in modules.items()),
+                                  key=lambda module: abs(module[2]), reverse=True),
+                "sites": [(module_name(frame.filename), f"{os.path.basename(frame.filename)}:{frame.lineno}", size, change)
+                          for frame, size, change in lines[:top]],
+                "first": previous is None}
+
+    def stop(self):
+        """Stops tracing and forgets the last snapshot."""
+        tracemalloc.stop()
+        self._previous = None
+
+
+class Sampler:
+    """Appends a JSON line of memory statistics to `path` every `interval` seconds."""
+
+    def __init__(self, path, interval, collect, top=10):
+        self.path = path
+        self.interval = interval
+        # Returns a dict of the caller's own numbers (e.g. game sizes and cache counts) for each sample
+        self.collect = collect
+        self.top = top
+        self.tracer = Tracer()
+        self.samples = 0
+
+    async def sample(self):
+        """Returns one sample: the time, RSS, the collected numbers and the tracemalloc changes per module and site."""
+        numbers = self.collect()
+        # Snapshots take a while with many traced blocks, so they are summarized off the event loop
+        snapshot = await asyncio.to_thread(self.tracer.snapshot, self.top)
+        return {"time": time.time(), "rss": rss(), **numbers,
+                "traced": snapshot["traced"], "modules": snapshot["modules"], "sites": snapshot["sites"]}
+
+    async def run(self):
+        """Runs forever, writing a sample every interval seconds."""
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        while True:
+            await asyncio.sleep(self.interval)
+            line = json.dumps(await self.sample()) + "\n"
+            await asyncio.to_thread(self._append, line)
+            self.samples += 1
+
+    def _append(self, line):
+        with open(self.path, "a") as f:
+            f.write(line)
@@ -0,0 +1,185 @@
+"""
+Command latency and throughput metrics, served in the Prometheus text format.
+
+Every logged command (see logs.logged) is counted by command and outcome, and its time is
+split into phases, each with a histogram per command:
+
+- wait: queued behind other commands in the channel (dispatcher.py)
+- render: building messages (renderer.py), timed with phase()
+- send: waiting on Discord (outbound.py)
+- logic: the rest, i.e. the game itself
+- total: all of the above
+
+The phases are added up in interaction.extras while the command runs, so recording a command
+is a few bisects and additions. Anything else (games in memory, queue and cache statistics)
+is read only when /metrics is scraped, by collectors registered with add_collector().
+"""
+import asyncio
+import bisect
+import time
+
+# Upper bounds, in seconds, of the histogram buckets (the last bucket is unbounded)
+BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+PHASES = ("wait", "render", "send", "logic", "total")
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def quantile(self, fraction):
+        """Estimates a quantile as the upper bound of the bucket it falls in."""
+        target = fraction * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float("inf")
+
+
+class Metrics:
+    def __init__(self):
+        self.commands = {}
+        self.durations = {}
+        self.expired = 0
+        self.loop_lag = 0.0
+        self.loop_lag_histogram = Histogram()
+        # Seconds from process start to each startup milestone, set by bot.py
+        self.startup = {}
+        self._collectors = []
+
+    def record_command(self, name, interaction, outcome, duration):
+        """Counts a finished command and records its phases. Hooked into logs.logged by bot.py."""
+        key = (name, outcome)
+        self.commands[key] = self.commands.get(key, 0) + 1
+        histograms = self.durations.get(name)
+        if histograms is None:
+            histograms = self.durations[name] = {phase: Histogram() for phase in PHASES}
+        extras = interaction.extras
+        wait = extras.get("wait", 0.0)
+        render = extras.get("render", 0.0)
+        send = extras.get("send", 0.0)
+        histograms["wait"].observe(wait)
+        histograms["render"].observe(render)
+        histograms["send"].observe(send)
+        histograms["logic"].observe(max(0.0, duration - wait - render - send))
+        histograms["total"].observe(duration)
+
+    def add_collector(self, collector):
+        """Registers a function returning [(name, type, help, [(labels, value)])] to run on every scrape."""
+        self._collectors.append(collector)
+
+    async def watch_loop_lag(self, interval=0.5):
+        """Runs forever, measuring how late the event loop wakes up from a sleep of `interval` seconds."""
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(interval)
+            self.loop_lag = max(0.0, loop.time() - start - interval)
+            self.loop_lag_histogram.observe(self.loop_lag)
+
+    def families(self):
+        """Returns every metric as (name, type, help, samples); a histogram's samples are its Histograms."""
+        families = [
+            ("clever_commands_total", "counter", "Commands handled, by command and outcome.",
+             [({"command": name, "outcome": outcome}, count) for (name, outcome), count in self.commands.items()]),
+            ("clever_command_duration_seconds", "histogram", "Time spent per command, by phase.",
+             [({"command": name, "phase": phase}, histogram)
+              for name, histograms in self.durations.items() for phase, histogram in histograms.items()]),
+            ("clever_expired_interactions_total", "counter", "Interactions Discord had expired (error 10062) before the answer.",
+             [({}, self.expired)]),
+            ("clever_event_loop_lag_seconds", "gauge", "How late the event loop last woke up from a sleep.",
+             [({}, self.loop_lag)]),
+            ("clever_event_loop_lag_histogram_seconds", "histogram", "How late the event loop woke up from sleeps.",
+             [({}, self.loop_lag_histogram)]),
+            ("clever_startup_seconds", "gauge", "Seconds from process start to each startup milestone.",
+             [({"milestone": milestone}, seconds) for milestone, seconds in self.startup.items()]),
+        ]
+        for collector in self._collectors:
+            families.extend(collector())
+        return families
+
+    def render(self):
+        """Returns every metric in the Prometheus text exposition format."""
+        lines = []
+        for name, kind, help_text, samples in self.families():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                if kind == "histogram":
+                    cumulative = 0
+                    for bound, count in zip(BUCKETS + (float("inf"),), value.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_labels(labels, le=_number(bound))} {cumulative}")
+                    lines.append(f"{name}_sum{_labels(labels)} {_number(value.sum)}")
+                    lines.append(f"{name}_count{_labels(labels)} {value.count}")
+                else:
+                    lines.append(f"{name}{_labels(labels)} {_number(value)}")
+        lines.append("")
+        return "\n".join(lines)
+
+    async def serve(self, host, port):
+        """Serves render() at http://host:port/metrics. Returns the asyncio server."""
+        return await asyncio.start_server(self._handle_http, host, port)
+
+    async def _handle_http(self, reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            # Skip the headers
+            while (await asyncio.wait_for(reader.readline(), timeout=5)).strip():
+                pass
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+                status, body = "200 OK", self.render().encode()
+            else:
+                status, body = "404 Not Found", b"Not found\n"
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                         f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+class _Phase:
+    __slots__ = ("extras", "name", "start")
+
+    def __init__(self, extras, name):
+        self.extras = extras
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.extras[self.name] = self.extras.get(self.name, 0.0) + time.perf_counter() - self.start
+
+
+def phase(interaction, name):
+    """Context manager adding the time spent in it to interaction.extras[name], e.g. phase(interaction, "render")."""
+    # A class rather than contextlib.contextmanager, which takes half again as long per use
+    return _Phase(interaction.extras, name)
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _labels(labels, **extra):
+    labels = {**labels, **extra}
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
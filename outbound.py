@@ -0,0 +1,55 @@
+"""
+The layer every message to Discord goes through.
+
+respond() answers an interaction with a single message, falling back to a followup when the
+interaction has already been answered (e.g. deferred, see deadline.py), and edit() replaces the
+message a button was pressed on. Every command answers its own interaction, so rate limits are
+left to discord.py's HTTP client, which reads Discord's X-RateLimit headers.
+"""
+import collections
+
+import metrics
+
+
+async def _answered(interaction):
+    """
+    Whether the interaction already has its initial response, once a deferral under way has
+    finished (see deadline.py). If not, marks it as being answered, so no deferral starts.
+    """
+    deferral = interaction.extras.get("deferral")
+    if deferral is not None:
+        await deferral
+    if interaction.response.is_done():
+        return True
+    interaction.extras["answering"] = True
+    return False
+
+
+class OutboundSender:
+    """Sends responses and edits, counting the HTTP calls made."""
+
+    def __init__(self):
+        self.calls = collections.Counter()
+
+    async def respond(self, interaction, content, ephemeral=False, **kwargs):
+        """Answers the interaction with one message, as a followup if it was already answered."""
+        with metrics.phase(interaction, "send"):
+            if await _answered(interaction):
+                self.calls["followup"] += 1
+                await interaction.followup.send(content, ephemeral=ephemeral, **kwargs)
+            else:
+                self.calls["response"] += 1
+                await interaction.response.send_message(content, ephemeral=ephemeral, **kwargs)
+
+    async def edit(self, interaction, content, **kwargs):
+        """Replaces the message a component interaction came from (or the deferred original response)."""
+        self.calls["edit"] += 1
+        with metrics.phase(interaction, "send"):
+            if await _answered(interaction):
+                await interaction.edit_original_response(content=content, **kwargs)
+            else:
+                await interaction.response.edit_message(content=content, **kwargs)
+
+    def stats(self):
+        """Returns HTTP calls made by kind."""
+        return {"calls": dict(self.calls)}
@@ -0,0 +1,175 @@
+"""
+The channel -> game mapping used as bot.games.
+
+Games that have not been touched for `ttl` seconds, or the least recently used ones once more
+than `max_resident` are in memory, are packed (see store.saved_game) into an SQLite file by a
+background sweeper. get() loads them back transparently the next time their channel is used.
+"""
+import asyncio
+import collections
+import os
+import sqlite3
+import threading
+import time
+
+import store
+
+
+class GameRegistry:
+    """Dict-like channel_id -> game mapping that spills idle games to disk."""
+
+    def __init__(self, spill_path, ttl=3600.0, max_resident=0, compact=False, sweep_interval=30.0, sweep_batch=256, on_spill=None, on_load=None):
+        self.ttl = ttl
+        self.max_resident = max_resident
+        self.compact = compact
+        self.sweep_interval = sweep_interval
+        self.sweep_batch = sweep_batch
+        # Called with the channel id of every game spilled, to drop what else is kept per channel
+        self.on_spill = on_spill
+        # Called with the channel id and game of every game loaded into memory, restored or spilled before
+        self.on_load = on_load
+        # channel_id -> (game, last access time), least recently used first
+        self._resident = collections.OrderedDict()
+        # channel_id -> saved game (see store.saved_game) for games restored from the store and never used since
+        self._saved = {}
+        # channel_id -> saved game for games being written to the spill file
+        self._spilling = {}
+        self._spilled = set()
+        self.evicted = 0
+        self.rehydrated = 0
+
+        self.spill_path = spill_path
+        self._db_lock = threading.Lock()
+        # Opened by the first spill, so that making a registry (e.g. importing bot.py) touches no files
+        self._db = None
+
+    def restore(self, states):
+        """Adds {channel_id: saved game} games (see store.saved_game), to be built on first use."""
+        self._saved.update(states)
+
+    def get(self, channel_id, default=None):
+        """Returns the game for channel_id, loading it from disk if it was spilled."""
+        entry = self._resident.get(channel_id)
+        if entry is not None:
+            self._resident[channel_id] = (entry[0], time.monotonic())
+            self._resident.move_to_end(channel_id)
+            return entry[0]
+
+        state = self._saved.pop(channel_id, None) or self._spilling.pop(channel_id, None)
+        if state is None and channel_id in self._spilled:
+            with self._db_lock:
+                row = self._db.execute("SELECT game_number, packed, sheets, stream_seed, stream_position FROM games WHERE channel_id = ?",
+                                       (channel_id,)).fetchone()
+            game_number, packed, sheets, seed, position = row
+            if sheets is None and seed is None:
+                state = (game_number, packed)
+            else:
+                state = (game_number, packed, sheets or b"", None if seed is None else (seed, position))
+            self._spilled.discard(channel_id)
+        if state is None:
+            return default
+
+        game_data = store.build_game(state, compact=self.compact)
+        self._resident[channel_id] = (game_data, time.monotonic())
+        self.rehydrated += 1
+        if self.on_load is not None:
+            self.on_load(channel_id, game_data)
+        return game_data
+
+    def __getitem__(self, channel_id):
+        game_data = self.get(channel_id)
+        if game_data is None:
+            raise KeyError(channel_id)
+        return game_data
+
+    def __setitem__(self, channel_id, game_data):
+        self._saved.pop(channel_id, None)
+        self._spilling.pop(channel_id, None)
+        self._spilled.discard(channel_id)
+        self._resident[channel_id] = (game_data, time.monotonic())
+        self._resident.move_to_end(channel_id)
+
+    def __contains__(self, channel_id):
+        return (channel_id in self._resident or channel_id in self._saved
+                or channel_id in self._spilling or channel_id in self._spilled)
+
+    def __len__(self):
+        return len(self._resident) + len(self._saved) + len(self._spilling) + len(self._spilled)
+
+    def resident_games(self):
+        """Returns a list of the games in memory."""
+        return [entry[0] for entry in self._resident.values()]
+
+    def stats(self):
+        """Returns counts of resident, spilled (including restored but unused) and rehydrated games."""
+        return {"resident": len(self._resident),
+                "spilled": len(self._saved) + len(self._spilling) + len(self._spilled),
+                "rehydrated": self.rehydrated,
+                "evicted": self.evicted}
+
+    def _idle_slice(self):
+        """Removes and returns up to sweep_batch games due for eviction, oldest first."""
+        deadline = time.monotonic() - self.ttl
+        over = len(self._resident) - self.max_resident if self.max_resident else 0
+        batch = {}
+        while self._resident and len(batch) < self.sweep_batch:
+            channel_id, (game_data, last_access) = next(iter(self._resident.items()))
+            if last_access > deadline and over <= 0:
+                break
+            del self._resident[channel_id]
+            batch[channel_id] = store.saved_game(game_data)
+            over -= 1
+        return batch
+
+    async def sweep(self):
+        """Spills every game due for eviction, one batch at a time, yielding to the event loop between batches."""
+        while True:
+            batch = self._idle_slice()
+            if not batch:
+                return
+            self._spilling.update(batch)
+            await asyncio.to_thread(self._write, batch)
+            for channel_id in batch:
+                # Skip games that were used or replaced while being written
+                if self._spilling.pop(channel_id, None) is not None:
+                    self._spilled.add(channel_id)
+                    self.evicted += 1
+                    if self.on_spill is not None:
+                        self.on_spill(channel_id)
+
+    async def run_sweeper(self):
+        """Background task sweeping every sweep_interval seconds."""
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            await self.sweep()
+
+    def _open(self):
+        if os.path.dirname(self.spill_path):
+            os.makedirs(os.path.dirname(self.spill_path), exist_ok=True)
+        db = sqlite3.connect(self.spill_path, check_same_thread=False, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=OFF")
+        # The store (or nothing) is the source of truth after a restart, not an old spill file.
+        db.execute("DROP TABLE IF EXISTS games")
+        db.execute("CREATE TABLE games (channel_id INTEGER PRIMARY KEY, game_number INTEGER, packed INTEGER, sheets BLOB, stream_seed INTEGER, stream_position INTEGER)")
+        return db
+
+    def _write(self, batch):
+        with self._db_lock:
+            if self._db is None:
+                self._db = self._open()
+            self._db.executemany("INSERT OR REPLACE INTO games VALUES (?, ?, ?, ?, ?, ?)",
+                                 [(channel_id, *_spill_row(saved)) for channel_id, saved in batch.items()])
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+def _spill_row(saved):
+    """Returns the columns of the games table after channel_id for a saved game (see store.saved_game)."""
+    if len(saved) == 2:
+        return (*saved, None, None, None)
+    game_number, packed, sheets, stream = saved
+    return (game_number, packed, sheets or None, *(stream or (None, None)))
@@ -0,0 +1,388 @@
+"""
+Builds the dice tray messages sent by bot.py.
+
+The "- Color: <emoji>" line for every (color, value) pair is built once at import, and whole
+messages are memoized on GameData.state_key(), so a state that has been shown before costs a
+dictionary lookup instead of sorting and string building.
+
+With CLEVER_STATE_UPDATES=delta, StateDeltas shows only the dice that moved since the state last
+shown in a channel, e.g. "Blue 4 → chosen; Green 2, Yellow 1 → platter", and the full state at
+the start of each turn and every CLEVER_STATE_REFRESH_EVERY messages.
+"""
+import functools
+import operator
+
+import config
+import game
+import history
+import scoresheet
+from dice_emoji import dice_emoji
+
+MAX_MESSAGE_LENGTH = 2000
+# Standard deviation of a fair die roll
+DIE_SD = (35 / 12) ** 0.5
+
+
+def _build_die_lines():
+    """Returns {color: [None, line for value 1, ..., line for value 6]} for every color in DICE_COLORS."""
+    colors = {color for dice_colors in game.DICE_COLORS.values() for color in dice_colors}
+    return {color: [None] + [f"- {color.capitalize()}: {dice_emoji[color][value]}" for value in range(1, 7)]
+            for color in colors}
+
+
+DIE_LINES = _build_die_lines()
+
+
+def _truncate(message):
+    if len(message) > MAX_MESSAGE_LENGTH:
+        message = message[:1990] + "... (truncated)"
+    return message
+
+
+def _unpack_state_key(state_key):
+    """Splits a state key into chosen (color, value) pairs and sorted available and discarded pairs."""
+    game_number, chosen, available_values, discarded_values = state_key
+    dice_colors = game.DICE_COLORS[game_number]
+    available = sorted(((color, value) for color, value in zip(dice_colors, available_values) if value),
+                       key=lambda x: (x[1], x[0]))
+    discarded = sorted(((color, value) for color, value in zip(dice_colors, discarded_values) if value),
+                       key=lambda x: (x[1], x[0]))
+    return chosen, available, discarded
+
+
+def render_dice_state(game_data, action_message=""):
+    """
+    Returns the message displaying the current state of all dice categories for a given game.
+    Sorts dice within each category by value, then color.
+    """
+    return _render_dice_state(game_data.state_key(), action_message)
+
+
+@functools.lru_cache(maxsize=config.RENDER_CACHE_SIZE)
+def _render_dice_state(state_key, action_message):
+    chosen, available, discarded = _unpack_state_key(state_key)
+    response_parts = []
+
+    if action_message:
+        response_parts.append(action_message)
+
+    response_parts.append("\n--- **Current Dice States** ---")
+
+    # Chosen Dice
+    if chosen:
+        response_parts.append("\n**Chosen Dice:**")
+        response_parts.extend(DIE_LINES[color][value] for color, value in chosen)
+    else:
+        response_parts.append("\n**Chosen Dice:** None")
+
+    # Available Dice
+    if available:
+        response_parts.append("\n**Available Dice (for choosing or re-rolling):**")
+        response_parts.extend(DIE_LINES[color][value] for color, value in available)
+    else:
+        response_parts.append("\n**Available Dice:** None")
+
+    # Discarded Dice
+    if discarded:
+        response_parts.append("\n**Discarded Dice (this round):**")
+        response_parts.extend(DIE_LINES[color][value] for color, value in discarded)
+    else:
+        response_parts.append("\n**Discarded Dice (this round):** None")
+
+    response_parts.append("\n------------------------------")
+    # Contextual next step advice
+    if not available and (chosen or discarded):
+        response_parts.append("All dice have been processed for this roll! Use `/roll` for a new set of dice if your turn continues, or `/done` if finished.")
+    elif available:
+        response_parts.append("Use `/take color:<color>` to pick an available die, or `/roll` to re-roll available dice.")
+    else:
+        response_parts.append("Use `/roll` to start a new round with fresh dice.")
+
+    return _truncate("\n".join(response_parts))
+
+
+def render_turn_summary(game_data):
+    """Returns the end of turn message listing the chosen dice and the dice left for other players."""
+    return _render_turn_summary(game_data.state_key())
+
+
+@functools.lru_cache(maxsize=config.RENDER_CACHE_SIZE)
+def _render_turn_summary(state_key):
+    chosen, available, discarded = _unpack_state_key(state_key)
+    response_parts = ["--- **End of Turn Summary** ---"]
+
+    # Chosen Dice
+    if chosen:
+        response_parts.append("\n**Your Chosen Dice:**")
+        response_parts.extend(DIE_LINES[color][value] for color, value in chosen)
+    else:
+        response_parts.append("\n**Your Chosen Dice:** None")
+
+    # Dice for others
+    for_others = sorted(available + discarded, key=lambda x: (x[1], x[0]))
+    if for_others:
+        response_parts.append("\n**Dice available to other players:**")
+        response_parts.extend(DIE_LINES[color][value] for color, value in for_others)
+    else:
+        response_parts.append("\n**Dice available to other players:** None")
+
+    response_parts.append("\n------------------------------")
+    response_parts.append("The dice tray has been reset. Use `/roll` to start a new turn.")
+
+    return _truncate("\n".join(response_parts))
+
+
+POLICY_DESCRIPTIONS = {"highest": "always taking the highest die",
+                       "lowest": "always taking the lowest die",
+                       "random": "taking a random die",
+                       "careful": "taking the highest die that discards at most one other"}
+
+
+def render_odds(game_name, policy, stats):
+    """Returns the /odds message for one game variant and pick policy from simulate.py's statistics."""
+    def percentages(probabilities, first=0):
+        return ", ".join(f"{count}: {p:.1%}" for count, p in enumerate(probabilities, start=first) if p >= 0.0005)
+
+    return "\n".join([
+        f"**Turn odds for {game_name}** ({POLICY_DESCRIPTIONS[policy]}, {stats['turns']:,} simulated turns)",
+        f"- Dice kept: {stats['expected_kept']:.2f} on average ({percentages(stats['kept'])})",
+        f"- Dice discarded for being lower: {stats['expected_discarded']:.2f} on average",
+        f"- Silver platter size: {percentages(stats['platter'])}",
+        f"- Chosen die values: {percentages(stats['chosen_values'], first=1)}",
+    ])
+
+
+def render_advice(available_dice, picks, options):
+    """Returns the /advise message from advisor.Advisor.advise options, best first."""
+    lines = [f"**Advice for die {picks + 1} of 3** (expected total of the dice you take this turn, playing the best way afterwards)"]
+    for i, (value, expected_total, expected_lost) in enumerate(options):
+        colors = " or ".join(color.capitalize() for color, v in available_dice.items() if v == value)
+        best = " - **best**" if i == 0 else ""
+        lines.append(f"- Take {colors} ({value}): {expected_total:.2f} expected, {expected_lost:.1f} dice lost{best}")
+    return "\n".join(lines)
+
+
+_HISTORY_VERBS = {history.ROLL: "rolled", history.TAKE: "took", history.DISCARD: "discarded", history.RETURN: "returned"}
+
+
+# Where a die went, in the order changes are listed
+_DELTA_PLACES = ("chosen", "platter", "available", "rolled")
+
+
+def _die_places(state_key):
+    """Returns {color: (place, value)} for every die in a state key, in _unpack_state_key's order."""
+    chosen, available, discarded = _unpack_state_key(state_key)
+    places = {color: ("chosen", value) for color, value in chosen}
+    places.update((color, ("available", value)) for color, value in available)
+    places.update((color, ("platter", value)) for color, value in discarded)
+    return places
+
+
+def render_dice_delta(previous_key, state_key, rolled=False):
+    """
+    Returns a one line description of the dice that moved between two state keys. With rolled,
+    every available die is listed as rolled, including those that came up the same value.
+    """
+    return _render_dice_delta(previous_key, state_key, rolled)
+
+
+@functools.lru_cache(maxsize=config.RENDER_CACHE_SIZE)
+def _render_dice_delta(previous_key, state_key, rolled):
+    before = _die_places(previous_key)
+    moved = {place: [] for place in _DELTA_PLACES}
+    for color, (place, value) in _die_places(state_key).items():
+        if place == "available":
+            if rolled:
+                place = "rolled"
+            elif before.get(color, (None,))[0] != "platter":
+                # Only a roll changes an available die without it coming back from the platter
+                place = "rolled" if before.get(color) != (place, value) else None
+        elif before.get(color) == (place, value):
+            place = None
+        if place:
+            moved[place].append(f"{color.capitalize()} {value}")
+    return "; ".join(f"{", ".join(dice)} → {place}" for place, dice in moved.items() if dice) or "No dice moved."
+
+
+def _clears_dice(previous_key, state_key, rolled):
+    """Whether dice left the chosen dice, or a roll took dice off the platter (a /return is shown as a delta)."""
+    if len(state_key[1]) < len(previous_key[1]):
+        return True
+    return rolled and sum(map(bool, state_key[3])) < sum(map(bool, previous_key[3]))
+
+
+class StateDeltas:
+    """
+    Renders each channel's dice state as the changes since the state last shown in the channel,
+    with the full state when nothing has been shown yet, every `refresh_every` messages, and when
+    a new roll or turn takes dice off the chosen dice or the platter, which a delta can't show.
+    """
+
+    def __init__(self, refresh_every=10):
+        self.refresh_every = refresh_every
+        # channel id: (state key last shown, deltas shown since the full state)
+        self._shown = {}
+
+    def render(self, channel_id, game_data, action_message="", rolled=False):
+        """Returns the message for the channel's game. The full message includes action_message; a delta replaces it."""
+        state_key = game_data.state_key()
+        shown = self._shown.get(channel_id)
+        if (shown is None or shown[1] + 1 >= self.refresh_every or shown[0][0] != state_key[0]
+                or _clears_dice(shown[0], state_key, rolled)):
+            self._shown[channel_id] = (state_key, 0)
+            return _render_dice_state(state_key, action_message)
+        self._shown[channel_id] = (state_key, shown[1] + 1)
+        return _render_dice_delta(shown[0], state_key, rolled)
+
+    def shown(self, channel_id, game_data):
+        """Records that the channel was just shown the full state of its game (e.g. by /tray)."""
+        self._shown[channel_id] = (game_data.state_key(), 0)
+
+    def forget(self, channel_id):
+        """Drops the channel's last shown state, at the end of a turn, so the next state is shown in full."""
+        self._shown.pop(channel_id, None)
+
+    def __len__(self):
+        return len(self._shown)
+
+
+def render_history(turns):
+    """Returns the /history message from history.HistoryLog.recent_turns."""
+    if not turns:
+        return "No moves have been recorded in this channel yet."
+    lines = []
+    for events in turns:
+        lines.append(f"**Turn of <@{events[-1][4]}>**")
+        for kind_value, color_index, game_number, when, user_id, _ in events:
+            kind = kind_value >> 3
+            if kind == history.NEW_GAME:
+                lines.append(f"- <t:{when}:t> New game of {game.GAME_NAMES[game_number]}")
+            elif kind == history.DONE:
+                lines.append(f"- <t:{when}:t> Done")
+            else:
+                color = game.DICE_COLORS[game_number][color_index]
+                lines.append(f"- <t:{when}:t> {_HISTORY_VERBS[kind]} {dice_emoji[color][kind_value & 0b111]} ({color})")
+    return _truncate("\n".join(lines))
+
+
+def render_luck(user_mention, stats):
+    """Returns the /luck message from history.HistoryLog.luck."""
+    rolled = sum(stats["rolled"])
+    if not rolled:
+        return f"{user_mention} has not rolled any dice in this channel yet."
+    mean = sum(value * count for value, count in enumerate(stats["rolled"])) / rolled
+    # How many standard errors the mean roll is from 3.5
+    z = (mean - 3.5) / (DIE_SD / rolled ** 0.5)
+    taken = sum(stats["taken"])
+    taken_mean = sum(value * count for value, count in enumerate(stats["taken"])) / taken if taken else 0
+    lines = [f"**Luck of {user_mention}** over {stats['turns']:,} turns and {rolled:,} dice rolled",
+             f"- Mean roll {mean:.3f} (3.5 expected, z = {z:+.2f})",
+             f"- Mean die taken {taken_mean:.2f} over {taken:,} dice, {stats['discarded']:,} dice discarded",
+             "- Rolled " + ", ".join(f"{value}: {stats['rolled'][value] / rolled:.1%}" for value in range(1, 7))]
+    return "\n".join(lines)
+
+
+def render_dice_roll(plan, values, dropped, total):
+    """Returns the /dice message from diceexpr.roll: colored dice as emoji, others as numbers, dice not kept struck through."""
+    if plan.faces:
+        # Colored dice only, e.g. /qroll: just the dice
+        return _truncate(" ".join(map(operator.getitem, plan.faces, values)))
+    parts = []
+    start = 0
+    for term in plan.terms:
+        if term.sign < 0 or parts:
+            parts.append("-" if term.sign < 0 else "+")
+        dice = []
+        for i in range(start, start + term.count):
+            die = dice_emoji[term.color][values[i]] if term.color else str(values[i])
+            dice.append(f"~~{die}~~" if i in dropped else die)
+        start += term.count
+        parts.append(" ".join(dice) if term.color else f"({" ".join(dice)})")
+    if plan.modifier:
+        parts.append(f"{"-" if plan.modifier < 0 else "+"} {abs(plan.modifier)}")
+    return _truncate(f"{" ".join(parts)} = **{total}**")
+
+
+def _render_sheet_area(area, state):
+    """Returns the lines showing one area of a scoresheet: X marks crossed boxes, - boxes crossed from the start."""
+    if isinstance(area, scoresheet.Grid):
+        boxes = ["-" if not value else "X" if area.is_crossed(state, box) else str(value)
+                 for box, value in enumerate(area.values)]
+        return ["`" + "".join(f"{box:>3}" for box in boxes[row:row + area.width]) + "`" for row in range(0, area.size, area.width)]
+    count = area.count.get(state)
+    if isinstance(area, scoresheet.Track):
+        return [" ".join("X" if box < count else f">={threshold}" for box, threshold in enumerate(area.thresholds))]
+    return [" ".join((str(area.values[box].get(state)) if box < count else "_") + (f"x{multiplier}" if multiplier > 1 else "")
+                     for box, multiplier in enumerate(area.multipliers))]
+
+
+def render_sheet(sheet, user_mention):
+    """Returns the /sheet message for a scoresheet.Scoresheet."""
+    lines = [f"**Scoresheet of {user_mention}** - {sheet.total()} points"]
+    for name, area in sheet.areas.items():
+        pending = sheet.pending(name) if isinstance(area, scoresheet.Grid) else 0
+        lines.append(f"**{name.capitalize()}**: {sheet.score(name)}" + (f" ({pending} bonus crosses to place with `/bonus`)" if pending else ""))
+        lines.extend(_render_sheet_area(area, sheet.state))
+    lines.append(f"Rerolls: {sheet.counter(scoresheet.REROLL)}, +1s: {sheet.counter(scoresheet.PLUS_ONE)}, "
+                 f"foxes: {sheet.counter(scoresheet.FOX)}. Grid boxes are numbered from 1, left to right and top to bottom.")
+    return _truncate("\n".join(lines))
+
+
+def render_stats(command_metrics, games, deferrals=None):
+    """Returns the /stats message from a metrics.Metrics, GameRegistry.stats() and AutoDeferrer.stats()."""
+    lines = [f"**Bot statistics** - {games['resident']:,} games in memory, {games['spilled']:,} spilled, "
+             f"event loop lag {command_metrics.loop_lag * 1000:.1f}ms, {command_metrics.expired:,} expired interactions"]
+    if command_metrics.startup:
+        lines.append("- Startup: " + ", ".join(f"{milestone} after {seconds:.2f}s" for milestone, seconds in command_metrics.startup.items()))
+    if deferrals and deferrals["deferred"]:
+        lines.append(f"- Deferred {deferrals['deferred']:,} of {deferrals['direct'] + deferrals['deferred']:,} interactions, "
+                     f"{deferrals['prevented']:,} of them answered after Discord's deadline")
+    for name, histograms in sorted(command_metrics.durations.items()):
+        total = histograms["total"]
+        outcomes = ", ".join(f"{outcome} {count:,}" for (command, outcome), count in sorted(command_metrics.commands.items())
+                             if command == name)
+        lines.append(f"- `{name}`: {total.count:,} ({outcomes}); p50 <= {total.quantile(0.5) * 1000:g}ms, "
+                     f"p99 <= {total.quantile(0.99) * 1000:g}ms, "
+                     f"mean send {histograms['send'].sum / total.count * 1000:.2f}ms")
+    return _truncate("\n".join(lines))
+
+
+def _size(count):
+    """Formats a number of bytes, e.g. 1.5 MB."""
+    for unit in ("B", "KB", "MB"):
+        if abs(count) < 1024:
+            return f"{count:.0f} {unit}" if unit == "B" else f"{count:.1f} {unit}"
+        count /= 1024
+    return f"{count:.1f} GB"
+
+
+def render_memory(rss, numbers, objects, tracing):
+    """Returns the /memory overview from memstats.rss(), bot.py's memory numbers and memstats.live_objects()."""
+    games = numbers["games"]
+    estimate = "" if games["measured"] == games["games"] else f", estimated from {games['measured']:,}"
+    lines = [f"**Memory** - {_size(rss) if rss is not None else 'unknown'} resident, allocation tracing {'on' if tracing else 'off'}",
+             f"- Games in memory: {games['games']:,} ({', '.join(f'{name} {count:,}' for name, count in games['classes'].items()) or 'none'}), "
+             f"{_size(games['total'])} in all{estimate}; mean {_size(games['mean'])}, largest {_size(games['max'])}. "
+             f"{numbers['spilled']:,} more on disk",
+             f"- discord.py: {numbers['guilds']:,} guilds, {numbers['users']:,} users, {numbers['cached_messages']:,} cached messages",
+             "- Live objects: " + ", ".join(f"{name} {count:,}" for name, count in objects.items())]
+    return _truncate("\n".join(lines))
+
+
+def render_memory_snapshot(summary):
+    """Returns the /memory snapshot message from memstats.Tracer.snapshot()."""
+    change = "size" if summary["first"] else "change since the last snapshot"
+    lines = [f"**Allocations** - {_size(summary['traced'])} traced"
+             + (" (tracing just started; take another snapshot to see what grows)" if summary["first"] else ""),
+             f"By module ({change}):"]
+    lines.extend(f"- `{module}`: {_size(size)} ({'+' if delta >= 0 else '-'}{_size(abs(delta))})" for module, size, delta in summary["modules"][:10])
+    lines.append(f"Top sites ({change}):")
+    lines.extend(f"- `{where}` ({module}): {_size(size)} ({'+' if delta >= 0 else '-'}{_size(abs(delta))})" for module, where, size, delta in summary["sites"])
+    return _truncate("\n".join(lines))
+
+
+def cache_stats():
+    """Returns hits, misses and sizes of the rendered message caches."""
+    return {"dice_state": _render_dice_state.cache_info(),
+            "dice_delta": _render_dice_delta.cache_info(),
+            "turn_summary": _render_turn_summary.cache_info()}
@@ -0,0 +1,480 @@
+"""
+Scoresheets for the Clever games: one per player per game, filled in with the dice they take.
+
+A sheet is a single int. SHEETS describes each game's areas as data (Grid, Track and Row
+below), and each area is given bit fields in that int for its boxes, how many boxes are filled,
+its score and, for grids, crosses earned from bonuses but not placed yet. Filling a box updates
+those fields and the area's score directly, and a grid only checks the rows, columns and
+diagonal through the box, so a mark costs the same however full the sheet is. The bonuses a
+mark earns are applied straight away, and can earn more in turn (a chain); a bonus cross in a
+grid waits for the player to pick its box (see Scoresheet.place_bonus).
+
+Only game 1 (That's Pretty Clever) is described so far. pack_sheets() turns a game's sheets, and
+the dice marked on them this turn, into bytes that store.py and registry.py save with the game.
+"""
+import collections
+import struct
+
+import game
+
+# Bonuses that are simply counted. Any other bonus is (area, value): a cross in the area if value
+# is None (in the next box for a Track, a box of the player's choice for a Grid), or value written
+# in the next box of a Row.
+REROLL = "reroll"
+PLUS_ONE = "plus_one"
+FOX = "fox"
+COUNTERS = (REROLL, PLUS_ONE, FOX)
+# The die that may be used in any area
+WILD = "white"
+
+_COUNT_BITS = 4
+_SCORE_BITS = 8
+_PENDING_BITS = 3
+_COUNTER_BITS = 4
+_VALUE_BITS = 3
+
+
+class _Field:
+    """An unsigned integer of `bits` bits at `shift` in a sheet's state."""
+    __slots__ = ("shift", "mask")
+
+    def __init__(self, shift, bits):
+        self.shift = shift
+        self.mask = (1 << bits) - 1
+
+    def get(self, state):
+        return (state >> self.shift) & self.mask
+
+    def set(self, state, value):
+        # Counters saturate rather than spill into the next field
+        return (state & ~(self.mask << self.shift)) | (min(value, self.mask) << self.shift)
+
+
+class _Area:
+    """Fields every area has: filled boxes and score."""
+
+    def __init__(self, size, dice):
+        self.size = size
+        # Die colors whose values are added up to give the number for a box, e.g. ("blue", "white")
+        self.dice = dice
+        self.name = None
+
+    def lay_out(self, name, shift):
+        """Places the area's fields from bit `shift` on. Returns the first bit after them."""
+        self.name = name
+        self.count = _Field(shift, _COUNT_BITS)
+        self.score = _Field(shift + _COUNT_BITS, _SCORE_BITS)
+        return shift + _COUNT_BITS + _SCORE_BITS
+
+    def initial(self, state):
+        return state
+
+    def add_score(self, state, points):
+        return self.score.set(state, self.score.get(state) + points)
+
+
+class Grid(_Area):
+    """
+    Boxes in rows of `width`, each crossed by rolling its number; a 0 is crossed from the start.
+    A completed row, column or (top left to bottom right) diagonal earns its reward: points if an
+    int, else a bonus. If points is given, the area also scores points[number of crosses].
+    """
+
+    def __init__(self, values, width, row_rewards=(), column_rewards=(), diagonal_reward=None, points=None, dice=None):
+        super().__init__(len(values), dice)
+        self.values = values
+        self.width = width
+        self.points = points
+        lines = []
+        for row, reward in enumerate(row_rewards):
+            lines.append((range(row * width, (row + 1) * width), reward))
+        for column, reward in enumerate(column_rewards):
+            lines.append((range(column, len(values), width), reward))
+        if diagonal_reward is not None:
+            lines.append((range(0, len(values), width + 1), diagonal_reward))
+        # For each box, (mask of the line, reward) of every line through it
+        self.lines = [[(sum(1 << i for i in boxes), reward) for boxes, reward in lines if box in boxes]
+                      for box in range(len(values))]
+        self.boxes_for = collections.defaultdict(list)
+        for box, value in enumerate(values):
+            if value:
+                self.boxes_for[value].append(box)
+
+    def lay_out(self, name, shift):
+        shift = super().lay_out(name, shift)
+        self.crossed = _Field(shift, self.size)
+        self.pending = _Field(shift + self.size, _PENDING_BITS)
+        return shift + self.size + _PENDING_BITS
+
+    def initial(self, state):
+        return self.crossed.set(state, sum(1 << box for box, value in enumerate(self.values) if not value))
+
+    def is_crossed(self, state, box):
+        return self.crossed.get(state) >> box & 1
+
+    def options(self, state, value):
+        crossed = self.crossed.get(state)
+        return [box for box in self.boxes_for.get(value, ()) if not crossed >> box & 1]
+
+    def open_boxes(self, state):
+        crossed = self.crossed.get(state)
+        return [box for box in range(self.size) if not crossed >> box & 1]
+
+    def refusal(self, state, value):
+        return f"There is no open {self.name} box for a {value}."
+
+    def fill(self, state, box, value):
+        """Crosses box. Returns the new state and the bonuses earned."""
+        crossed = self.crossed.get(state) | (1 << box)
+        state = self.crossed.set(state, crossed)
+        count = self.count.get(state) + 1
+        state = self.count.set(state, count)
+        points = self.points[count] - self.points[count - 1] if self.points else 0
+        bonuses = []
+        for mask, reward in self.lines[box]:
+            if crossed & mask == mask:
+                if isinstance(reward, int):
+                    points += reward
+                else:
+                    bonuses.append(reward)
+        return self.add_score(state, points), bonuses
+
+
+class Track(_Area):
+    """Boxes crossed in order, each needing a number of at least its threshold. Scores points[boxes crossed]."""
+
+    def __init__(self, thresholds, points, rewards=None, dice=None):
+        super().__init__(len(thresholds), dice)
+        self.thresholds = thresholds
+        self.points = points
+        # Box number (from 1) to the bonus for filling it
+        self.rewards = rewards or {}
+
+    def options(self, state, value):
+        count = self.count.get(state)
+        if count < self.size and (value is None or value >= self.thresholds[count]):
+            return [count]
+        return []
+
+    def refusal(self, state, value):
+        count = self.count.get(state)
+        if count >= self.size:
+            return f"The {self.name} area is full."
+        return f"The next {self.name} box needs at least {self.thresholds[count]}."
+
+    def fill(self, state, box, value):
+        state = self.count.set(state, box + 1)
+        state = self.add_score(state, self.points[box + 1] - self.points[box])
+        reward = self.rewards.get(box + 1)
+        return state, [reward] if reward else []
+
+
+class Row(_Area):
+    """
+    Numbers written in order, each scoring its value times its box's multiplier. If rising, each
+    number must be higher than the one before, unless that one was a 6.
+    """
+
+    def __init__(self, multipliers, rewards=None, rising=False, dice=None):
+        super().__init__(len(multipliers), dice)
+        self.multipliers = multipliers
+        self.rewards = rewards or {}
+        self.rising = rising
+
+    def lay_out(self, name, shift):
+        shift = super().lay_out(name, shift)
+        self.values = [_Field(shift + _VALUE_BITS * box, _VALUE_BITS) for box in range(self.size)]
+        return shift + _VALUE_BITS * self.size
+
+    def options(self, state, value):
+        count = self.count.get(state)
+        if count >= self.size:
+            return []
+        if self.rising and count:
+            last = self.values[count - 1].get(state)
+            if last != 6 and value <= last:
+                return []
+        return [count]
+
+    def refusal(self, state, value):
+        count = self.count.get(state)
+        if count >= self.size:
+            return f"The {self.name} area is full."
+        return f"The next {self.name} number must be higher than {self.values[count - 1].get(state)}."
+
+    def fill(self, state, box, value):
+        state = self.values[box].set(state, value)
+        state = self.count.set(state, box + 1)
+        state = self.add_score(state, value * self.multipliers[box])
+        reward = self.rewards.get(box + 1)
+        return state, [reward] if reward else []
+
+
+# The areas of each game's sheet, in the order they are shown
+SHEETS = {
+    1: {
+        "yellow": Grid([3, 6, 5, 0,
+                        2, 1, 0, 5,
+                        1, 0, 2, 4,
+                        0, 3, 4, 6], width=4,
+                       row_rewards=[("blue", None), ("orange", 4), ("green", None), FOX],
+                       column_rewards=[10, 14, 16, 20],
+                       diagonal_reward=PLUS_ONE,
+                       dice=("yellow",)),
+        "blue": Grid([0, 2, 3, 4,
+                      5, 6, 7, 8,
+                      9, 10, 11, 12], width=4,
+                     row_rewards=[("orange", 5), ("yellow", None), FOX],
+                     column_rewards=[REROLL, ("green", None), ("purple", 6), PLUS_ONE],
+                     points=[0, 1, 2, 4, 7, 11, 16, 22, 29, 37, 46, 56],
+                     dice=("blue", "white")),
+        "green": Track([1, 2, 3, 4, 5, 1, 2, 3, 4, 5, 6],
+                       points=[0, 1, 3, 6, 10, 15, 21, 28, 36, 45, 55, 66],
+                       rewards={4: PLUS_ONE, 6: ("blue", None), 7: FOX, 9: ("purple", 6), 10: REROLL},
+                       dice=("green",)),
+        "orange": Row([1, 1, 1, 2, 1, 1, 2, 1, 2, 1, 3],
+                      rewards={3: REROLL, 5: ("yellow", None), 6: PLUS_ONE, 8: FOX, 10: ("purple", 6)},
+                      dice=("orange",)),
+        "purple": Row([1] * 11, rising=True,
+                      rewards={3: REROLL, 4: ("blue", None), 5: PLUS_ONE, 6: ("yellow", None), 7: FOX,
+                               8: REROLL, 9: ("green", None), 10: ("orange", 6), 11: PLUS_ONE},
+                      dice=("purple",)),
+    },
+}
+
+
+def _lay_out(areas):
+    """Gives every area its fields, followed by the counters. Returns ({counter: field}, initial state)."""
+    shift = 0
+    for name, area in areas.items():
+        shift = area.lay_out(name, shift)
+    counters = {}
+    for name in COUNTERS:
+        counters[name] = _Field(shift, _COUNTER_BITS)
+        shift += _COUNTER_BITS
+    state = 0
+    for area in areas.values():
+        state = area.initial(state)
+    return counters, state
+
+
+_LAYOUTS = {game_number: _lay_out(areas) for game_number, areas in SHEETS.items()}
+
+# A saved sheet: user id, the dice the user marked this turn (a bit per color, in DICE_COLORS
+# order, and ACTIVE_BIT if the user is the game's active player) and the sheet's state, which
+# must fit in the 24 bytes
+SAVED_SHEET = struct.Struct("<QB24s")
+ACTIVE_BIT = 0x80
+
+
+def describe_bonus(bonus):
+    if bonus == REROLL:
+        return "a reroll"
+    if bonus == PLUS_ONE:
+        return "a +1"
+    if bonus == FOX:
+        return "a fox"
+    area, value = bonus
+    article = "an" if area[0] in "aeiou" else "a"
+    return f"{article} {area} {value}" if value else f"{article} {area} cross"
+
+
+class Scoresheet:
+    """One player's sheet, packed into `state` (see the module docstring)."""
+    __slots__ = ("game_number", "state")
+
+    def __init__(self, game_number, state=None):
+        if game_number not in SHEETS:
+            raise KeyError(game_number)
+        self.game_number = game_number
+        self.state = _LAYOUTS[game_number][1] if state is None else state
+
+    @property
+    def areas(self):
+        return SHEETS[self.game_number]
+
+    def score(self, area):
+        return self.areas[area].score.get(self.state)
+
+    def counter(self, name):
+        """Returns how many rerolls, +1s or foxes (REROLL, PLUS_ONE, FOX) the sheet has earned."""
+        return _LAYOUTS[self.game_number][0][name].get(self.state)
+
+    def pending(self, area):
+        """Returns how many bonus crosses in a Grid area wait to be placed."""
+        return self.areas[area].pending.get(self.state)
+
+    def total(self):
+        """Returns the sheet's score: every area's, plus each fox worth the lowest area score."""
+        scores = [area.score.get(self.state) for area in self.areas.values()]
+        return sum(scores) + self.counter(FOX) * min(scores)
+
+    def mark(self, area_name, value, box=None):
+        """
+        Fills a box of an area with a number rolled. box (counted from 0) is only needed where the
+        number fits more than one box.
+        Returns:
+            - bonuses (list): The bonuses earned, including by chains, or None if the mark is not allowed.
+            - message (str): A message describing the outcome.
+        """
+        area = self.areas.get(area_name)
+        if area is None:
+            return None, f"Invalid area. Please choose from {", ".join(self.areas)}."
+        options = area.options(self.state, value)
+        if not options:
+            return None, area.refusal(self.state, value)
+        if box is None:
+            if len(options) > 1:
+                return None, f"A {value} fits {area_name} boxes {" or ".join(str(b + 1) for b in options)}; say which."
+            box = options[0]
+        elif box not in options:
+            return None, f"A {value} cannot go in {area_name} box {box + 1}."
+        bonuses = self._fill(area, box, value)
+        return bonuses, self._describe_mark(area_name, value, bonuses)
+
+    def place_bonus(self, area_name, box):
+        """Places a bonus cross earned in a Grid area in box (counted from 0). Returns like mark()."""
+        area = self.areas.get(area_name)
+        if not isinstance(area, Grid) or not area.pending.get(self.state):
+            return None, f"You have no {area_name} bonus cross to place."
+        if not 0 <= box < area.size or area.is_crossed(self.state, box):
+            return None, f"{area_name.capitalize()} box {box + 1} is not open."
+        self.state = area.pending.set(self.state, area.pending.get(self.state) - 1)
+        bonuses = self._fill(area, box, area.values[box])
+        return bonuses, self._describe_mark(area_name, area.values[box], bonuses)
+
+    def _fill(self, area, box, value):
+        """Fills box and applies the bonuses earned, and any those earn. Returns every bonus, in order."""
+        counters = _LAYOUTS[self.game_number][0]
+        earned = []
+        queue = collections.deque([(area, box, value)])
+        while queue:
+            area, box, value = queue.popleft()
+            self.state, bonuses = area.fill(self.state, box, value)
+            for bonus in bonuses:
+                earned.append(bonus)
+                if bonus in counters:
+                    field = counters[bonus]
+                    self.state = field.set(self.state, field.get(self.state) + 1)
+                    continue
+                target = self.areas[bonus[0]]
+                if isinstance(target, Grid):
+                    self.state = target.pending.set(self.state, target.pending.get(self.state) + 1)
+                    continue
+                options = target.options(self.state, bonus[1])
+                # A bonus for a full area is lost
+                if options:
+                    queue.append((target, options[0], bonus[1]))
+        return earned
+
+    def _describe_mark(self, area_name, value, bonuses):
+        message = f"Marked {value} in {area_name}; {area_name} now scores {self.score(area_name)}."
+        if bonuses:
+            message += f" Bonus: {", ".join(describe_bonus(bonus) for bonus in bonuses)}!"
+        return message
+
+    def pack(self):
+        """Returns the sheet packed into one int."""
+        return self.state
+
+
+def value_for(game_data, area_name, color):
+    """
+    Returns the number the die of color gives in area_name, or None if it cannot be used there.
+    A die goes in the area of its color, and the wild die in any area; in an area that adds dice
+    up (blue adds blue and white), the number is their sum wherever they are on the tray.
+    """
+    area = SHEETS[game_data.game_number].get(area_name)
+    if area is None or (color != WILD and color not in area.dice):
+        return None
+    dice = {**game_data.discarded_dice_this_round, **game_data.available_dice, **game_data.chosen_dice_this_round}
+    values = [dice.get(die) for die in area.dice] if len(area.dice) > 1 else [dice.get(color)]
+    return None if None in values else sum(values)
+
+
+def platter(game_data):
+    """Returns {color: value} of the dice the other players choose from: the silver platter, and the dice left once 3 are taken."""
+    if len(game_data.chosen_dice_this_round) >= 3:
+        return {**game_data.discarded_dice_this_round, **game_data.available_dice}
+    return game_data.discarded_dice_this_round
+
+
+def mark_die(game_data, user_id, color, area_name=None, box=None):
+    """
+    Marks a die on the user's sheet, in area_name (the die's color if not given). The active
+    player (who took dice this turn) marks the dice they took, each once; the other players each
+    mark one die from the platter (see platter()). Until someone takes a die, or if the active
+    player isn't known (they had no sheet when the game was saved), anyone may mark a taken die.
+    box (counted from 0) is only needed where the number fits more than one box. Returns like
+    Scoresheet.mark().
+    """
+    color = color.lower()
+    area_name = (area_name or color).lower()
+    marked = game_data.marked or ()
+    active = game_data.active_player
+    if active is None or active == user_id:
+        if color not in game_data.chosen_dice_this_round:
+            return None, f"You have not taken the {color} die this turn."
+        if (user_id, color) in marked:
+            return None, f"You have already marked the {color} die this turn."
+    else:
+        if color not in platter(game_data):
+            return None, f"The {color} die is not on the silver platter. Mark one die from the platter while <@{active}> takes their dice."
+        if any(marker == user_id for marker, _ in marked):
+            return None, "You have already marked a die from the silver platter this turn."
+    value = value_for(game_data, area_name, color)
+    if value is None:
+        return None, f"The {color} die cannot be marked in {area_name}."
+    bonuses, message = sheet_for(game_data, user_id).mark(area_name, value, box)
+    if bonuses is not None:
+        if game_data.marked is None:
+            game_data.marked = set()
+        game_data.marked.add((user_id, color))
+    return bonuses, message
+
+
+def pack_sheets(game_data):
+    """Returns the game's sheets, with the dice marked on them this turn, as bytes; empty if there are none."""
+    if not game_data.sheets:
+        return b""
+    colors = game.DICE_COLORS[game_data.game_number]
+    marked = {game_data.active_player: ACTIVE_BIT}
+    for user_id, color in game_data.marked or ():
+        marked[user_id] = marked.get(user_id, 0) | 1 << colors.index(color)
+    return b"".join(SAVED_SHEET.pack(user_id, marked.get(user_id, 0), sheet.state.to_bytes(24, "little"))
+                    for user_id, sheet in game_data.sheets.items())
+
+
+def unpack_sheets(game_data, data):
+    """Gives the game the sheets and marks in data, returned by pack_sheets()."""
+    if not data:
+        return
+    colors = game.DICE_COLORS[game_data.game_number]
+    game_data.sheets = {}
+    for user_id, marked, state in SAVED_SHEET.iter_unpack(data):
+        game_data.sheets[user_id] = Scoresheet(game_data.game_number, int.from_bytes(state, "little"))
+        if marked & ACTIVE_BIT:
+            game_data.active_player = user_id
+        for index, color in enumerate(colors):
+            if marked >> index & 1:
+                if game_data.marked is None:
+                    game_data.marked = set()
+                game_data.marked.add((user_id, color))
+
+
+def sheet_for(game_data, user_id):
+    """Returns the user's sheet for the game, starting a new one on first use. Raises KeyError for games without sheets."""
+    if game_data.sheets is None:
+        game_data.sheets = {}
+    sheet = game_data.sheets.get(user_id)
+    if sheet is None:
+        sheet = game_data.sheets[user_id] = Scoresheet(game_data.game_number)
+    return sheet
+
+
+if __name__ == '__main__':
+    # Bits used by each game's sheet
+    for game_number, areas in SHEETS.items():
+        counters, state = _LAYOUTS[game_number]
+        last = max(counters.values(), key=lambda field: field.shift)
+        print(f"{game.GAME_NAMES[game_number]}: {last.shift + _COUNTER_BITS} bits")
@@ -0,0 +1,159 @@
+"""
+Monte Carlo statistics for a turn under the "Clever" discard rule, computed with NumPy arrays.
+
+A turn follows GameData exactly: roll every die, pick one with a policy, discard every
+remaining die lower than the picked one (GameData.choose_die), re-roll the dice still
+available (GameData.reroll_available_dice) and repeat, for at most three picks. Ties are
+broken towards the first color in DICE_COLORS. Each batch of turns is simulated at once as
+(turns, 6) arrays.
+
+Results are written to a JSON cache that the /odds command reads, so the bot itself never
+needs NumPy:
+
+    python simulate.py [--turns 1000000] [--output odds.json]
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+import game
+
+PICKS_PER_TURN = 3
+BATCH_SIZE = 1_000_000
+
+
+# --- Pick policies ---
+# A policy takes (values, available, pick_number) for a batch of turns and returns, for every
+# turn, the index of the die to take. Rows with no available dice are ignored.
+
+def pick_highest(values, available, pick_number):
+    """Takes the highest available die."""
+    return np.argmax(np.where(available, values, 0), axis=1)
+
+
+def pick_lowest(values, available, pick_number):
+    """Takes the lowest available die, so nothing is discarded."""
+    return np.argmin(np.where(available, values, 7), axis=1)
+
+
+def make_pick_random(rng):
+    def pick_random(values, available, pick_number):
+        """Takes an available die at random."""
+        return np.argmax(np.where(available, rng.random(values.shape), -1.0), axis=1)
+    return pick_random
+
+
+def pick_careful(values, available, pick_number):
+    """Takes the highest die that discards at most one other, except on the last pick where it takes the highest."""
+    if pick_number == PICKS_PER_TURN - 1:
+        return pick_highest(values, available, pick_number)
+    lower = (available[:, None, :] & (values[:, None, :] < values[:, :, None])).sum(axis=2)
+    allowed = available & (lower <= 1)
+    return np.argmax(np.where(allowed, values, 0), axis=1)
+
+
+def policies(rng):
+    return {"highest": pick_highest,
+            "lowest": pick_lowest,
+            "random": make_pick_random(rng),
+            "careful": pick_careful}
+
+
+def take_die(values, available, chosen_index, active):
+    """
+    Applies GameData.choose_die to every active turn: removes the chosen die from the available
+    dice and discards the available dice lower than it. Returns (chosen values, discard counts).
+    """
+    rows = np.arange(len(values))
+    chosen_values = values[rows, chosen_index]
+    taken = np.zeros_like(available)
+    taken[rows, chosen_index] = active
+    available &= ~taken
+    lower = available & (values < chosen_values[:, None]) & active[:, None]
+    available &= ~lower
+    return np.where(active, chosen_values, 0), lower.sum(axis=1)
+
+
+def simulate_batch(rng, policy, turns, dice_count):
+    """Plays `turns` turns. Returns the histogram arrays for the batch."""
+    values = np.zeros((turns, dice_count), dtype=np.int8)
+    available = np.ones((turns, dice_count), dtype=bool)
+    kept = np.zeros(turns, dtype=np.int8)
+    discarded = np.zeros(turns, dtype=np.int8)
+    value_counts = np.zeros((PICKS_PER_TURN, 7), dtype=np.int64)
+    color_counts = np.zeros(dice_count, dtype=np.int64)
+
+    for pick_number in range(PICKS_PER_TURN):
+        active = available.any(axis=1)
+        if not active.any():
+            break
+        # Roll (or re-roll) the dice still available
+        values[available] = rng.integers(1, 7, size=int(available.sum()), dtype=np.int8)
+        chosen_index = policy(values, available, pick_number)
+        chosen_values, discard_counts = take_die(values, available, chosen_index, active)
+        kept += active
+        discarded += discard_counts.astype(np.int8)
+        value_counts[pick_number] += np.bincount(chosen_values[active], minlength=7)
+        color_counts += np.bincount(chosen_index[active], minlength=dice_count)
+
+    return {"kept": np.bincount(kept, minlength=PICKS_PER_TURN + 1),
+            "discarded": np.bincount(discarded, minlength=dice_count + 1),
+            "platter": np.bincount(dice_count - kept, minlength=dice_count + 1),
+            "values": value_counts,
+            "colors": color_counts}
+
+
+def simulate(game_number, policy_name, turns, seed=None):
+    """Returns the statistics for `turns` turns of a game variant under a pick policy."""
+    rng = np.random.default_rng(seed)
+    policy = policies(rng)[policy_name]
+    colors = game.DICE_COLORS[game_number]
+    totals = None
+    start = time.perf_counter()
+    for batch_start in range(0, turns, BATCH_SIZE):
+        batch = simulate_batch(rng, policy, min(BATCH_SIZE, turns - batch_start), len(colors))
+        totals = batch if totals is None else {key: totals[key] + batch[key] for key in totals}
+    seconds = time.perf_counter() - start
+
+    kept = totals["kept"] / turns
+    picks = totals["values"].sum()
+    return {"turns": turns,
+            "seconds": seconds,
+            "expected_kept": float(np.dot(np.arange(len(kept)), kept)),
+            "kept": kept.tolist(),
+            "expected_discarded": float(np.dot(np.arange(len(totals["discarded"])), totals["discarded"] / turns)),
+            "discarded": (totals["discarded"] / turns).tolist(),
+            "platter": (totals["platter"] / turns).tolist(),
+            "chosen_values": (totals["values"].sum(axis=0)[1:] / picks).tolist(),
+            "chosen_values_by_pick": [(row[1:] / max(row.sum(), 1)).tolist() for row in totals["values"]],
+            "chosen_colors": dict(zip(colors, (totals["colors"] / picks).tolist()))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate turns and write the /odds cache.")
+    parser.add_argument("--turns", type=int, default=1_000_000, help="Turns per game variant and policy.")
+    parser.add_argument("--output", default="odds.json")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    results = {}
+    total_turns = 0
+    total_seconds = 0.0
+    for game_number in game.DICE_COLORS:
+        for policy_name in policies(None):
+            stats = simulate(game_number, policy_name, args.turns, args.seed)
+            results.setdefault(str(game_number), {})[policy_name] = stats
+            total_turns += stats["turns"]
+            total_seconds += stats["seconds"]
+            print(f"game {game_number} {policy_name:8} kept {stats['expected_kept']:.3f} "
+                  f"discarded {stats['expected_discarded']:.3f} ({stats['turns'] / stats['seconds'] * 60:,.0f} turns/min)")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f)
+    print(f"{total_turns:,} turns in {total_seconds:.1f}s ({total_turns / total_seconds * 60:,.0f} turns/min), written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+"""
+Durable storage for the game in each channel.
+
+Every mutation is appended to a log as a fixed-width record holding the channel's whole packed
+dice state (see game.pack_dice), so replaying is "last record per channel wins". A move that
+changes a game's scoresheets (a mark, a take setting the active player, or a new turn clearing
+the dice marked) is followed by a SHEETS record: the same header, with the length of the packed
+sheets (see scoresheet.pack_sheets) in place of the dice, then the sheets padded to whole
+records, so every file is still read record by record with one struct.iter_unpack. With CLEVER_DICE_SEED set,
+a new game or a roll is followed by a STREAM record in the same way, holding the seed of the
+game's dice stream and then its position (see dice_rng.DiceStream.saved), so a restored game
+goes on with the same dice. Records are buffered in memory and written by a background task
+in a worker thread, so the command path only packs a struct. The log is periodically folded into
+a snapshot file and truncated.
+
+Files in the state directory:
+    snapshot.bin  - one record per channel
+    log.bin       - records appended since the snapshot
+    log.old.bin   - a log being folded into the snapshot (only present during/after a crash in compaction)
+"""
+import asyncio
+import os
+import struct
+
+import dice_rng
+import game
+import scoresheet
+
+# channel_id, operation, game_number, packed dice state (or the length of the sheets for SHEETS, the seed for STREAM)
+RECORD = struct.Struct("<QBBQ")
+
+OPERATIONS = {"new_game": 0, "roll": 1, "reroll": 2, "choose": 3, "return": 4, "reset": 5, "mark": 6}
+SHEETS = 255
+STREAM = 254
+# Moves after which a game's sheets are saved again: marks change them, a take sets the active player,
+# and a new turn clears both
+_SHEET_OPERATIONS = frozenset(("roll", "reset", "mark", "choose"))
+# Moves after which a game's dice stream is saved again
+_STREAM_OPERATIONS = frozenset(("new_game", "roll", "reroll"))
+POSITION = struct.Struct("<Q")
+
+
+def saved_game(game_data):
+    """
+    Returns a game as saved: (game number, packed dice state), followed by the packed sheets
+    (see scoresheet.pack_sheets, b"" if none) and (seed, position) of the dice stream (None if
+    none) for a game that has either.
+    """
+    sheets = scoresheet.pack_sheets(game_data)
+    stream = game_data.dice_stream.saved() if game_data.dice_stream is not None else None
+    if sheets or stream:
+        return (game_data.game_number, game_data.pack(), sheets, stream)
+    return (game_data.game_number, game_data.pack())
+
+
+def build_game(saved, compact=False):
+    """Builds the game saved as `saved` (see saved_game), as a CompactGameData if compact is set."""
+    game_data = game.new_game(saved[0], compact=compact, packed=saved[1])
+    if len(saved) > 2:
+        sheets, stream = saved[2:]
+        if sheets:
+            scoresheet.unpack_sheets(game_data, sheets)
+        if stream is not None:
+            game_data.dice_stream = dice_rng.DiceStream.resume(*stream)
+    return game_data
+
+
+class GameStore:
+    """Write-ahead log and snapshots for the channel -> game state mapping."""
+
+    def __init__(self, directory, flush_interval=0.05, snapshot_interval=300.0, fsync=False):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.snapshot_interval = snapshot_interval
+        self.fsync = fsync
+        self.snapshot_path = os.path.join(directory, "snapshot.bin")
+        self.log_path = os.path.join(directory, "log.bin")
+        self.old_log_path = os.path.join(directory, "log.old.bin")
+        self._pending = bytearray()
+        self._pending_records = 0
+        self._log_file = None
+        self.records_written = 0
+
+    def record(self, channel_id, game_data, operation):
+        """Queues the current state of a channel's game to be logged. Never blocks."""
+        self._pending += RECORD.pack(channel_id, OPERATIONS[operation], game_data.game_number, game_data.pack())
+        self._pending_records += 1
+        if operation in _SHEET_OPERATIONS and game_data.sheets:
+            self._pending += _sheets_record(channel_id, game_data.game_number, scoresheet.pack_sheets(game_data))
+            self._pending_records += 1
+        if operation in _STREAM_OPERATIONS and game_data.dice_stream is not None:
+            stream = game_data.dice_stream.saved()
+            if stream is not None:
+                self._pending += _stream_record(channel_id, game_data.game_number, stream)
+                self._pending_records += 1
+
+    def load(self):
+        """Returns {channel_id: saved game} (see saved_game) from the snapshot and logs."""
+        dice, sheets, streams = {}, {}, {}
+        for path in (self.snapshot_path, self.old_log_path, self.log_path):
+            _read_records(path, dice, sheets, streams)
+        return _saved_games(dice, sheets, streams)
+
+    async def run(self):
+        """Writes queued records every flush_interval seconds and compacts every snapshot_interval seconds."""
+        loop = asyncio.get_running_loop()
+        next_snapshot = loop.time() + self.snapshot_interval
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+            if loop.time() >= next_snapshot:
+                await asyncio.to_thread(self.compact)
+                next_snapshot = loop.time() + self.snapshot_interval
+
+    async def flush(self):
+        """Writes queued records to the log in a worker thread."""
+        if self._pending:
+            data, self._pending = self._pending, bytearray()
+            count, self._pending_records = self._pending_records, 0
+            await asyncio.to_thread(self._write, data, count)
+
+    def close(self):
+        """Writes any queued records and closes the log. Call once the event loop has stopped."""
+        if self._pending:
+            data, self._pending = self._pending, bytearray()
+            count, self._pending_records = self._pending_records, 0
+            self._write(data, count)
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
+
+    def _write(self, data, count):
+        if self._log_file is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._log_file = open(self.log_path, "ab")
+        self._log_file.write(data)
+        self._log_file.flush()
+        if self.fsync:
+            os.fsync(self._log_file.fileno())
+        self.records_written += count
+
+    def compact(self):
+        """Folds the log into a new snapshot and starts an empty log."""
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
+        if not os.path.exists(self.old_log_path):
+            if not os.path.exists(self.log_path):
+                return
+            os.replace(self.log_path, self.old_log_path)
+
+        dice, sheets, streams = {}, {}, {}
+        _read_records(self.snapshot_path, dice, sheets, streams)
+        _read_records(self.old_log_path, dice, sheets, streams)
+        states = _saved_games(dice, sheets, streams)
+        tmp_path = self.snapshot_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(b"".join(RECORD.pack(channel_id, OPERATIONS["new_game"], saved[0], saved[1])
+                             + (_extra_records(channel_id, saved) if len(saved) > 2 else b"")
+                             for channel_id, saved in states.items()))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+        os.remove(self.old_log_path)
+
+
+def _sheets_record(channel_id, game_number, sheets):
+    return RECORD.pack(channel_id, SHEETS, game_number, len(sheets)) + sheets + bytes(-len(sheets) % RECORD.size)
+
+
+def _stream_record(channel_id, game_number, stream):
+    seed, position = stream
+    return RECORD.pack(channel_id, STREAM, game_number, seed) + POSITION.pack(position) + bytes(RECORD.size - POSITION.size)
+
+
+def _extra_records(channel_id, saved):
+    """Returns the SHEETS and STREAM records of a saved game that has sheets or a stream."""
+    game_number, _, sheets, stream = saved
+    return ((_sheets_record(channel_id, game_number, sheets) if sheets else b"")
+            + (_stream_record(channel_id, game_number, stream) if stream is not None else b""))
+
+
+def _read_records(path, dice, sheets, streams):
+    """
+    Applies the records in path to dice, {channel_id: (game_number, packed)}, sheets,
+    {channel_id: packed sheets}, and streams, {channel_id: (seed, position)}. A partly written
+    final record is ignored.
+    """
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return
+    usable = len(data) - len(data) % RECORD.size
+    new_game = OPERATIONS["new_game"]
+    skip = 0
+    for index, (channel_id, operation, game_number, packed) in enumerate(RECORD.iter_unpack(memoryview(data)[:usable])):
+        if skip:
+            # Part of the sheets of a SHEETS record, or the position of a STREAM record
+            skip -= 1
+        elif operation == SHEETS:
+            start = (index + 1) * RECORD.size
+            if start + packed > usable:
+                return
+            sheets[channel_id] = data[start:start + packed]
+            skip = -(-packed // RECORD.size)
+        elif operation == STREAM:
+            start = (index + 1) * RECORD.size
+            if start + RECORD.size > usable:
+                return
+            streams[channel_id] = (packed, POSITION.unpack_from(data, start)[0])
+            skip = 1
+        else:
+            dice[channel_id] = (game_number, packed)
+            if operation == new_game:
+                sheets.pop(channel_id, None)
+                streams.pop(channel_id, None)
+
+
+def _saved_games(dice, sheets, streams):
+    """Adds the sheets and streams to the dice of their games, making dice {channel_id: saved game}, and returns it."""
+    for channel_id in sheets.keys() | streams.keys():
+        if channel_id in dice:
+            dice[channel_id] += (sheets.get(channel_id, b""), streams.get(channel_id))
+    return dice
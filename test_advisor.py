@@ -0,0 +1,67 @@
+import os
+import random
+import tempfile
+import unittest
+import advisor
+
+class TestAdvisor(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.advisor = advisor.Advisor(os.path.join(cls.directory.name, "advice.bin"))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+
+    def test_last_pick_takes_highest(self):
+        """Test that with one die left to take, the highest value is best and worth exactly its value."""
+        options = self.advisor.advise([2, 6, 4], 2)
+
+        self.assertEqual(options[0], (6, 6.0, 2.0))
+        self.assertEqual([value for value, _, _ in options], [6, 4, 2])
+
+    def test_single_die_future(self):
+        """Test that a die re-rolled for the last pick is worth 3.5 on average."""
+        future_value, future_lost = advisor.solve()
+
+        self.assertAlmostEqual(future_value[1][2], 3.5)
+        self.assertEqual(future_lost[1][2], 0.0)
+        self.assertEqual(future_value[4][3], 0.0)
+
+    def test_options_only_for_available_values(self):
+        """Test that only values that are available are offered, with the dice they discard counted."""
+        options = {value: (total, lost) for value, total, lost in self.advisor.advise([5, 5, 1], 1)}
+
+        self.assertEqual(set(options), {1, 5})
+        self.assertGreaterEqual(options[5][1], 1.0)
+
+    def test_matches_play(self):
+        """Test that following the advice scores what the table expects."""
+        rng = random.Random(5)
+        total = 0
+        turns = 20000
+        for _ in range(turns):
+            dice, picks = 6, 0
+            while dice and picks < advisor.PICKS_PER_TURN:
+                values = [rng.randint(1, 6) for _ in range(dice)]
+                value = self.advisor.advise(values, picks)[0][0]
+                total += value
+                dice -= sum(1 for v in values if v < value) + 1
+                picks += 1
+        future_value, _ = advisor.solve()
+
+        self.assertAlmostEqual(total / turns, future_value[6][0], delta=0.1)
+
+    def test_rejects_other_files(self):
+        """Test that a file that is not an advice table is refused."""
+        path = os.path.join(self.directory.name, "other.bin")
+        with open(path, "wb") as f:
+            f.write(b"not a table")
+
+        with self.assertRaises(ValueError):
+            advisor.Advisor(path)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+import autocomplete
+import game
+
+class TestColorIndex(unittest.TestCase):
+
+    def setUp(self):
+        """Set up a channel with a known dice state."""
+        self.index = autocomplete.ColorIndex()
+        self.game_data = game.GameData(1)
+        self.game_data.available_dice = {"blue": 4, "green": 2, "yellow": 4}
+        self.game_data.chosen_dice_this_round = {"white": 5}
+        self.game_data.discarded_dice_this_round = {"purple": 1, "orange": 6}
+        self.index.update(1, self.game_data)
+
+    def test_offers_only_valid_dice_in_tray_order(self):
+        """Test that /take offers the available dice and /return the discarded ones, by value then color."""
+        self.assertEqual(self.index.take(1, ""), [("Green 2", "green"), ("Blue 4", "blue"), ("Yellow 4", "yellow")])
+        self.assertEqual(self.index.give_back(1, ""), [("Purple 1", "purple"), ("Orange 6", "orange")])
+
+    def test_matches_prefix_and_value(self):
+        """Test that a color prefix, in any case, or a die value narrows the choices."""
+        self.assertEqual(self.index.take(1, "Bl"), [("Blue 4", "blue")])
+        self.assertEqual(self.index.take(1, "4"), [("Blue 4", "blue"), ("Yellow 4", "yellow")])
+        self.assertEqual(self.index.give_back(1, " ORANGE "), [("Orange 6", "orange")])
+
+    def test_no_match_offers_everything(self):
+        """Test that a typo, or a die that is elsewhere, offers every valid die rather than nothing."""
+        self.assertEqual(len(self.index.take(1, "purple")), 3)
+        self.assertEqual(self.index.take(2, ""), [])
+
+    def test_follows_game_changes(self):
+        """Test that updating after a move moves the die between the lists."""
+        self.game_data.choose_die("green")
+        self.index.update(1, self.game_data)
+
+        self.assertEqual(self.index.take(1, "g"), [("Blue 4", "blue"), ("Yellow 4", "yellow")])
+        self.assertEqual(self.index.give_back(1, "g"), [("Purple 1", "purple"), ("Orange 6", "orange")])
+
+    def test_forget(self):
+        """Test that a forgotten channel has no entry, and offers nothing until it is updated again."""
+        self.index.forget(1)
+        self.index.forget(2)
+
+        self.assertNotIn(1, self.index)
+        self.assertEqual(self.index.take(1, ""), [])
+        self.index.update(1, self.game_data)
+        self.assertEqual(len(self.index.take(1, "")), 3)
+
+    def test_channels_share_choices(self):
+        """Test that channels in the same dice state share one set of choice lists, including compact games."""
+        self.index.update(2, game.CompactGameData.from_packed(1, self.game_data.pack()))
+
+        self.assertIs(self.index.take(1, "b"), self.index.take(2, "b"))
+
+if __name__ == '__main__':
+    unittest.main()
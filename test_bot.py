@@ -0,0 +1,71 @@
+import itertools
+import unittest
+from unittest import mock
+import bot
+import fake_discord
+
+_channels = itertools.count(1 << 50)
+
+class TestSheetCommands(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        """Set up a fresh channel, with nothing written to disk."""
+        for name in ("game_store", "history_log"):
+            patcher = mock.patch.object(bot, name, None)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.transport = fake_discord.FakeTransport()
+        self.channel_id = next(_channels)
+
+    async def command(self, name, *args, user_id=1):
+        """Runs a slash command through its callback, as Discord would, and returns (content, ephemeral) of its answer."""
+        interaction = fake_discord.FakeInteraction(self.transport, self.channel_id, user_id=user_id)
+        interaction.command = bot.bot.tree.get_command(name)
+        await interaction.command.callback(interaction, *args)
+        return self.transport.calls[-1][3:]
+
+    async def start_game(self, game_number=1):
+        await self.command("new_game", game_number)
+        game_data = bot.bot.games[self.channel_id]
+        game_data.available_dice = {"green": 3, "yellow": 1, "blue": 5, "orange": 2}
+        return game_data
+
+    async def test_rejections(self):
+        """Test that /mark, /bonus and /sheet answer privately when there is no sheet to use."""
+        message, ephemeral = await self.command("mark", "green")
+        self.assertIn("No game is currently running", message)
+        self.assertTrue(ephemeral)
+
+        await self.start_game(2)
+        for name, args in (("mark", ("green",)), ("bonus", ("blue", 1)), ("sheet", ())):
+            message, ephemeral = await self.command(name, *args)
+            self.assertIn("only available for That's Pretty Clever", message)
+            self.assertTrue(ephemeral)
+
+    async def test_mark(self):
+        """Test that the player who took a die marks it once, and another player marks one from the platter."""
+        game_data = await self.start_game()
+        await self.command("take", "green")
+
+        message, ephemeral = await self.command("mark", "green")
+        self.assertFalse(ephemeral)
+        self.assertEqual(game_data.sheets[1].score("green"), 1)
+        message, ephemeral = await self.command("mark", "green")
+        self.assertIn("already marked", message)
+        self.assertTrue(ephemeral)
+
+        message, ephemeral = await self.command("mark", "green", user_id=2)
+        self.assertIn("not on the silver platter", message)
+        self.assertTrue(ephemeral)
+        message, ephemeral = await self.command("mark", "orange", user_id=2)
+        self.assertFalse(ephemeral)
+        self.assertEqual(game_data.marked, {(1, "green"), (2, "orange")})
+
+        message, ephemeral = await self.command("bonus", "blue", 1)
+        self.assertTrue(ephemeral)
+        message, ephemeral = await self.command("sheet")
+        self.assertIn("<@1>", message)
+        self.assertTrue(ephemeral)
+
+if __name__ == '__main__':
+    unittest.main()
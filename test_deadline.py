@@ -0,0 +1,121 @@
+import asyncio
+import datetime
+import unittest
+import deadline
+import outbound
+
+class FakeResponse:
+    def __init__(self, delay=0.0, expired=False):
+        self.delay = delay
+        self.expired = expired
+        self.calls = []
+        self.ephemeral = None
+
+    def is_done(self):
+        return bool(self.calls)
+
+    async def _initial(self, kind):
+        if self.calls:
+            raise RuntimeError("already answered")
+        await asyncio.sleep(self.delay)
+        if self.expired:
+            raise RuntimeError("unknown interaction")
+        self.calls.append(kind)
+
+    async def send_message(self, content, ephemeral=False):
+        await self._initial("response")
+
+    async def defer(self, ephemeral=False):
+        await self._initial("defer")
+        self.ephemeral = ephemeral
+
+class FakeFollowup:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, content, ephemeral=False):
+        self.sent.append(content)
+
+class FakeInteraction:
+    def __init__(self, age, **response):
+        self.id = 1
+        self.channel_id = 1
+        self.extras = {}
+        self.created_at = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=age)
+        self.response = FakeResponse(**response)
+        self.followup = FakeFollowup()
+
+class TestAutoDeferrer(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.deferrer = deadline.AutoDeferrer(margin=1.0)
+        self.sender = outbound.OutboundSender()
+
+        @self.deferrer.guarded
+        async def handler(interaction, delay):
+            await asyncio.sleep(delay)
+            await self.sender.respond(interaction, "answer", ephemeral=True)
+
+        self.handler = handler
+
+    async def test_fast_command_answers_directly(self):
+        """Test that a command answering in time is not deferred."""
+        interaction = FakeInteraction(0.0)
+
+        await self.handler(interaction, 0.0)
+
+        self.assertEqual(interaction.response.calls, ["response"])
+        self.assertEqual(self.deferrer.stats(), {"direct": 1, "deferred": 0, "prevented": 0, "failed": 0})
+
+    async def test_slow_command_is_deferred(self):
+        """Test that a command still running near the deadline is deferred and answers with a followup."""
+        interaction = FakeInteraction(2.95)
+
+        await self.handler(interaction, 0.1)
+
+        self.assertEqual(interaction.response.calls, ["defer"])
+        self.assertFalse(interaction.response.ephemeral)
+        self.assertEqual(interaction.followup.sent, ["answer"])
+        self.assertEqual(self.deferrer.stats(), {"direct": 0, "deferred": 1, "prevented": 1, "failed": 0})
+
+    async def test_private_command_defers_ephemerally(self):
+        """Test that a command guarded with ephemeral=True is deferred privately."""
+        @self.deferrer.guarded(ephemeral=True)
+        async def handler(interaction):
+            await asyncio.sleep(0.1)
+            await self.sender.respond(interaction, "private", ephemeral=True)
+
+        interaction = FakeInteraction(2.95)
+        await handler(interaction)
+
+        self.assertEqual(interaction.response.calls, ["defer"])
+        self.assertTrue(interaction.response.ephemeral)
+        self.assertEqual(interaction.followup.sent, ["private"])
+
+    async def test_answer_under_way_is_not_deferred(self):
+        """Test that the deadline passing while the initial response is being sent does not defer it."""
+        interaction = FakeInteraction(1.95, delay=0.1)
+
+        await self.handler(interaction, 0.0)
+
+        self.assertEqual(interaction.response.calls, ["response"])
+        self.assertEqual(self.deferrer.deferred, 0)
+
+    async def test_failed_deferral(self):
+        """Test that a deferral Discord refuses is counted and the command carries on."""
+        interaction = FakeInteraction(5.0, expired=True)
+
+        with self.assertLogs("clever", "WARNING"), self.assertRaises(RuntimeError):
+            await self.handler(interaction, 0.01)
+
+        self.assertEqual(self.deferrer.failed, 1)
+
+    async def test_zero_margin_never_defers(self):
+        """Test that a margin of 0 leaves handlers undecorated."""
+        async def handler(interaction):
+            pass
+
+        self.assertIs(deadline.AutoDeferrer(margin=0).guarded(handler), handler)
+
+if __name__ == '__main__':
+    unittest.main()
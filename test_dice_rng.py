@@ -0,0 +1,53 @@
+import collections
+import unittest
+import dice_rng
+
+class TestDiceStream(unittest.TestCase):
+
+    def test_values_uniform(self):
+        """Test that every value 1-6 comes up about equally often, and nothing else does."""
+        counts = collections.Counter(dice_rng.DiceStream(1).roll(60000))
+
+        self.assertEqual(set(counts), {1, 2, 3, 4, 5, 6})
+        for value in range(1, 7):
+            self.assertAlmostEqual(counts[value] / 60000, 1 / 6, delta=0.01)
+
+    def test_seed_replays(self):
+        """Test that the same seed gives the same dice, however the rolls are split."""
+        stream = dice_rng.DiceStream("replay")
+        split = [value for count in [6, 4, 1, 6, 3, 2, 6] * 10 for value in stream.roll(count)]
+
+        self.assertEqual(split, dice_rng.DiceStream("replay").roll(len(split)))
+
+    def test_streams_independent(self):
+        """Test that different seeds give different dice."""
+        self.assertNotEqual(dice_rng.DiceStream(1).roll(30), dice_rng.DiceStream(2).roll(30))
+        self.assertNotEqual(dice_rng.DiceStream().roll(30), dice_rng.DiceStream().roll(30))
+
+    def test_roll_sides(self):
+        """Test that other dice give every value from 1 to their sides, and a d6 is a normal roll."""
+        counts = collections.Counter(dice_rng.DiceStream(1).roll_sides(20000, 20))
+
+        self.assertEqual(set(counts), set(range(1, 21)))
+        self.assertEqual(dice_rng.DiceStream(1).roll_sides(6, 6), dice_rng.DiceStream(1).roll(6))
+
+    def test_resume(self):
+        """Test that a stream resumed from its seed and position rolls what the original would have."""
+        stream = dice_rng.DiceStream(7)
+        for count in [6, 6, 4, 3, 6, 1, 6, 6, 2, 5, 6, 6]:
+            stream.roll(count)
+            resumed = dice_rng.DiceStream.resume(*stream.saved())
+            self.assertEqual(resumed.roll(40), stream.roll(40))
+        self.assertEqual(dice_rng.DiceStream.resume(7, 0).roll(6), dice_rng.DiceStream(7).roll(6))
+        self.assertIsNone(dice_rng.DiceStream("text").saved())
+
+    def test_stream_for(self):
+        """Test that a deployment seed gives each game its own replayable stream, saved with the game if seeded."""
+        self.assertEqual(dice_rng.stream_for("s", 5).roll(12), dice_rng.stream_for("s", 5).roll(12))
+        self.assertNotEqual(dice_rng.stream_for("s", 5).roll(12), dice_rng.stream_for("s", 6).roll(12))
+        self.assertNotEqual(dice_rng.stream_for("", 5).seed, dice_rng.stream_for("", 5).seed)
+        self.assertIsNotNone(dice_rng.stream_for("s", 5).saved())
+        self.assertIsNone(dice_rng.stream_for("", 5).saved())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+import dice_rng
+import diceexpr
+import renderer
+
+class TestDiceExpressions(unittest.TestCase):
+
+    def roll(self, expression, seed=1):
+        plan = diceexpr.compile_expression(expression)
+        return plan, *diceexpr.roll(plan, dice_rng.DiceStream(seed))
+
+    def test_terms(self):
+        """Test that dice, colors, keeps and numbers are all read."""
+        plan = diceexpr.compile_expression("2d6w 1d6red + 4d6kh3 - d20 - 2")
+
+        self.assertEqual(plan.terms, (diceexpr.Term(1, 2, 6, "white", None, None),
+                                      diceexpr.Term(1, 1, 6, "red", None, None),
+                                      diceexpr.Term(1, 4, 6, None, "h", 3),
+                                      diceexpr.Term(-1, 1, 20, None, None, None)))
+        self.assertEqual(plan.modifier, -2)
+        self.assertEqual(plan.d6_count, 7)
+        self.assertFalse(plan.d6_only or plan.plain_sum or plan.faces)
+        qroll = diceexpr.compile_expression(diceexpr.PRESETS["qroll"])
+        self.assertTrue(qroll.d6_only and qroll.plain_sum)
+        self.assertEqual(len(qroll.faces), 6)
+
+    def test_invalid(self):
+        """Test that invalid expressions are refused with a message."""
+        for expression in ("", "x", "3d6 +", "2d6q", "1d20r", "4d6kh5", "101d6", "2d1", "1d6+5000"):
+            with self.assertRaises(ValueError, msg=expression):
+                diceexpr.compile_expression(expression)
+
+    def test_cached(self):
+        """Test that a repeated expression is not parsed again."""
+        first = diceexpr.compile_expression("3d6+2")
+        hits = diceexpr.compile_expression.cache_info().hits
+
+        self.assertIs(diceexpr.compile_expression("3d6+2"), first)
+        self.assertEqual(diceexpr.compile_expression.cache_info().hits, hits + 1)
+
+    def test_total(self):
+        """Test that the total adds the kept dice and the numbers."""
+        _, values, dropped, total = self.roll("4d6kh3 - 1d8 + 5")
+
+        self.assertEqual(len(values), 5)
+        self.assertEqual(len(dropped), 1)
+        self.assertEqual(values[dropped.pop()], min(values[:4]))
+        self.assertEqual(total, sum(values[:4]) - min(values[:4]) - values[4] + 5)
+        self.assertTrue(1 <= values[4] <= 8)
+
+    def test_d6_rolled_together(self):
+        """Test that the d6 of every term come from one roll of the stream, in order."""
+        _, values, _, total = self.roll("1d20 2d6 1d6r", seed="d6")
+
+        self.assertEqual(values[1:], dice_rng.DiceStream("d6").roll(3))
+        self.assertEqual(total, sum(values))
+
+    def test_render(self):
+        """Test that colored dice are shown as emoji only, and other rolls with their total."""
+        plan, *rolled = self.roll("1d6w 1d6r")
+        self.assertNotIn("=", renderer.render_dice_roll(plan, *rolled))
+
+        plan, values, dropped, total = self.roll("4d6kl1 + 3")
+        message = renderer.render_dice_roll(plan, values, dropped, total)
+        self.assertEqual(message.count("~~"), 6)
+        self.assertTrue(message.endswith(f"+ 3 = **{total}**"))
+
+
+if __name__ == '__main__':
+    unittest.main()
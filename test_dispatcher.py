@@ -0,0 +1,61 @@
+import asyncio
+import unittest
+import dispatcher
+
+class FakeResponse:
+    def __init__(self):
+        self.messages = []
+
+    async def send_message(self, content, ephemeral=False):
+        self.messages.append((content, ephemeral))
+
+class FakeInteraction:
+    def __init__(self, channel_id):
+        self.channel_id = channel_id
+        self.extras = {}
+        self.response = FakeResponse()
+
+class TestChannelDispatcher(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.dispatcher = dispatcher.ChannelDispatcher(max_depth=3)
+        self.events = []
+
+        @self.dispatcher.serialized
+        async def handler(interaction, name, delay):
+            self.events.append(("start", name))
+            await asyncio.sleep(delay)
+            self.events.append(("end", name))
+            return name
+
+        self.handler = handler
+
+    async def test_same_channel_runs_in_order(self):
+        """Test that commands in one channel never overlap and run in arrival order."""
+        results = await asyncio.gather(*(self.handler(FakeInteraction(1), name, 0.01) for name in "abc"))
+
+        self.assertEqual(results, ["a", "b", "c"])
+        self.assertEqual(self.events, [("start", "a"), ("end", "a"), ("start", "b"), ("end", "b"), ("start", "c"), ("end", "c")])
+        self.assertEqual(self.dispatcher.stats()["waits"], 3)
+        self.assertGreater(self.dispatcher.wait_max, 0.015)
+
+    async def test_channels_run_concurrently(self):
+        """Test that commands in different channels overlap."""
+        await asyncio.gather(self.handler(FakeInteraction(1), "a", 0.01), self.handler(FakeInteraction(2), "b", 0.01))
+
+        self.assertEqual(self.events[:2], [("start", "a"), ("start", "b")])
+
+    async def test_full_queue_is_busy(self):
+        """Test that commands beyond the queue depth get an ephemeral busy reply."""
+        interactions = [FakeInteraction(1) for _ in range(4)]
+
+        results = await asyncio.gather(*(self.handler(interaction, i, 0.01) for i, interaction in enumerate(interactions)))
+
+        self.assertEqual(results, [0, 1, 2, None])
+        self.assertEqual(interactions[3].response.messages, [(dispatcher.BUSY_MESSAGE, True)])
+        self.assertEqual(interactions[3].extras["outcome"], "busy")
+        self.assertEqual(self.dispatcher.rejected, 1)
+        self.assertEqual(self.dispatcher.stats()["channels_queued"], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import asyncio
+import unittest
+import discord
+import fake_discord
+
+class TestFakeDiscord(unittest.TestCase):
+
+    def setUp(self):
+        self.transport = fake_discord.FakeTransport()
+        self.interaction = fake_discord.FakeInteraction(self.transport, channel_id=5)
+
+    def test_records_calls(self):
+        """Test that the response and followups are recorded in order, with their content."""
+        async def answer():
+            await self.interaction.response.send_message("hello")
+            await self.interaction.followup.send("again", ephemeral=True)
+        asyncio.run(answer())
+
+        self.assertTrue(self.interaction.response.is_done())
+        self.assertEqual([call[2:] for call in self.transport.calls],
+                         [("response", "hello", False), ("followup", "again", True)])
+
+    def test_second_response_fails(self):
+        """Test that an interaction can only be answered once, like on Discord."""
+        async def answer_twice():
+            await self.interaction.response.defer()
+            await self.interaction.response.send_message("too late")
+
+        with self.assertRaises(discord.InteractionResponded):
+            asyncio.run(answer_twice())
+
+    def test_expired_interaction(self):
+        """Test that a response after the interaction timed out fails with error 10062."""
+        self.interaction.created -= fake_discord.INTERACTION_TIMEOUT + 1
+
+        with self.assertRaises(discord.NotFound) as raised:
+            asyncio.run(self.interaction.response.send_message("hello"))
+        self.assertEqual(raised.exception.code, 10062)
+        self.assertEqual(self.transport.expired, 1)
+        self.assertEqual(self.transport.calls, [])
+
+    def test_delay(self):
+        """Test that calls are delayed by the transport's delay."""
+        self.transport.delay = 0.05
+        loop = asyncio.new_event_loop()
+        start = loop.time()
+        loop.run_until_complete(self.interaction.followup.send("slow"))
+        elapsed = loop.time() - start
+        loop.close()
+
+        self.assertGreaterEqual(elapsed, 0.05)
+
+if __name__ == '__main__':
+    unittest.main()
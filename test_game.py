@@ -1,11 +1,12 @@
 import unittest
+import dice_rng
 import game
 
 class TestGameLogic(unittest.TestCase):
 
     def setUp(self):
         """Set up a new GameData instance for each test."""
-        self.game_data = game.GameData()
+        self.game_data = game.GameData(1)
 
     def test_initial_state(self):
         """Test that a new GameData instance has empty dice sets."""
@@ -20,7 +21,7 @@ class TestGameLogic(unittest.TestCase):
         self.assertEqual(len(self.game_data.available_dice), 6)
         self.assertEqual(self.game_data.chosen_dice_this_round, {})
         self.assertEqual(self.game_data.discarded_dice_this_round, {})
-        for color in game.DICE_COLORS:
+        for color in game.DICE_COLORS[1]:
             self.assertIn(color, rolls)
             self.assertTrue(1 <= rolls[color] <= 6)
 
@@ -129,5 +130,43 @@ class TestGameLogic(unittest.TestCase):
         self.assertEqual(self.game_data.discarded_dice_this_round, {})
         self.assertIn("Dice state reset", message)
 
+    def test_seeded_dice_replay(self):
+        """Test that two games rolling from streams with the same seed get the same dice."""
+        games = [type(self.game_data)(1, dice_rng.DiceStream("seed")) for _ in range(2)]
+
+        for game_data in games:
+            game_data.roll_dice()
+            game_data.choose_die("white")
+            game_data.reroll_available_dice()
+
+        self.assertEqual(games[0].state_key(), games[1].state_key())
+        self.assertEqual(games[0].dice_stream.seed, "seed")
+
+
+class TestCompactGameLogic(TestGameLogic):
+    """Runs every GameData test against CompactGameData."""
+
+    def setUp(self):
+        """Set up a new CompactGameData instance for each test."""
+        self.game_data = game.CompactGameData(1)
+
+    def test_has_no_instance_dict(self):
+        """Test that the compact state is slotted."""
+        self.assertFalse(hasattr(self.game_data, "__dict__"))
+
+    def test_matches_game_data(self):
+        """Test that a sequence of moves gives the same dice and messages as GameData."""
+        game_data = game.GameData(1)
+        game_data.available_dice = {"blue": 6, "green": 2, "yellow": 3, "white": 5, "purple": 2, "orange": 6}
+        self.game_data.available_dice = dict(game_data.available_dice)
+
+        for action, color in [("choose_die", "white"), ("return_die", "green"), ("choose_die", "orange"),
+                              ("return_die", "yellow"), ("choose_die", "blue"), ("return_die", "white")]:
+            self.assertEqual(getattr(self.game_data, action)(color), getattr(game_data, action)(color))
+            self.assertEqual(list(self.game_data.available_dice.items()), list(game_data.available_dice.items()))
+            self.assertEqual(list(self.game_data.chosen_dice_this_round.items()), list(game_data.chosen_dice_this_round.items()))
+            self.assertEqual(list(self.game_data.discarded_dice_this_round.items()), list(game_data.discarded_dice_this_round.items()))
+            self.assertEqual(self.game_data.state_key(), game_data.state_key())
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,142 @@
+import asyncio
+import os
+import tempfile
+import unittest
+import game
+import history
+
+class TestHistoryLog(unittest.TestCase):
+
+    def setUp(self):
+        """Set up a history log in an empty temporary directory."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.log = history.HistoryLog(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def play_turn(self, channel_id=1, user_id=42):
+        """Records a turn with known dice: roll, take the yellow 5 (discarding the lower dice), then done."""
+        game_data = game.GameData(1)
+        self.log.record(channel_id, user_id, "new_game", game_data)
+        game_data.available_dice = {"blue": 2, "green": 3, "orange": 6, "purple": 1, "yellow": 5, "white": 4}
+        self.log.record(channel_id, user_id, "roll", game_data)
+        game_data.choose_die("yellow")
+        self.log.record(channel_id, user_id, "choose", game_data)
+        game_data.reset()
+        self.log.record(channel_id, user_id, "reset", game_data)
+
+    def events(self, channel_id=1):
+        with open(self.log.path(channel_id), "rb") as f:
+            data = f.read()
+        return [history.EVENT.unpack_from(data, offset) for offset in range(0, len(data), history.EVENT.size)]
+
+    def test_events(self):
+        """Test that each move is recorded as one event per die it changed."""
+        self.play_turn()
+        self.log.close()
+
+        kinds = [(event[0] >> 3, event[0] & 0b111, event[1]) for event in self.events()]
+        self.assertEqual(kinds[0], (history.NEW_GAME, 0, 0))
+        self.assertEqual(sorted(kinds[1:7]), sorted((history.ROLL, value, i) for i, value in enumerate([2, 3, 6, 1, 5, 4])))
+        self.assertEqual(kinds[7], (history.TAKE, 5, 4))
+        self.assertEqual(sorted(kinds[8:12]), [(history.DISCARD, 1, 3), (history.DISCARD, 2, 0), (history.DISCARD, 3, 1), (history.DISCARD, 4, 5)])
+        self.assertEqual(kinds[12], (history.DONE, 0, 0))
+        self.assertEqual(len(kinds), 13)
+        self.assertTrue(all(event[4] == 42 for event in self.events()))
+
+    def test_return(self):
+        """Test that returning a die is recorded."""
+        game_data = game.GameData(1)
+        game_data.available_dice = {"blue": 2, "yellow": 5}
+        self.log.record(1, 42, "roll", game_data)
+        game_data.choose_die("yellow")
+        self.log.record(1, 42, "choose", game_data)
+        game_data.return_die("blue")
+        self.log.record(1, 42, "return", game_data)
+        self.log.close()
+
+        self.assertEqual(self.events()[-1][:2], (history.RETURN << 3 | 2, 0))
+
+    def test_no_event_no_file(self):
+        """Test that a move changing no dice writes nothing."""
+        game_data = game.GameData(1)
+        self.log.record(1, 42, "mark", game_data)
+        self.log.close()
+
+        self.assertFalse(os.path.exists(self.log.path(1)))
+
+    def test_forget_and_resume(self):
+        """Test that a game spilled and loaded again mid-turn records its next move against the dice it had."""
+        game_data = game.GameData(1)
+        game_data.available_dice = {"blue": 2, "yellow": 5}
+        self.log.record(1, 42, "roll", game_data)
+        self.log.forget(1)
+        self.assertNotIn(1, self.log._last)
+        self.log.resume(1, game_data)
+        game_data.choose_die("yellow")
+        self.log.record(1, 42, "choose", game_data)
+        self.log.close()
+
+        kinds = [event[0] >> 3 for event in self.events()]
+        self.assertEqual(kinds, [history.ROLL, history.ROLL, history.TAKE, history.DISCARD])
+
+    def test_recent_turns(self):
+        """Test that recent turns are read back oldest first, including events not written yet."""
+        self.play_turn(user_id=1)
+        self.log.close()
+        self.play_turn(user_id=2)
+
+        turns = asyncio.run(self.log.recent_turns(1, 5))
+
+        # The second new game ends the history shown
+        self.assertEqual(len(turns), 1)
+        self.assertEqual(turns[0][0][0] >> 3, history.NEW_GAME)
+        self.assertEqual(turns[0][-1][0] >> 3, history.DONE)
+        self.assertEqual({event[4] for event in turns[0]}, {2})
+
+    def test_luck(self):
+        """Test that luck counts only the given user's dice."""
+        self.play_turn(user_id=42)
+        self.play_turn(user_id=2 ** 40 + 42)
+        self.play_turn(user_id=42)
+        asyncio.run(self.log.flush())
+
+        stats = asyncio.run(self.log.luck(1, 42))
+
+        self.assertEqual(stats["rolled"], [0, 2, 2, 2, 2, 2, 2])
+        self.assertEqual(stats["taken"], [0, 0, 0, 0, 0, 2, 0])
+        self.assertEqual(stats["discarded"], 8)
+        self.assertEqual(stats["turns"], 2)
+        self.assertEqual(asyncio.run(self.log.luck(2, 42))["turns"], 0)
+
+    def test_partial_event_ignored(self):
+        """Test that a partly written final event is left out."""
+        self.play_turn()
+        self.log.close()
+        with open(self.log.path(1), "ab") as f:
+            f.write(b"\x10" * 5)
+
+        self.assertEqual(asyncio.run(self.log.luck(1, 42))["turns"], 1)
+
+    def test_compact(self):
+        """Test that compaction drops old events and keeps the newest."""
+        self.play_turn(channel_id=1)
+        self.play_turn(channel_id=2)
+        self.log.close()
+        # Make channel 1's events a year old
+        old = b"".join(history.EVENT.pack(*event[:3], event[3] - 366 * 86400, *event[4:]) for event in self.events(1))
+        with open(self.log.path(1), "wb") as f:
+            f.write(old)
+
+        self.assertEqual(self.log.compact(keep_days=365), 13)
+        self.assertFalse(os.path.exists(self.log.path(1)))
+        self.assertEqual(len(self.events(2)), 13)
+
+        self.assertEqual(self.log.compact(keep_events=5), 8)
+        self.assertEqual(self.events(2)[-1][0] >> 3, history.DONE)
+        self.assertEqual(self.log.compact(keep_events=5), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
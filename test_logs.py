@@ -0,0 +1,81 @@
+import asyncio
+import io
+import json
+import logging
+import unittest
+import fake_discord
+import logs
+
+class TestLogs(unittest.TestCase):
+
+    def setUp(self):
+        self.output = io.StringIO()
+        logs.setup("INFO", {"roll": 3}, buffer_size=100, stream=self.output, interval=60)
+        self.interaction = fake_discord.FakeInteraction(fake_discord.FakeTransport(), channel_id=7, user_id=9)
+
+    def tearDown(self):
+        logs.stop()
+
+    def records(self):
+        logs.stop()
+        return [json.loads(line) for line in self.output.getvalue().splitlines()]
+
+    def test_command_record(self):
+        """Test that a command is written as one JSON line with its channel, user, arguments, outcome and duration."""
+        logs.log_command("take", self.interaction, ["blue"], "ok", 0.0025)
+
+        [record] = self.records()
+        self.assertEqual(record["level"], "INFO")
+        self.assertEqual((record["command"], record["channel"], record["user"], record["args"], record["outcome"]),
+                         ("take", 7, 9, ["blue"], "ok"))
+        self.assertEqual(record["duration_ms"], 2.5)
+        self.assertNotIn("sample", record)
+
+    def test_sampling(self):
+        """Test that a sampled command is written one time in N, and that errors are always written."""
+        for _ in range(6):
+            logs.log_command("roll", self.interaction, [], "ok", 0.001)
+        logs.log_command("roll", self.interaction, [], "error", 0.001)
+
+        records = self.records()
+        self.assertEqual([record["outcome"] for record in records], ["ok", "ok", "error"])
+        self.assertEqual(records[0]["sample"], 3)
+        self.assertEqual(logs.stats()["sampled_out"], 4)
+
+    def test_full_buffer_drops(self):
+        """Test that records beyond the buffer size are dropped and counted instead of blocking."""
+        for _ in range(150):
+            logs.log_command("take", self.interaction, [], "ok", 0.001)
+
+        self.assertEqual(logs.stats()["dropped"], 50)
+        self.assertEqual(len(self.records()), 100)
+
+    def test_logged_outcomes(self):
+        """Test that the logged decorator records the handler's outcome, or an error if it raised."""
+        @logs.logged("return")
+        async def handler(interaction, color):
+            if color == "bad":
+                raise ValueError(color)
+            interaction.extras["outcome"] = "invalid"
+
+        asyncio.run(handler(self.interaction, "green"))
+        with self.assertRaises(ValueError):
+            asyncio.run(handler(fake_discord.FakeInteraction(self.interaction.transport, 7), "bad"))
+
+        records = self.records()
+        self.assertEqual([(record["outcome"], record["args"]) for record in records], [("invalid", ["green"]), ("error", ["bad"])])
+        self.assertEqual(records[1]["level"], "ERROR")
+
+    def test_other_loggers(self):
+        """Test that other loggers' records, with exceptions, go through the same pipeline."""
+        try:
+            raise RuntimeError("boom")
+        except RuntimeError:
+            logging.getLogger("discord.gateway").exception("Gateway failed")
+
+        [record] = self.records()
+        self.assertEqual((record["logger"], record["message"]), ("discord.gateway", "Gateway failed"))
+        self.assertIn("RuntimeError: boom", record["exception"])
+
+if __name__ == '__main__':
+    unittest.main()
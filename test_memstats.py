@@ -0,0 +1,90 @@
+import asyncio
+import asyncio.events
+import json
+import os
+import tempfile
+import tracemalloc
+import unittest
+import dice_rng
+import game
+import memstats
+import registry
+
+class TestMemstats(unittest.TestCase):
+
+    def tearDown(self):
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def test_deep_size(self):
+        """Test that a game's size counts what it holds, but not what every game shares."""
+        game_data = game.GameData(1, dice_stream=dice_rng.DiceStream(1000))
+        empty = memstats.deep_size(game_data)
+        game_data.available_dice = {"blue": 4, "green": 2}
+
+        self.assertGreater(memstats.deep_size(game_data), empty)
+        # Not exactly equal: CPython sizes the attribute dict of the first instance of a class
+        # differently, so this depends on whether other tests made games first. Counting the
+        # shared colors would add hundreds of bytes.
+        self.assertLess(abs(memstats.deep_size(game.GameData(1, dice_stream=dice_rng.DiceStream(2000))) - empty), 64)
+        self.assertLess(memstats.deep_size(game.CompactGameData(1, dice_stream=dice_rng.DiceStream(1000))), empty)
+
+    def test_game_sizes(self):
+        """Test that game sizes are totalled over the games in memory, measuring at most `limit`."""
+        with tempfile.TemporaryDirectory() as directory:
+            games = registry.GameRegistry(os.path.join(directory, "spill.sqlite3"))
+            for channel_id in range(10):
+                games[channel_id] = game.GameData(1)
+            games[10] = game.CompactGameData(1)
+
+            sizes = memstats.game_sizes(games, limit=4)
+            games.close()
+
+        self.assertEqual((sizes["games"], sizes["measured"]), (11, 4))
+        self.assertEqual(sizes["classes"], {"GameData": 10, "CompactGameData": 1})
+        self.assertAlmostEqual(sizes["total"], sizes["mean"] * 11, delta=1)
+
+    def test_module_name(self):
+        """Test that files are grouped as the bot's modules, library packages and standard library modules."""
+        self.assertEqual(memstats.module_name(game.__file__), "game")
+        self.assertEqual(memstats.module_name(asyncio.events.__file__), "asyncio")
+        self.assertEqual(memstats.module_name(os.path.join("venv", "lib", "site-packages", "discord", "state.py")), "discord")
+
+    def test_snapshot_diff(self):
+        """Test that a second snapshot shows what was allocated since the first, by module."""
+        tracer = memstats.Tracer()
+        self.assertTrue(tracer.snapshot()["first"])
+        kept = [str(i) * 100 for i in range(2000)]
+
+        summary = tracer.snapshot()
+
+        self.assertFalse(summary["first"])
+        modules = {module: change for module, _, change in summary["modules"]}
+        self.assertGreater(modules["test_memstats"], 200_000)
+        self.assertEqual(summary["sites"][0][0], "test_memstats")
+        tracer.stop()
+        self.assertFalse(tracer.tracing)
+        del kept
+
+    def test_sampler(self):
+        """Test that the sampler appends JSON lines with the collected numbers."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "memory.jsonl")
+            sampler = memstats.Sampler(path, 0.01, lambda: {"games": 3})
+
+            async def run():
+                task = asyncio.create_task(sampler.run())
+                while sampler.samples < 2:
+                    await asyncio.sleep(0.01)
+                task.cancel()
+
+            asyncio.run(run())
+            with open(path) as f:
+                samples = [json.loads(line) for line in f]
+
+        self.assertGreaterEqual(len(samples), 2)
+        self.assertEqual(samples[0]["games"], 3)
+        self.assertIn("modules", samples[1])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import asyncio
+import unittest
+import fake_discord
+import metrics
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = metrics.Metrics()
+        self.interaction = fake_discord.FakeInteraction(fake_discord.FakeTransport(), channel_id=1)
+
+    def test_phases(self):
+        """Test that a command's time is split into its phases, with the game logic as the remainder."""
+        self.interaction.extras.update(wait=0.002, render=0.0003, send=0.01)
+
+        self.metrics.record_command("roll", self.interaction, "ok", 0.0124)
+
+        histograms = self.metrics.durations["roll"]
+        self.assertEqual(self.metrics.commands, {("roll", "ok"): 1})
+        self.assertAlmostEqual(histograms["logic"].sum, 0.0001)
+        self.assertAlmostEqual(histograms["total"].sum, 0.0124)
+        self.assertEqual(histograms["send"].quantile(0.5), 0.01)
+
+    def test_phase_adds_up(self):
+        """Test that phase() adds to the time already recorded for the phase."""
+        for _ in range(2):
+            with metrics.phase(self.interaction, "render"):
+                pass
+
+        self.assertGreater(self.interaction.extras["render"], 0.0)
+
+    def test_quantile(self):
+        """Test that quantiles are estimated as the upper bound of their bucket."""
+        histogram = metrics.Histogram()
+        for seconds in [0.0002] * 98 + [0.3, 10.0]:
+            histogram.observe(seconds)
+
+        self.assertEqual(histogram.quantile(0.5), 0.00025)
+        self.assertEqual(histogram.quantile(0.99), 0.5)
+        self.assertEqual(histogram.quantile(1.0), float("inf"))
+
+    def test_render(self):
+        """Test the Prometheus text format, including cumulative buckets and collectors."""
+        self.metrics.record_command("take", self.interaction, "invalid", 0.0002)
+        self.metrics.add_collector(lambda: [("clever_games", "gauge", "Games.", [({"where": "memory"}, 3)])])
+        self.metrics.startup["first_command"] = 1.5
+
+        text = self.metrics.render()
+
+        self.assertIn('clever_commands_total{command="take",outcome="invalid"} 1\n', text)
+        self.assertIn('clever_command_duration_seconds_bucket{command="take",phase="total",le="0.0001"} 0\n', text)
+        self.assertIn('clever_command_duration_seconds_bucket{command="take",phase="total",le="0.00025"} 1\n', text)
+        self.assertIn('clever_command_duration_seconds_bucket{command="take",phase="total",le="+Inf"} 1\n', text)
+        self.assertIn('# TYPE clever_games gauge\nclever_games{where="memory"} 3\n', text)
+        self.assertIn('clever_startup_seconds{milestone="first_command"} 1.5\n', text)
+
+    def test_serve(self):
+        """Test that the HTTP server answers /metrics and nothing else."""
+        async def get(path):
+            server = await self.metrics.serve("127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(f"GET {path} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+            response = await reader.read()
+            writer.close()
+            server.close()
+            await server.wait_closed()
+            return response.decode()
+
+        self.assertTrue(asyncio.run(get("/metrics")).startswith("HTTP/1.1 200 OK"))
+        self.assertIn("clever_expired_interactions_total 0", asyncio.run(get("/metrics")))
+        self.assertTrue(asyncio.run(get("/")).startswith("HTTP/1.1 404"))
+
+if __name__ == '__main__':
+    unittest.main()
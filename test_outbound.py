@@ -0,0 +1,44 @@
+import unittest
+import outbound
+
+class FakeResponse:
+    def __init__(self):
+        self.messages = []
+
+    def is_done(self):
+        return bool(self.messages)
+
+    async def send_message(self, content, ephemeral=False):
+        self.messages.append(content)
+
+class FakeFollowup:
+    def __init__(self, sent):
+        self.sent = sent
+
+    async def send(self, content, ephemeral=False):
+        self.sent.append(content)
+
+class FakeInteraction:
+    def __init__(self, channel_id, sent):
+        self.channel_id = channel_id
+        self.extras = {}
+        self.response = FakeResponse()
+        self.followup = FakeFollowup(sent)
+
+class TestOutboundSender(unittest.IsolatedAsyncioTestCase):
+
+    async def test_respond_falls_back_to_followup(self):
+        """Test that a second message for an interaction is sent as a followup."""
+        sender = outbound.OutboundSender()
+        sent = []
+        interaction = FakeInteraction(1, sent)
+
+        await sender.respond(interaction, "first")
+        await sender.respond(interaction, "second")
+
+        self.assertEqual(interaction.response.messages, ["first"])
+        self.assertEqual(sent, ["second"])
+        self.assertEqual(sender.stats()["calls"], {"response": 1, "followup": 1})
+
+if __name__ == '__main__':
+    unittest.main()
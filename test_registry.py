@@ -0,0 +1,159 @@
+import asyncio
+import os
+import tempfile
+import unittest
+import dice_rng
+import game
+import registry
+import scoresheet
+
+class TestGameRegistry(unittest.TestCase):
+
+    def setUp(self):
+        """Set up a registry spilling into a temporary directory."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.games = registry.GameRegistry(os.path.join(self.directory.name, "spill.sqlite3"), ttl=60)
+
+    def tearDown(self):
+        self.games.close()
+        self.directory.cleanup()
+
+    def make_game(self):
+        game_data = game.GameData(2)
+        game_data.available_dice = {"blue": 6, "green": 2, "silver": 3}
+        game_data.choose_die("silver")
+        return game_data
+
+    def test_get_missing(self):
+        """Test that an unknown channel has no game."""
+        self.assertIsNone(self.games.get(1))
+        self.assertNotIn(1, self.games)
+
+    def test_spill_file_opened_on_first_spill(self):
+        """Test that a registry only creates its spill file once it spills a game."""
+        path = os.path.join(self.directory.name, "state", "spill.sqlite3")
+        games = registry.GameRegistry(path, ttl=0)
+        games[1] = self.make_game()
+        self.assertFalse(os.path.exists(os.path.dirname(path)))
+
+        asyncio.run(games.sweep())
+        games.close()
+
+        self.assertTrue(os.path.exists(path))
+
+    def test_idle_game_is_spilled_and_rehydrated(self):
+        """Test that a game past the TTL leaves memory and comes back with the same dice."""
+        game_data = self.make_game()
+        self.games[1] = game_data
+        self.games.ttl = 0
+
+        asyncio.run(self.games.sweep())
+
+        self.assertEqual(self.games.stats(), {"resident": 0, "spilled": 1, "rehydrated": 0, "evicted": 1})
+        self.assertIn(1, self.games)
+        restored = self.games.get(1)
+        self.assertIsNot(restored, game_data)
+        self.assertEqual(restored.state_key(), game_data.state_key())
+        self.assertEqual(self.games.stats(), {"resident": 1, "spilled": 0, "rehydrated": 1, "evicted": 1})
+
+    def test_sheets_survive_spill(self):
+        """Test that scoresheets, and the dice marked on them this turn, are spilled and rehydrated with the game."""
+        game_data = game.GameData(1)
+        game_data.available_dice = {"green": 4, "yellow": 2}
+        game_data.choose_die("green")
+        scoresheet.mark_die(game_data, 5, "green")
+        self.games[1] = game_data
+        self.games.ttl = 0
+
+        asyncio.run(self.games.sweep())
+        restored = self.games.get(1)
+
+        self.assertEqual(restored.sheets[5].pack(), game_data.sheets[5].pack())
+        self.assertEqual(restored.marked, {(5, "green")})
+        self.assertIn("already marked", scoresheet.mark_die(restored, 5, "green")[1])
+
+    def test_dice_stream_survives_spill(self):
+        """Test that a rehydrated game goes on with the dice its stream would have rolled."""
+        game_data = game.new_game(1, dice_stream=dice_rng.DiceStream(4))
+        game_data.roll_dice()
+        self.games[1] = game_data
+        self.games.ttl = 0
+
+        asyncio.run(self.games.sweep())
+        restored = self.games.get(1)
+
+        self.assertEqual(restored.dice_stream.roll(30), game_data.dice_stream.roll(30))
+
+    def test_recent_game_stays(self):
+        """Test that a game used within the TTL is not spilled."""
+        self.games[1] = self.make_game()
+
+        asyncio.run(self.games.sweep())
+
+        self.assertEqual(self.games.stats()["resident"], 1)
+
+    def test_max_resident_spills_least_recently_used(self):
+        """Test that the oldest games are spilled once over the limit."""
+        for channel_id in range(1, 6):
+            self.games[channel_id] = self.make_game()
+        self.games.get(1)
+        self.games.max_resident = 2
+        self.games.sweep_batch = 1
+
+        asyncio.run(self.games.sweep())
+
+        self.assertEqual(self.games.stats()["resident"], 2)
+        self.assertEqual(self.games.stats()["spilled"], 3)
+        self.assertEqual(len(self.games), 5)
+        self.assertIn(1, self.games._resident)
+        self.assertIn(5, self.games._resident)
+
+    def test_on_spill_called(self):
+        """Test that on_spill is told about every game spilled."""
+        spilled = []
+        self.games.on_spill = spilled.append
+        self.games[1] = self.make_game()
+        self.games[2] = self.make_game()
+        self.games.ttl = 0
+
+        asyncio.run(self.games.sweep())
+
+        self.assertEqual(sorted(spilled), [1, 2])
+
+    def test_restored_games_built_on_first_use(self):
+        """Test that games restored from the store are only built when used."""
+        game_data = self.make_game()
+        self.games.restore({7: (2, game_data.pack())})
+
+        self.assertEqual(self.games.stats()["resident"], 0)
+        self.assertEqual(self.games[7].state_key(), game_data.state_key())
+        self.assertEqual(self.games.stats()["rehydrated"], 1)
+
+    def test_on_load_called(self):
+        """Test that on_load is told about every restored or spilled game loaded again."""
+        loaded = []
+        self.games.on_load = lambda channel_id, game_data: loaded.append((channel_id, game_data.state_key()))
+        game_data = self.make_game()
+        self.games.restore({7: (2, game_data.pack())})
+        self.games[1] = self.make_game()
+        self.games.ttl = 0
+        asyncio.run(self.games.sweep())
+
+        self.games[7]
+        self.games[1]
+
+        self.assertEqual(loaded, [(7, game_data.state_key()), (1, self.games[1].state_key())])
+
+    def test_new_game_replaces_spilled(self):
+        """Test that setting a channel's game discards its spilled game."""
+        self.games[1] = self.make_game()
+        self.games.ttl = 0
+        asyncio.run(self.games.sweep())
+
+        self.games[1] = game.GameData(1)
+
+        self.assertEqual(self.games.get(1).game_number, 1)
+        self.assertEqual(len(self.games), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import subprocess
+import sys
+import unittest
+import game
+import renderer
+
+class TestRenderer(unittest.TestCase):
+
+    def setUp(self):
+        """Set up a new game of That's Pretty Clever with a known dice state."""
+        self.game_data = game.GameData(1)
+        self.game_data.available_dice = {"blue": 4, "green": 2, "yellow": 4}
+        self.game_data.chosen_dice_this_round = {"white": 5, "orange": 3}
+        self.game_data.discarded_dice_this_round = {"purple": 1}
+
+    def test_dice_state_lists_each_category(self):
+        """Test that the dice state message lists chosen dice in order and sorts the others."""
+        message = renderer.render_dice_state(self.game_data, "Rolling all new dice...")
+        lines = message.split("\n")
+
+        self.assertEqual(lines[0], "Rolling all new dice...")
+        self.assertLess(message.index("- White:"), message.index("- Orange:"))
+        self.assertLess(message.index("- Green:"), message.index("- Blue:"))
+        self.assertLess(message.index("- Blue:"), message.index("- Yellow:"))
+        self.assertIn(renderer.DIE_LINES["purple"][1], lines)
+        self.assertIn("Use `/take color:<color>`", message)
+
+    def test_dice_state_empty(self):
+        """Test the message for a game with no dice rolled yet."""
+        message = renderer.render_dice_state(game.GameData(2))
+
+        self.assertIn("**Chosen Dice:** None", message)
+        self.assertIn("**Available Dice:** None", message)
+        self.assertIn("Use `/roll` to start a new round", message)
+
+    def test_turn_summary_merges_leftover_dice(self):
+        """Test that available and discarded dice are both offered to other players, sorted by value."""
+        message = renderer.render_turn_summary(self.game_data)
+
+        self.assertIn("**Dice available to other players:**", message)
+        self.assertLess(message.index("- Purple:"), message.index("- Green:"))
+        self.assertLess(message.index("- Green:"), message.index("- Blue:"))
+
+    def test_same_state_is_cached(self):
+        """Test that rendering an equal state twice is served from the cache."""
+        renderer.render_dice_state(self.game_data)
+        hits = renderer.cache_stats()["dice_state"].hits
+
+        other = game.GameData(1)
+        other.available_dice = {"yellow": 4, "green": 2, "blue": 4}
+        other.chosen_dice_this_round = {"white": 5, "orange": 3}
+        other.discarded_dice_this_round = {"purple": 1}
+        renderer.render_dice_state(other)
+
+        self.assertEqual(renderer.cache_stats()["dice_state"].hits, hits + 1)
+
+    def test_chosen_order_changes_key(self):
+        """Test that chosen dice in a different order are rendered separately."""
+        other = game.GameData(1)
+        other.available_dice = dict(self.game_data.available_dice)
+        other.chosen_dice_this_round = {"orange": 3, "white": 5}
+        other.discarded_dice_this_round = dict(self.game_data.discarded_dice_this_round)
+
+        self.assertNotEqual(self.game_data.state_key(), other.state_key())
+        self.assertNotEqual(renderer.render_dice_state(self.game_data), renderer.render_dice_state(other))
+
+    def test_delta_describes_moved_dice(self):
+        """Test that a delta lists only the dice that moved, grouped by where they went."""
+        game_data = game.GameData(1)
+        game_data.available_dice = {"blue": 4, "green": 2, "yellow": 1, "white": 6}
+        before = game_data.state_key()
+        game_data.choose_die("blue")
+        self.assertEqual(renderer.render_dice_delta(before, game_data.state_key()), "Blue 4 → chosen; Yellow 1, Green 2 → platter")
+
+        before = game_data.state_key()
+        game_data.return_die("green")
+        self.assertEqual(renderer.render_dice_delta(before, game_data.state_key()), "Green 2 → available")
+
+        before = game_data.state_key()
+        self.assertEqual(renderer.render_dice_delta(before, before, rolled=True), "Green 2, White 6 → rolled")
+        self.assertEqual(renderer.render_dice_delta(before, before), "No dice moved.")
+
+    def test_state_deltas_refresh(self):
+        """Test that a channel gets the full state first, then deltas, then the full state again."""
+        deltas = renderer.StateDeltas(refresh_every=3)
+        messages = [deltas.render(1, self.game_data, "Rolling all new dice...", rolled=True) for _ in range(4)]
+
+        self.assertIn("**Current Dice States**", messages[0])
+        self.assertEqual(messages[1:3], ["Green 2, Blue 4, Yellow 4 → rolled"] * 2)
+        self.assertIn("**Current Dice States**", messages[3])
+        deltas.forget(1)
+        self.assertIn("**Current Dice States**", deltas.render(1, self.game_data))
+        self.assertEqual(len(deltas), 1)
+
+    def test_state_deltas_new_roll_shows_full_state(self):
+        """Test that a fresh roll mid-game shows the full state, so the chosen dice it cleared disappear."""
+        deltas = renderer.StateDeltas(refresh_every=10)
+        deltas.render(1, self.game_data)
+        self.game_data.choose_die("blue")
+        self.assertIn("→ chosen", deltas.render(1, self.game_data))
+
+        self.game_data.roll_dice()
+        message = deltas.render(1, self.game_data, "Rolling all new dice...", rolled=True)
+
+        chosen = message.split("**Available Dice")[0]
+        self.assertIn("**Chosen Dice:** None", chosen)
+        self.assertNotIn("White", chosen)
+        self.assertNotIn("Blue", chosen)
+        self.game_data.choose_die("white")
+        self.assertIn("→ chosen", deltas.render(1, self.game_data))
+
+    def test_render_luck(self):
+        """Test that luck shows the mean roll and its distance from 3.5 in standard errors."""
+        stats = {"rolled": [0, 10, 10, 10, 10, 10, 10], "taken": [0, 0, 0, 0, 0, 2, 1], "discarded": 4, "turns": 2}
+        message = renderer.render_luck("<@42>", stats)
+        self.assertIn("Mean roll 3.500 (3.5 expected, z = +0.00)", message)
+        self.assertIn("Mean die taken 5.33 over 3 dice, 4 dice discarded", message)
+        self.assertIn("has not rolled", renderer.render_luck("<@42>", {"rolled": [0] * 7, "taken": [0] * 7, "discarded": 0, "turns": 0}))
+    def test_imports_without_discord(self):
+        """Test that the game logic and rendering can be imported by worker processes without discord.py."""
+        code = "import sys, advisor, autocomplete, deadline, game, history, memstats, renderer, scoresheet, store, registry, tournament; sys.exit('discord' in sys.modules)"
+        self.assertEqual(subprocess.run([sys.executable, "-c", code]).returncode, 0)
+
+if __name__ == '__main__':
+    unittest.main()
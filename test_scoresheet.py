@@ -0,0 +1,180 @@
+import unittest
+import game
+import scoresheet
+
+class TestScoresheet(unittest.TestCase):
+
+    def setUp(self):
+        """Set up an empty That's Pretty Clever sheet."""
+        self.sheet = scoresheet.Scoresheet(1)
+
+    def test_yellow_column_and_row(self):
+        """Test that completing a yellow column scores it and completing a row earns its bonus."""
+        for value, box in ((3, 0), (2, 4), (1, 8)):
+            self.sheet.mark("yellow", value, box)
+        self.assertEqual(self.sheet.score("yellow"), 10)
+
+        self.sheet.mark("yellow", 6, 1)
+        bonuses, _ = self.sheet.mark("yellow", 5, 2)
+        self.assertEqual(bonuses, [("blue", None)])
+        self.assertEqual(self.sheet.pending("blue"), 1)
+
+    def test_ambiguous_box(self):
+        """Test that a number fitting two boxes needs the box, and a crossed box is refused."""
+        bonuses, message = self.sheet.mark("yellow", 3)
+        self.assertIsNone(bonuses)
+        self.assertIn("1 or 14", message)
+
+        self.sheet.mark("yellow", 3, 13)
+        self.assertEqual(self.sheet.mark("yellow", 3), ([], "Marked 3 in yellow; yellow now scores 0."))
+        self.assertIsNone(self.sheet.mark("yellow", 3)[0])
+
+    def test_blue_scores_by_count(self):
+        """Test that blue scores by the number of crosses."""
+        for value in (2, 5, 7, 12):
+            self.sheet.mark("blue", value)
+        self.assertEqual(self.sheet.score("blue"), 7)
+
+    def test_green_thresholds(self):
+        """Test that green boxes need at least their threshold."""
+        self.sheet.mark("green", 1)
+        self.assertIsNone(self.sheet.mark("green", 1)[0])
+        self.sheet.mark("green", 2)
+        self.assertEqual(self.sheet.score("green"), 3)
+
+    def test_purple_rising(self):
+        """Test that purple numbers must rise, except after a 6."""
+        self.sheet.mark("purple", 4)
+        self.assertIsNone(self.sheet.mark("purple", 4)[0])
+        self.sheet.mark("purple", 6)
+        self.sheet.mark("purple", 1)
+        self.assertEqual(self.sheet.score("purple"), 11)
+
+    def test_orange_multipliers(self):
+        """Test that orange boxes multiply the number written."""
+        for value in (1, 1, 1, 5):
+            self.sheet.mark("orange", value)
+        self.assertEqual(self.sheet.score("orange"), 13)
+
+    def test_bonus_chain(self):
+        """Test that a bonus filling a box can earn that box's bonus in turn."""
+        for value in (1, 2, 3, 4):
+            self.sheet.mark("orange", value)
+        # Purple box 10 gives an orange 6 in orange box 5, which gives a yellow cross
+        for value in (1, 2, 3, 4, 5, 6, 1, 2, 3):
+            self.sheet.mark("purple", value)
+        bonuses, message = self.sheet.mark("purple", 4)
+
+        self.assertEqual(bonuses, [("orange", 6), ("yellow", None)])
+        self.assertEqual(self.sheet.score("orange"), 1 + 2 + 3 + 8 + 6)
+        # One more besides purple box 6's
+        self.assertEqual(self.sheet.pending("yellow"), 2)
+        self.assertIn("an orange 6, a yellow cross", message)
+
+    def test_place_bonus(self):
+        """Test that a pending bonus cross can be placed in any open box, and only once."""
+        for value, box in ((3, 0), (6, 1), (5, 2)):
+            self.sheet.mark("yellow", value, box)
+        self.assertIsNone(self.sheet.place_bonus("blue", 0)[0])
+
+        bonuses, _ = self.sheet.place_bonus("blue", 4)
+        self.assertEqual(bonuses, [])
+        self.assertEqual(self.sheet.score("blue"), 1)
+        self.assertIsNone(self.sheet.place_bonus("blue", 5)[0])
+
+    def test_foxes_score_lowest_area(self):
+        """Test that each fox scores the lowest area score."""
+        for value in (1, 2, 3, 4, 5, 1, 2):
+            self.sheet.mark("green", value)
+        self.assertEqual(self.sheet.counter(scoresheet.FOX), 1)
+        self.assertEqual(self.sheet.total(), 28)
+        self.sheet.mark("yellow", 3, 0)
+        self.sheet.mark("blue", 2)
+        self.sheet.mark("orange", 2)
+        self.sheet.mark("purple", 3)
+        self.assertEqual(self.sheet.total(), 28 + 0 + 1 + 2 + 3 + 0)
+
+    def test_state_is_one_int(self):
+        """Test that a sheet restored from pack() is the same sheet."""
+        self.sheet.mark("yellow", 3, 0)
+        self.sheet.mark("purple", 5)
+        restored = scoresheet.Scoresheet(1, self.sheet.pack())
+        self.assertEqual(restored.total(), self.sheet.total())
+        self.assertEqual(restored.mark("purple", 5)[0], None)
+
+    def test_value_for(self):
+        """Test die values: the wild die goes anywhere, blue adds blue and white."""
+        game_data = game.GameData(1)
+        game_data.available_dice = {"blue": 4, "green": 2, "white": 3}
+        game_data.choose_die("white")
+
+        self.assertEqual(scoresheet.value_for(game_data, "green", "white"), 3)
+        self.assertEqual(scoresheet.value_for(game_data, "blue", "white"), 7)
+        self.assertIsNone(scoresheet.value_for(game_data, "yellow", "green"))
+
+    def test_sheet_for(self):
+        """Test that each player gets their own sheet, and games without sheets are refused."""
+        game_data = game.new_game(1, compact=True)
+        scoresheet.sheet_for(game_data, 1).mark("green", 3)
+        self.assertEqual(scoresheet.sheet_for(game_data, 1).score("green"), 1)
+        self.assertEqual(scoresheet.sheet_for(game_data, 2).score("green"), 0)
+        with self.assertRaises(KeyError):
+            scoresheet.sheet_for(game.GameData(2), 1)
+
+    def test_mark_die_once_per_turn(self):
+        """Test that each player marks a taken die once per turn, and again after the turn ends."""
+        for game_data in (game.GameData(1), game.CompactGameData(1)):
+            game_data.available_dice = {"green": 3, "blue": 5, "white": 6}
+            game_data.choose_die("green")
+
+            self.assertEqual(scoresheet.mark_die(game_data, 1, "green")[0], [])
+            bonuses, message = scoresheet.mark_die(game_data, 1, "Green")
+            self.assertIsNone(bonuses)
+            self.assertIn("already marked", message)
+            self.assertEqual(scoresheet.mark_die(game_data, 2, "green")[0], [])
+            self.assertIsNone(scoresheet.mark_die(game_data, 1, "blue")[0])
+            self.assertEqual(scoresheet.sheet_for(game_data, 1).score("green"), 1)
+
+            game_data.reset()
+            game_data.available_dice = {"green": 4}
+            game_data.choose_die("green")
+            self.assertEqual(scoresheet.mark_die(game_data, 1, "green")[0], [])
+            self.assertEqual(scoresheet.sheet_for(game_data, 1).score("green"), 3)
+
+    def test_mark_die_from_platter(self):
+        """Test that while one player takes dice, the others each mark one die from the platter, and the active player can't."""
+        for game_data in (game.GameData(1), game.CompactGameData(1)):
+            game_data.available_dice = {"green": 3, "yellow": 1, "blue": 5, "orange": 2}
+            game_data.choose_die("green")
+            game_data.active_player = 1
+
+            self.assertIn("not on the silver platter", scoresheet.mark_die(game_data, 2, "green")[1])
+            self.assertIn("not taken", scoresheet.mark_die(game_data, 1, "orange")[1])
+            self.assertEqual(scoresheet.mark_die(game_data, 2, "orange")[0], [])
+            self.assertIn("already marked a die", scoresheet.mark_die(game_data, 2, "orange")[1])
+            self.assertEqual(scoresheet.mark_die(game_data, 3, "orange")[0], [])
+            self.assertEqual(scoresheet.mark_die(game_data, 1, "green")[0], [])
+
+            # Once three dice are taken, the ones left over are on the platter too
+            game_data.chosen_dice_this_round = {"green": 3, "blue": 5, "yellow": 6}
+            game_data.available_dice = {"purple": 4}
+            game_data.discarded_dice_this_round = {"orange": 2}
+            self.assertEqual(scoresheet.platter(game_data), {"orange": 2, "purple": 4})
+            self.assertEqual(scoresheet.mark_die(game_data, 4, "purple")[0], [])
+
+    def test_active_player_saved(self):
+        """Test that the active player is saved with the sheets if they have one."""
+        game_data = game.GameData(1)
+        scoresheet.sheet_for(game_data, 1)
+        scoresheet.sheet_for(game_data, 2)
+        game_data.active_player = 2
+
+        restored = game.GameData(1)
+        scoresheet.unpack_sheets(restored, scoresheet.pack_sheets(game_data))
+
+        self.assertEqual(restored.active_player, 2)
+        self.assertIsNone(restored.marked)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import random
+import unittest
+import game
+
+try:
+    import numpy as np
+    import simulate
+except ImportError:
+    np = None
+
+@unittest.skipUnless(np, "simulate.py needs numpy")
+class TestSimulate(unittest.TestCase):
+
+    def test_take_die_matches_choose_die(self):
+        """Test that the vectorized pick and discard matches GameData.choose_die."""
+        rng = random.Random(1)
+        colors = game.DICE_COLORS[1]
+        values = np.array([[rng.randint(1, 6) for _ in colors] for _ in range(500)], dtype=np.int8)
+        available = np.array([[rng.random() < 0.7 for _ in colors] for _ in range(500)])
+        available[:, 0] = True
+        chosen_index = np.zeros(500, dtype=np.int64)
+
+        expected = []
+        for row in range(500):
+            game_data = game.GameData(1)
+            game_data.available_dice = {color: int(values[row, i]) for i, color in enumerate(colors) if available[row, i]}
+            game_data.choose_die(colors[0])
+            expected.append((dict(game_data.available_dice), len(game_data.discarded_dice_this_round)))
+
+        chosen_values, discard_counts = simulate.take_die(values, available, chosen_index, np.ones(500, dtype=bool))
+
+        for row in range(500):
+            remaining = {color: int(values[row, i]) for i, color in enumerate(colors) if available[row, i]}
+            self.assertEqual((remaining, int(discard_counts[row])), expected[row])
+            self.assertEqual(chosen_values[row], values[row, 0])
+
+    def test_highest_breaks_ties_by_color_order(self):
+        """Test that ties go to the first color in DICE_COLORS."""
+        values = np.array([[3, 6, 6, 2, 6, 1]], dtype=np.int8)
+        available = np.array([[True, False, True, True, True, True]])
+
+        self.assertEqual(simulate.pick_highest(values, available, 0)[0], 2)
+        self.assertEqual(simulate.pick_lowest(values, available, 0)[0], 5)
+
+    def test_statistics_are_consistent(self):
+        """Test that the distributions sum to one and a turn keeps one to three dice."""
+        stats = simulate.simulate(2, "random", 20000, seed=3)
+
+        self.assertAlmostEqual(sum(stats["kept"]), 1.0)
+        self.assertAlmostEqual(sum(stats["platter"]), 1.0)
+        self.assertAlmostEqual(sum(stats["chosen_values"]), 1.0)
+        self.assertEqual(stats["kept"][0], 0.0)
+        self.assertTrue(1.0 <= stats["expected_kept"] <= 3.0)
+        self.assertAlmostEqual(stats["expected_kept"] + sum(i * p for i, p in enumerate(stats["platter"])), 6.0)
+
+    def test_lowest_never_discards(self):
+        """Test that always taking the lowest die keeps three dice and discards nothing."""
+        stats = simulate.simulate(1, "lowest", 10000, seed=4)
+
+        self.assertEqual(stats["expected_kept"], 3.0)
+        self.assertEqual(stats["expected_discarded"], 0.0)
+
+if __name__ == '__main__':
+    unittest.main()
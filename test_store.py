@@ -0,0 +1,127 @@
+import asyncio
+import os
+import tempfile
+import unittest
+import dice_rng
+import game
+import scoresheet
+import store
+
+class TestGameStore(unittest.TestCase):
+
+    def setUp(self):
+        """Set up a store in an empty temporary directory."""
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = store.GameStore(self.directory.name)
+
+    def tearDown(self):
+        self.store.close()
+        self.directory.cleanup()
+
+    def make_game(self):
+        game_data = game.GameData(1)
+        game_data.available_dice = {"blue": 6, "green": 2, "yellow": 3}
+        game_data.choose_die("yellow")
+        return game_data
+
+    def test_load_empty(self):
+        """Test that a new store has no games."""
+        self.assertEqual(self.store.load(), {})
+
+    def test_last_record_wins(self):
+        """Test that reloading gives the latest state of each channel."""
+        game_data = self.make_game()
+        self.store.record(1, game.GameData(2), "new_game")
+        self.store.record(1, game_data, "choose")
+        self.store.record(2, game.GameData(3), "new_game")
+        self.store.close()
+
+        states = store.GameStore(self.directory.name).load()
+
+        self.assertEqual(states, {1: (1, game_data.pack()), 2: (3, 0)})
+        restored = game.new_game(1, packed=states[1][1])
+        self.assertEqual(restored.chosen_dice_this_round, {"yellow": 3})
+        self.assertEqual(restored.available_dice, {"blue": 6})
+        self.assertEqual(restored.discarded_dice_this_round, {"green": 2})
+
+    def test_compact(self):
+        """Test that compaction keeps one record per channel and empties the log."""
+        for i in range(5):
+            self.store.record(7, self.make_game(), "choose")
+        self.store.record(8, game.GameData(4), "new_game")
+        self.store.close()
+        self.store.compact()
+
+        self.assertEqual(os.path.getsize(self.store.snapshot_path), 2 * store.RECORD.size)
+        self.assertFalse(os.path.exists(self.store.log_path))
+        self.assertEqual(len(self.store.load()), 2)
+
+    def test_flush_and_compact_while_running(self):
+        """Test that records written after a compaction are applied over the snapshot."""
+        async def scenario():
+            self.store.record(1, game.GameData(1), "new_game")
+            await self.store.flush()
+            await asyncio.to_thread(self.store.compact)
+            self.store.record(1, self.make_game(), "choose")
+            await self.store.flush()
+
+        asyncio.run(scenario())
+
+        self.assertEqual(self.store.load(), {1: (1, self.make_game().pack())})
+
+    def test_sheets_saved(self):
+        """Test that marks save the sheets, a new turn clears the dice marked, and compaction and new games keep up."""
+        game_data = self.make_game()
+        self.assertEqual(scoresheet.mark_die(game_data, 9, "yellow", box=0)[0], [])
+        self.store.record(1, game_data, "mark")
+        self.store.close()
+
+        restored = store.build_game(self.store.load()[1])
+        self.assertEqual(restored.sheets[9].score("yellow"), game_data.sheets[9].score("yellow"))
+        self.assertEqual(restored.marked, {(9, "yellow")})
+
+        game_data.reset()
+        self.store.record(1, game_data, "reset")
+        self.store.record(2, game_data, "reset")
+        self.store.close()
+        self.store.compact()
+        states = self.store.load()
+        self.assertIsNone(store.build_game(states[1]).marked)
+        self.assertEqual(states[1][2], states[2][2])
+        self.assertEqual(store.build_game(states[2]).sheets[9].pack(), game_data.sheets[9].pack())
+
+        self.store.record(1, game.GameData(1), "new_game")
+        self.store.close()
+        self.assertEqual(self.store.load()[1], (1, 0))
+
+    def test_dice_stream_saved(self):
+        """Test that a restored game rolls the dice it would have rolled, after a compaction too."""
+        game_data = game.new_game(1, dice_stream=dice_rng.DiceStream(3))
+        self.store.record(1, game_data, "new_game")
+        game_data.roll_dice()
+        self.store.record(1, game_data, "roll")
+        self.store.close()
+        saved = game_data.dice_stream.saved()
+
+        restored = store.build_game(self.store.load()[1])
+        self.assertEqual(restored.dice_stream.roll(30), game_data.dice_stream.roll(30))
+
+        self.store.compact()
+        restored = store.build_game(self.store.load()[1])
+        self.assertEqual(restored.dice_stream.saved(), saved)
+
+        self.store.record(1, game.GameData(1), "new_game")
+        self.store.close()
+        self.assertEqual(self.store.load()[1], (1, 0))
+
+    def test_partial_record_ignored(self):
+        """Test that a record cut short by a crash is skipped."""
+        self.store.record(1, game.GameData(1), "new_game")
+        self.store.close()
+        with open(self.store.log_path, "ab") as f:
+            f.write(b"\x01\x02\x03")
+
+        self.assertEqual(self.store.load(), {1: (1, 0)})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import array
+import tempfile
+import unittest
+import dice_rng
+import tournament
+
+class TestTournament(unittest.TestCase):
+
+    def setUp(self):
+        """Set up an empty output directory."""
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def make(self, directory=None, **settings):
+        return tournament.Tournament(directory or self.directory.name, **{"games": 20, "variants": [1, 2], "strategies": ["highest", "careful"],
+                                                             "chunk": 5, "seed": 0, **settings})
+
+    def test_same_seed_same_game(self):
+        """Test that a game is decided by its seed, and that the scoresheet is used where there is one."""
+        first = tournament.play_game(1, tournament.GreedyStrategy(), dice_rng.DiceStream("0:1:7"))
+        second = tournament.play_game(1, tournament.GreedyStrategy(), dice_rng.DiceStream("0:1:7"))
+        self.assertEqual(first, second)
+        self.assertGreater(first[0], 0)
+
+        score, pips, _, returned, foxes = tournament.play_game(2, tournament.Strategy(), dice_rng.DiceStream(1))
+        self.assertEqual((score, returned, foxes), (pips, 0, 0))
+
+    def test_lowest_never_discards(self):
+        """Test that always taking the lowest die discards nothing."""
+        _, _, discarded, returned, _ = tournament.play_game(1, tournament.LowestStrategy(), dice_rng.DiceStream(3))
+        self.assertEqual((discarded, returned), (0, 0))
+
+    def test_chunk_columns(self):
+        """Test that a chunk returns one packed value per game in every column."""
+        columns, _ = tournament.play_chunk(1, "tournament:CarefulStrategy", 10, 4, seed=0)
+        games = array.array("I")
+        games.frombytes(columns["game"])
+        self.assertEqual(list(games), [10, 11, 12, 13])
+        self.assertEqual(len(columns["score"]), 4 * array.array("H").itemsize)
+        with self.assertRaises(ValueError):
+            tournament.load_strategy("cleverest")
+
+    def test_resume(self):
+        """Test that a run resumes from its checkpoint, dropping anything written after it."""
+        run = self.make()
+        variant, strategy, start, count = run.pending()[0]
+        run.record(variant, strategy, start, *tournament.play_chunk(variant, strategy, start, count, 0))
+        # A chunk being appended when the run stopped
+        with open(tournament.column_path(self.directory.name, variant, strategy, "score"), "ab") as f:
+            f.write(b"\x01\x02")
+
+        resumed = self.make()
+        self.assertEqual(len(resumed.pending()), 15)
+        self.assertEqual(len(tournament.load(self.directory.name, variant, strategy)["score"]), 5)
+
+        played, _ = resumed.run(workers=1)
+        self.assertEqual(played, 75)
+        self.assertEqual(sorted(tournament.load(self.directory.name, 2, "careful")["game"]), list(range(20)))
+        self.assertIn("game 2 careful", resumed.report())
+
+    def test_resume_other_spelling(self):
+        """Test that resuming through another spelling of the output directory keeps the chunks recorded."""
+        self.make().record(1, "highest", 0, *tournament.play_chunk(1, "highest", 0, 5, 0))
+
+        resumed = self.make(self.directory.name + "/./")
+
+        self.assertEqual(len(resumed.pending()), 15)
+        self.assertEqual(len(tournament.load(self.directory.name, 1, "highest")["score"]), 5)
+
+    def test_other_settings_refused(self):
+        """Test that a checkpoint is not resumed with different settings."""
+        self.make().record(1, "highest", 0, *tournament.play_chunk(1, "highest", 0, 5, 0))
+        with self.assertRaises(ValueError):
+            self.make(games=40)
+
+if __name__ == '__main__':
+    unittest.main()
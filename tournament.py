@@ -0,0 +1,364 @@
+"""
+Plays whole solo games with pluggable strategies, spread over every core, to compare strategies.
+
+A game is ROUNDS rounds, played with the GameData rules the bot uses. In each round the player
+rolls, takes up to three dice (GameData.choose_die, re-rolling the dice still available between
+picks), and may then spend a +1 earned on the scoresheet to take a die back from the platter
+(GameData.return_die). Finally one of the dice left for the other players is taken as the passive
+pick. Every die taken is marked on a scoresheet (scoresheet.py) where the game has one and the
+score is the sheet's total; otherwise the score is the sum of the dice taken. Rerolls earned on
+the sheet are not used.
+
+A strategy is an object with the methods of Strategy, and can be given as module:Class as well as
+by a name in STRATEGIES. Game i of a variant uses the same dice seed for every strategy, so the
+strategies are compared on the same rolls as far as their choices allow.
+
+Games are played in chunks by a process pool. Each finished chunk is appended to one file per
+column per variant and strategy (a raw array, see COLUMNS), and recorded in tournament.json with
+the length of every file, so an interrupted run picks up where it stopped: files are cut back to
+the recorded lengths and only the chunks not recorded are played.
+
+    python tournament.py [--games 100000] [--variants 1 2 3 4] [--strategies highest lowest careful greedy]
+                         [--workers N] [--chunk 500] [--output tournament] [--seed 0]
+
+Like simulate.py, this never imports discord.py, so it runs anywhere the game logic does.
+"""
+import argparse
+import array
+import concurrent.futures
+import importlib
+import json
+import os
+import statistics
+import time
+
+import dice_rng
+import game
+import scoresheet
+
+ROUNDS = 6
+PICKS_PER_TURN = 3
+# Column name: array typecode, one value per game
+COLUMNS = {"game": "I", "score": "H", "pips": "H", "discarded": "H", "returned": "B", "foxes": "B"}
+STATE_FILE = "tournament.json"
+
+
+class Strategy:
+    """
+    Takes the highest die and marks each die where it gains the most straight away. Subclasses
+    override take() (and the other methods) to play differently.
+    """
+    name = "highest"
+
+    def take(self, game_data, sheet, picks):
+        """Returns the color of the available die to take, as the pick numbered `picks` (from 0) of the turn."""
+        return max(game_data.available_dice, key=game_data.available_dice.get)
+
+    def take_back(self, game_data, sheet):
+        """Returns the color of a discarded die to take back with a +1, or None to keep the +1."""
+        color, (gain, _) = max(((color, self.gain(game_data, sheet, color)) for color in game_data.discarded_dice_this_round),
+                               key=lambda option: option[1][0])
+        return color if gain > 1 else None
+
+    def passive(self, game_data, sheet, colors):
+        """Returns the color, from colors, of the die to take from those left for the other players."""
+        return max(colors, key=lambda color: self.gain(game_data, sheet, color)[0])
+
+    def gain(self, game_data, sheet, color):
+        """
+        Returns (gain, (area, value, box)) for the best place to mark the die of color, where gain is
+        the sheet's total score gained plus one per bonus earned, or (value, None) without a sheet.
+        The placement is None if the die fits nowhere.
+        """
+        if sheet is None:
+            return _value(game_data, color), None
+        best = (0, None)
+        total = sheet.total()
+        for area_name, area in sheet.areas.items():
+            value = scoresheet.value_for(game_data, area_name, color)
+            if value is None:
+                continue
+            for box in area.options(sheet.state, value):
+                trial = scoresheet.Scoresheet(sheet.game_number, sheet.state)
+                bonuses, _ = trial.mark(area_name, value, box)
+                # The small extra makes any mark better than none
+                gain = trial.total() - total + len(bonuses) + 0.1
+                if gain > best[0]:
+                    best = (gain, (area_name, value, box))
+        return best
+
+    def place(self, sheet, area_name):
+        """Returns the box for a bonus cross earned in the Grid area area_name."""
+        total = sheet.total()
+        best_box, best_gain = None, -1
+        for box in sheet.areas[area_name].open_boxes(sheet.state):
+            trial = scoresheet.Scoresheet(sheet.game_number, sheet.state)
+            bonuses, _ = trial.place_bonus(area_name, box)
+            gain = trial.total() - total + len(bonuses)
+            if gain > best_gain:
+                best_box, best_gain = box, gain
+        return best_box
+
+
+class LowestStrategy(Strategy):
+    """Takes the lowest die, so nothing is discarded."""
+    name = "lowest"
+
+    def take(self, game_data, sheet, picks):
+        return min(game_data.available_dice, key=game_data.available_dice.get)
+
+
+class CarefulStrategy(Strategy):
+    """Takes the highest die that discards at most one other, except on the last pick where it takes the highest."""
+    name = "careful"
+
+    def take(self, game_data, sheet, picks):
+        available = game_data.available_dice
+        if picks < PICKS_PER_TURN - 1:
+            allowed = [color for color, value in available.items() if sum(other < value for other in available.values()) <= 1]
+            if allowed:
+                return max(allowed, key=available.get)
+        return max(available, key=available.get)
+
+
+class GreedyStrategy(Strategy):
+    """Takes the die whose best mark gains the most straight away (the highest die in games without a sheet)."""
+    name = "greedy"
+
+    def take(self, game_data, sheet, picks):
+        return max(game_data.available_dice, key=lambda color: self.gain(game_data, sheet, color)[0])
+
+
+STRATEGIES = {strategy.name: strategy for strategy in (Strategy, LowestStrategy, CarefulStrategy, GreedyStrategy)}
+
+
+def load_strategy(spec):
+    """Returns a new strategy given its name in STRATEGIES or as module:Class."""
+    if spec in STRATEGIES:
+        return STRATEGIES[spec]()
+    module_name, _, class_name = spec.partition(":")
+    if not class_name:
+        raise ValueError(f"Unknown strategy {spec!r}: use one of {", ".join(STRATEGIES)} or module:Class.")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+def _value(game_data, color):
+    return game_data.chosen_dice_this_round.get(color) or game_data.available_dice.get(color) or game_data.discarded_dice_this_round[color]
+
+
+def play_game(game_number, strategy, dice_stream):
+    """Plays one game. Returns (score, pips, discarded, returned, foxes)."""
+    game_data = game.new_game(game_number, dice_stream=dice_stream)
+    sheet = scoresheet.Scoresheet(game_number) if game_number in scoresheet.SHEETS else None
+    grids = [name for name, area in scoresheet.SHEETS.get(game_number, {}).items() if isinstance(area, scoresheet.Grid)]
+    pips = discarded = returned = 0
+
+    def use(color):
+        nonlocal pips
+        pips += _value(game_data, color)
+        if sheet is None:
+            return
+        _, placement = strategy.gain(game_data, sheet, color)
+        if placement is None:
+            return
+        sheet.mark(*placement)
+        # Bonus crosses in grids are placed straight away, and may earn more; those for a full grid are lost
+        full = set()
+        while True:
+            area_name = next((name for name in grids if name not in full and sheet.pending(name)), None)
+            if area_name is None:
+                break
+            box = strategy.place(sheet, area_name)
+            if box is None:
+                full.add(area_name)
+            else:
+                sheet.place_bonus(area_name, box)
+
+    for _ in range(ROUNDS):
+        game_data.roll_dice()
+        for picks in range(PICKS_PER_TURN):
+            if picks:
+                game_data.reroll_available_dice()
+            color = strategy.take(game_data, sheet, picks)
+            before = len(game_data.discarded_dice_this_round)
+            game_data.choose_die(color)
+            discarded += len(game_data.discarded_dice_this_round) - before
+            use(color)
+            if not game_data.available_dice:
+                break
+
+        if sheet is not None and game_data.discarded_dice_this_round and sheet.counter(scoresheet.PLUS_ONE) > returned:
+            color = strategy.take_back(game_data, sheet)
+            if color is not None:
+                game_data.return_die(color)
+                before = len(game_data.discarded_dice_this_round)
+                game_data.choose_die(color)
+                discarded += len(game_data.discarded_dice_this_round) - before
+                returned += 1
+                use(color)
+
+        left = [*game_data.available_dice, *game_data.discarded_dice_this_round]
+        if left:
+            use(strategy.passive(game_data, sheet, left))
+        game_data.reset()
+
+    score = sheet.total() if sheet is not None else pips
+    foxes = sheet.counter(scoresheet.FOX) if sheet is not None else 0
+    return score, pips, discarded, returned, foxes
+
+
+def play_chunk(game_number, strategy_spec, start, count, seed):
+    """
+    Plays games start to start + count - 1. Returns ({column: bytes}, seconds), run in a worker
+    process. Game i is rolled from the seed "seed:game_number:i".
+    """
+    began = time.perf_counter()
+    strategy = load_strategy(strategy_spec)
+    columns = {name: array.array(typecode) for name, typecode in COLUMNS.items()}
+    for index in range(start, start + count):
+        score, pips, discarded, returned, foxes = play_game(game_number, strategy, dice_rng.DiceStream(f"{seed}:{game_number}:{index}"))
+        columns["game"].append(index)
+        columns["score"].append(score)
+        columns["pips"].append(pips)
+        columns["discarded"].append(discarded)
+        columns["returned"].append(returned)
+        columns["foxes"].append(foxes)
+    return {name: column.tobytes() for name, column in columns.items()}, time.perf_counter() - began
+
+
+def column_path(directory, game_number, strategy_spec, column):
+    return os.path.join(directory, f"game{game_number}.{strategy_spec.replace(":", ".")}.{column}")
+
+
+def load(directory, game_number, strategy_spec):
+    """Returns {column: array} of the games played so far for a variant and strategy, in the order they finished."""
+    columns = {}
+    for name, typecode in COLUMNS.items():
+        column = array.array(typecode)
+        try:
+            with open(column_path(directory, game_number, strategy_spec, name), "rb") as f:
+                column.frombytes(f.read())
+        except FileNotFoundError:
+            pass
+        columns[name] = column
+    return columns
+
+
+class Tournament:
+    """The chunks of a run and which have finished, kept in directory/tournament.json."""
+
+    def __init__(self, directory, games, variants, strategies, chunk, seed):
+        self.directory = directory
+        self.settings = {"games": games, "variants": variants, "strategies": strategies, "chunk": chunk, "seed": seed}
+        self.done = set()
+        # Bytes written per column file, by file name
+        self.lengths = {}
+        self.seconds = 0.0
+        path = os.path.join(directory, STATE_FILE)
+        if os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            if state["settings"] != self.settings:
+                raise ValueError(f"{path} is from a run with other settings: {state['settings']}")
+            self.done = {tuple(chunk) for chunk in state["done"]}
+            self.lengths = state["lengths"]
+            self.seconds = state["seconds"]
+            self._truncate()
+        else:
+            os.makedirs(directory, exist_ok=True)
+
+    def _truncate(self):
+        # Drop anything written after the last checkpoint, e.g. by a chunk that was being appended
+        for variant in self.settings["variants"]:
+            for strategy in self.settings["strategies"]:
+                for column in COLUMNS:
+                    path = column_path(self.directory, variant, strategy, column)
+                    if os.path.exists(path):
+                        with open(path, "r+b") as f:
+                            f.truncate(self.lengths.get(os.path.basename(path), 0))
+
+    def pending(self):
+        """Returns (variant, strategy, start, count) for every chunk not played yet."""
+        games, chunk = self.settings["games"], self.settings["chunk"]
+        return [(variant, strategy, start, min(chunk, games - start))
+                for variant in self.settings["variants"] for strategy in self.settings["strategies"]
+                for start in range(0, games, chunk) if (variant, strategy, start) not in self.done]
+
+    def record(self, variant, strategy, start, columns, seconds):
+        """Appends a finished chunk's columns and checkpoints."""
+        for name, data in columns.items():
+            path = column_path(self.directory, variant, strategy, name)
+            with open(path, "ab") as f:
+                f.write(data)
+            # By file name, so the run resumes however the directory is spelled
+            key = os.path.basename(path)
+            self.lengths[key] = self.lengths.get(key, 0) + len(data)
+        self.done.add((variant, strategy, start))
+        self.seconds += seconds
+        self._save()
+
+    def _save(self):
+        path = os.path.join(self.directory, STATE_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump({"settings": self.settings, "done": sorted(self.done), "lengths": self.lengths, "seconds": self.seconds}, f)
+        os.replace(path + ".tmp", path)
+
+    def run(self, workers=None):
+        """
+        Plays every pending chunk in a pool of `workers` processes (one per core by default).
+        Returns the games played and the seconds the workers spent playing them.
+        """
+        played = 0
+        seconds = 0.0
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(play_chunk, variant, strategy, start, count, self.settings["seed"]): (variant, strategy, start, count)
+                       for variant, strategy, start, count in self.pending()}
+            for future in concurrent.futures.as_completed(futures):
+                variant, strategy, start, count = futures[future]
+                columns, chunk_seconds = future.result()
+                self.record(variant, strategy, start, columns, chunk_seconds)
+                played += count
+                seconds += chunk_seconds
+        return played, seconds
+
+    def report(self):
+        """Returns a line per variant and strategy: games, mean score with its standard error, and the other columns' means."""
+        lines = []
+        for variant in self.settings["variants"]:
+            for strategy in self.settings["strategies"]:
+                columns = load(self.directory, variant, strategy)
+                scores = columns["score"]
+                if not scores:
+                    continue
+                error = statistics.stdev(scores) / len(scores) ** 0.5 if len(scores) > 1 else 0.0
+                lines.append(f"game {variant} {strategy:10} {len(scores):9,} games  score {statistics.fmean(scores):7.2f} ± {error:.2f}  "
+                             + "  ".join(f"{name} {statistics.fmean(columns[name]):.2f}" for name in ("pips", "discarded", "returned", "foxes")))
+        return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play whole games with each strategy and compare their scores.")
+    parser.add_argument("--games", type=int, default=100_000, help="Games per variant and strategy.")
+    parser.add_argument("--variants", type=int, nargs="+", default=sorted(game.DICE_COLORS))
+    parser.add_argument("--strategies", nargs="+", default=list(STRATEGIES), help="Names in STRATEGIES or module:Class.")
+    parser.add_argument("--workers", type=int, default=None, help="Processes to play in (default: one per core).")
+    parser.add_argument("--chunk", type=int, default=500, help="Games per task, and between checkpoints.")
+    parser.add_argument("--output", default="tournament", help="Directory for the columns and checkpoint.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    for spec in args.strategies:
+        load_strategy(spec)
+
+    tournament = Tournament(args.output, args.games, args.variants, args.strategies, args.chunk, args.seed)
+    workers = args.workers or os.cpu_count()
+    start = time.perf_counter()
+    played, seconds = tournament.run(workers)
+    elapsed = time.perf_counter() - start
+    print(tournament.report())
+    if played:
+        print(f"{played:,} games in {elapsed:.1f}s on {workers} processes: {played / elapsed:,.0f} games/s, "
+              f"{played / seconds:,.0f} games/s per core")
+
+
+if __name__ == '__main__':
+    main()
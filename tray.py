@@ -0,0 +1,59 @@
+"""
+Buttons for the interactive dice tray (CLEVER_TRAY_MODE).
+
+The dice state message gets a Roll and a Done button, a Take button for every available die
+and a Return button for every discarded one. Pressing one runs the action and edits that same
+message in place, so a turn is one message instead of one per command.
+
+Buttons are DynamicItems whose custom_id holds the channel, action and color, so they keep
+working on old messages after the bot restarts once bot.py registers TrayButton.
+"""
+import discord
+
+from dice_emoji import dice_emoji
+
+# Set by bot.py: coroutine (interaction, action, color) that runs a tray button's action
+action_handler = None
+
+BUTTONS_PER_ROW = 5
+
+
+class TrayButton(discord.ui.DynamicItem[discord.ui.Button],
+                 template=r"clever:(?P<channel_id>[0-9]+):(?P<action>roll|take|return|done):(?P<color>[a-z]*)"):
+    def __init__(self, channel_id, action, color="", label=None, emoji=None, style=discord.ButtonStyle.secondary, row=None):
+        super().__init__(discord.ui.Button(label=label, emoji=emoji, style=style, row=row,
+                                           custom_id=f"clever:{channel_id}:{action}:{color}"))
+        self.channel_id = channel_id
+        self.action = action
+        self.color = color
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match, /):
+        return cls(int(match["channel_id"]), match["action"], match["color"])
+
+    async def interaction_check(self, interaction):
+        # The buttons only act on the game of the channel they were posted in
+        return interaction.channel_id == self.channel_id
+
+    async def callback(self, interaction):
+        await action_handler(interaction, self.action, self.color)
+
+
+def build_view(channel_id, game_data):
+    """Returns the buttons for a game's current dice state."""
+    view = discord.ui.View(timeout=None)
+    view.add_item(TrayButton(channel_id, "roll", label="Roll" if not game_data.available_dice else "Re-roll",
+                             style=discord.ButtonStyle.primary, row=0))
+    view.add_item(TrayButton(channel_id, "done", label="Done", style=discord.ButtonStyle.danger, row=0))
+
+    available = sorted(game_data.available_dice.items(), key=lambda x: (x[1], x[0]))
+    for i, (color, value) in enumerate(available):
+        view.add_item(TrayButton(channel_id, "take", color, label=f"Take {color.capitalize()}",
+                                 emoji=dice_emoji[color][value], style=discord.ButtonStyle.success,
+                                 row=1 + i // BUTTONS_PER_ROW))
+
+    discarded = sorted(game_data.discarded_dice_this_round.items(), key=lambda x: (x[1], x[0]))
+    for i, (color, value) in enumerate(discarded):
+        view.add_item(TrayButton(channel_id, "return", color, label=f"Return {color.capitalize()}",
+                                 emoji=dice_emoji[color][value], row=3 + i // BUTTONS_PER_ROW))
+    return view